@@ -1,110 +1,96 @@
 """
-FastAPI endpoints:
- - /health
- - /runs -> list available run dates
- - /run (POST) -> trigger inference (demo uses sample data)
- - /tiles/{z}/{x}/{y}.png -> returns PNG tile for classification for latest run or requested run via ?run=
- - /summary/{run}.geojson -> serve summary
+FastAPI app: the read-only endpoints of serving.py plus the pipeline endpoints:
+ - /run (POST) -> trigger inference synchronously (demo uses sample data)
+ - /runs (POST) -> queue a background run, returns a job id
+ - /jobs/{id} -> job status, progress and timings
+
+The pipeline (infer, training, scikit-learn) is imported by the endpoints and
+jobs that run it, not at startup; the model is warmed in a background thread.
 """
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.middleware.cors import CORSMiddleware
-from .storage import list_runs, new_run_folder
-from .infer import run_inference
-from .config import MODEL_PATH
+from .jobs import jobs, QueueFull
+from .serving import router, add_cors
+from .config import MODEL_PATH, TRAINING_CACHE_DIR
 from pathlib import Path
-import os
+from threading import Thread
 import logging
-from typing import Optional
-# from rio_tiler.utils import array_to_image
-# from rio_tiler.io import COGReader
-import numpy as np
-import io
-from PIL import Image
+import time
+from contextlib import asynccontextmanager
 
 logger = logging.getLogger("api")
 
-app = FastAPI(title="Grazing Mapper API")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+DEMO_IMAGERY = "demo/sample_sentinel.tif"
+
+def _warm_model():
+    from .ml.model import load_model
+    load_model(MODEL_PATH)
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the model cache so the first /run doesn't pay the load, without holding up startup
+    if Path(MODEL_PATH).exists():
+        Thread(target=_warm_model, name="model-warmup", daemon=True).start()
+    else:
+        logger.info("No model at %s yet; it will be loaded on first use", MODEL_PATH)
+    yield
 
-@app.get("/runs")
-def runs():
-    return {"runs": list_runs()}
+app = FastAPI(title="Grazing Mapper API", lifespan=lifespan)
+add_cors(app)
+app.include_router(router)
 
 @app.post("/run")
-def run_demo():
+def run_demo(retrain: bool = Query(False)):
     """
-    Trigger a demo run: generates demo data, trains the demo model, runs inference.
+    Trigger a demo run synchronously: runs inference with the cached model,
+    training the demo model first only if none exists yet or ?retrain=true.
+    Prefer POST /runs, which runs the same pipeline in the background.
     """
     # For safety, this uses demo data in repo
-    from .ml.train_demo import train_and_save
-    train_and_save()
+    if retrain or not Path(MODEL_PATH).exists():
+        from .ml.train_demo import train_and_save
+        train_and_save(cache_dir=TRAINING_CACHE_DIR)
+    from .infer import run_inference
+    res = run_inference(DEMO_IMAGERY, model_path=MODEL_PATH)
+    return res
+
+def _pipeline_job(job, imagery: str, retrain: bool):
+    """Background body of POST /runs: optional (re)training, then inference with progress."""
+    if retrain or not Path(MODEL_PATH).exists():
+        from .ml.train_demo import train_and_save
+        t0 = time.perf_counter()
+        train_and_save(cache_dir=TRAINING_CACHE_DIR)
+        job.timings["train"] = time.perf_counter() - t0
     from .infer import run_inference
-    res = run_inference("demo/sample_sentinel.tif", model_path=MODEL_PATH)
+    t0 = time.perf_counter()
+    res = run_inference(imagery, model_path=MODEL_PATH, progress=job.report)
+    job.timings["inference"] = time.perf_counter() - t0
     return res
 
-@app.get("/summary/{run_id}")
-def get_summary(run_id: str):
-    p = Path(os.path.join("storage", run_id, "summary.geojson"))
-    if not p.exists():
-        raise HTTPException(status_code=404, detail="Run not found")
-    return FileResponse(str(p), media_type="application/geo+json")
+def _file_version(path: str) -> str:
+    p = Path(path)
+    return str(p.stat().st_mtime_ns) if p.exists() else "missing"
 
-@app.get("/tile/{z}/{x}/{y}.png")
-def tile(z: int, x: int, y: int, run: Optional[str] = Query(None)):
+@app.post("/runs", status_code=202)
+def submit_run(retrain: bool = Query(False)):
     """
-    Serve a PNG tile for classification raster using rio-tiler/COGReader.
-    For demo, classification.tif are small and not COGs; we open and tile in-memory.
+    Queue a demo pipeline run in the background and return its job id; poll
+    /jobs/{id} for status. Re-submitting while an identical run (same inputs,
+    same model file, same retrain flag) is queued or running returns that job.
     """
-    runs = list_runs()
-    if run is None:
-        if not runs:
-            raise HTTPException(status_code=404, detail="No runs available")
-        run = runs[0]  # latest
-    tif = Path("storage") / run / "classification.tif"
-    if not tif.exists():
-        raise HTTPException(status_code=404, detail="Classification not found for run")
-    # Read full classification into array and generate tile using rio-tiler helpers
-    with rasterio.open(str(tif)) as src:
-        # Calculate bounds & transform handled by rio-tiler typically. Here we will generate a simple tile by resampling.
-        # Compute tile window in pixel coordinates
-        import mercantile
-        tile_bounds = mercantile.bounds(x, y, z)
-        # convert bounds to src rowcol
-        from rasterio.warp import transform_bounds
-        # transform tile_bounds (EPSG:3857) to src crs (likely EPSG:4326) — but our demo uses geographic.
-        # For simplicity, read whole and crop naively (demo)
-        arr = src.read(1)
-        # Scale arr to 0-255 for colors
-        cmap = {
-            0: (180, 50, 50),   # poor
-            1: (240, 180, 60),  # moderate
-            2: (60, 180, 75),   # good
-            3: (200,200,200)    # cloud/no-data
-        }
-        # Create 256x256 tile by resampling arr to 256x256
-        tile_img = Image.new("RGBA", (256, 256))
-        # Resize array
-        from PIL import Image as PILImage
-        pil_arr = PILImage.fromarray(arr.astype('uint8'))
-        pil_resized = pil_arr.resize((256,256), resample=PILImage.NEAREST)
-        px = np.array(pil_resized)
-        rgb = np.zeros((256,256,3), dtype=np.uint8)
-        for k,v in cmap.items():
-            mask = px == k
-            rgb[mask] = v
-        img = Image.fromarray(rgb)
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return FileResponse(buf, media_type="image/png")
+    key = "|".join([DEMO_IMAGERY, _file_version(DEMO_IMAGERY), _file_version(MODEL_PATH), str(retrain)])
+    try:
+        job = jobs.submit(key, _pipeline_job, {"imagery": DEMO_IMAGERY, "retrain": retrain})
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": jobs.list()}
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.as_dict()
@@ -0,0 +1,159 @@
+"""
+Batch pipeline: classify many properties' scenes in one process.
+
+    python -m backend.app.batch manifest.json [--workers N] [--concurrency N] [--force]
+
+The manifest lists one entry per property (paths relative to the manifest):
+
+    {"properties": [
+        {"id": "lorella", "scene": "scenes/lorella.tif", "paddocks": "lorella_paddocks.geojson"},
+        {"id": "tanumbirini", "scene": "scenes/tanumbirini.tif"}
+    ]}
+
+The model is loaded once and one inference_pool (workers processes, each holding
+the model) is shared by every property; up to `concurrency` properties run at a
+time in threads, so one property's COG / summary / tile work overlaps another's
+classification and small scenes don't leave workers idle.
+
+Each property's inputs (scene and paddock bytes, model version, masking settings)
+are hashed; a property whose hash equals the input_hash of its latest catalogued
+run is skipped. Runs go to per-property folders from storage.new_run_folder, and
+a report is written to STORAGE_DIR/batches/<timestamp>.json.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import hashlib
+import json
+import logging
+import time
+from .infer import run_inference, inference_pool
+from .ml.model import load_model, model_version
+from .storage import new_run_folder, query_runs, update_run
+from .config import (MODEL_PATH, STORAGE_DIR, INFERENCE_WORKERS, INFERENCE_WINDOW_SIZE,
+                     MASK_CLOUDS, CLOUD_BLUE_THRESHOLD, TILE_SEED_ZOOMS, BATCH_CONCURRENCY)
+
+logger = logging.getLogger("batch")
+
+def load_manifest(path) -> List[dict]:
+    """Manifest entries with scene / paddocks resolved against the manifest's folder."""
+    path = Path(path)
+    with open(path) as f:
+        data = json.load(f)
+    entries = data["properties"] if isinstance(data, dict) else data
+    out = []
+    for e in entries:
+        if not e.get("id") or not e.get("scene"):
+            raise ValueError("manifest entries need an id and a scene: %r" % (e,))
+        entry = dict(e, scene=str(path.parent / e["scene"]))
+        if e.get("paddocks"):
+            entry["paddocks"] = str(path.parent / e["paddocks"])
+        out.append(entry)
+    ids = [e["id"] for e in out]
+    if len(set(ids)) != len(ids):
+        raise ValueError("duplicate property ids in manifest")
+    return out
+
+def _hash_file(h, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+def input_hash(entry: dict, model_path: str = MODEL_PATH) -> str:
+    """Content hash of everything that determines a property's outputs."""
+    h = hashlib.sha1()
+    _hash_file(h, entry["scene"])
+    if entry.get("paddocks"):
+        _hash_file(h, entry["paddocks"])
+    h.update(json.dumps({"model": model_version(model_path), "mask_clouds": MASK_CLOUDS,
+                         "cloud_threshold": CLOUD_BLUE_THRESHOLD}, sort_keys=True).encode())
+    return h.hexdigest()
+
+def last_input_hash(property_id: str) -> Optional[str]:
+    """input_hash of the property's newest catalogued run that recorded one."""
+    entries, _ = query_runs(property_id)
+    for e in entries:
+        if e.get("input_hash"):
+            return e["input_hash"]
+    return None
+
+def _run_property(entry: dict, model_path: str, pool, workers: int, force: bool, window_size: int,
+                  seed_zooms) -> dict:
+    started = time.perf_counter()
+    result = {"property": entry["id"], "scene": entry["scene"]}
+    try:
+        h = input_hash(entry, model_path)
+        result["input_hash"] = h
+        if not force and last_input_hash(entry["id"]) == h:
+            logger.info("Skipping %s: inputs unchanged", entry["id"])
+            return dict(result, status="skipped", seconds=time.perf_counter() - started)
+        folder = new_run_folder(property_id=entry["id"])
+        res = run_inference(entry["scene"], model_path=model_path, out_folder=str(folder),
+                            window_size=window_size, seed_zooms=seed_zooms, paddocks=entry.get("paddocks"),
+                            property_id=entry["id"], workers=workers, pool=pool)
+        update_run(folder.name, input_hash=h, scene=entry["scene"])
+        result.update(status="ran", run=folder.name, throughput_mpx_s=res["throughput_mpx_s"],
+                      megapixels=res["metrics"]["megapixels"])
+    except Exception as e:
+        logger.exception("Property %s failed", entry["id"])
+        result.update(status="failed", error="%s: %s" % (type(e).__name__, e))
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def run_batch(manifest, model_path: str = MODEL_PATH, workers: int = INFERENCE_WORKERS,
+              concurrency: int = BATCH_CONCURRENCY, force: bool = False,
+              window_size: int = INFERENCE_WINDOW_SIZE, seed_zooms=TILE_SEED_ZOOMS) -> dict:
+    """
+    Run every manifest property (see module docstring) and return the batch report:
+    per-property status ("ran", "skipped" or "failed"), run id, timings, and totals.
+    """
+    entries = load_manifest(manifest) if not isinstance(manifest, list) else manifest
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    load_model(model_path)  # once, before any thread needs it
+    pool = inference_pool(model_path, workers, MASK_CLOUDS) if workers > 1 else None
+    try:
+        with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="batch") as threads:
+            results = list(threads.map(
+                lambda e: _run_property(e, model_path, pool, workers, force, window_size, seed_zooms), entries))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - started
+    megapixels = sum(r.get("megapixels", 0) for r in results)
+    report = {
+        "started": started_at.isoformat(),
+        "seconds": elapsed,
+        "workers": workers,
+        "concurrency": concurrency,
+        "megapixels": megapixels,
+        "throughput_mpx_s": megapixels / elapsed if elapsed else None,
+        "counts": {s: sum(r["status"] == s for r in results) for s in ("ran", "skipped", "failed")},
+        "properties": results,
+    }
+    out = STORAGE_DIR / "batches" / (started_at.strftime("%Y-%m-%dT%H-%M-%SZ") + ".json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Batch of %d properties in %.1fs: %s (%.2f MP/s)", len(entries), elapsed, report["counts"],
+                report["throughput_mpx_s"] or 0)
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the pipeline for every property in a manifest")
+    parser.add_argument("manifest", help="JSON manifest of {id, scene, paddocks?} entries")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS,
+                        help="Worker processes shared by all properties")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Properties processed at the same time")
+    parser.add_argument("--force", action="store_true", help="Re-run properties whose inputs are unchanged")
+    args = parser.parse_args()
+    report = run_batch(args.manifest, model_path=args.model, workers=args.workers,
+                       concurrency=args.concurrency, force=args.force)
+    print(json.dumps(report, indent=2))
+    if report["counts"]["failed"]:
+        raise SystemExit(1)
@@ -4,11 +4,59 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 STORAGE_DIR = BASE_DIR / "storage"
 MODEL_PATH = os.environ.get("MODEL_PATH", str(BASE_DIR / "ml" / "model.joblib"))
+# joblib mmap_mode for loading the model ("r" reads arrays via the shared page cache; "" reads into memory)
+MODEL_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None
 COPERNICUS_USER = os.environ.get("COPERNICUS_USER", "")
 COPERNICUS_PASS = os.environ.get("COPERNICUS_PASS", "")
+# Scene acquisition (data/downloader.py): parallel range requests / band fetches, part size,
+# per-request timeout (s), and the clipped-scene cache with its LRU size limit
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_CHUNK_MB = int(os.environ.get("DOWNLOAD_CHUNK_MB", "8"))
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT", "60"))
+SCENE_CACHE_DIR = Path(os.environ.get("SCENE_CACHE_DIR", str(STORAGE_DIR / "scene_cache")))
+SCENE_CACHE_MAX_GB = float(os.environ.get("SCENE_CACHE_MAX_GB", "20"))
 BACKEND_HOST = os.environ.get("BACKEND_HOST", "0.0.0.0")
 BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8000"))
+# Side length (pixels) of the square windows run_inference streams through; 0 = whole scene
+INFERENCE_WINDOW_SIZE = int(os.environ.get("INFERENCE_WINDOW_SIZE", "1024"))
+# Worker processes used by run_inference; 1 keeps everything in-process
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+# In-memory tile LRU size (entries) and zoom levels pre-rendered at the end of each run
+TILE_CACHE_SIZE = int(os.environ.get("TILE_CACHE_SIZE", "1024"))
+TILE_SEED_ZOOMS = [int(z) for z in os.environ.get("TILE_SEED_ZOOMS", "10,11,12,13").split(",") if z.strip()]
+# Write run outputs as Cloud-Optimized GeoTIFFs (tiled, compressed, with overviews)
+OUTPUT_COG = os.environ.get("OUTPUT_COG", "1") == "1"
+COG_COMPRESS = os.environ.get("COG_COMPRESS", "DEFLATE")
+COG_BLOCKSIZE = int(os.environ.get("COG_BLOCKSIZE", "512"))
+# How runs keep their source imagery: "store" (one content-addressed copy per scene under
+# STORAGE_DIR/imagery, linked into each run), "copy" (full copy per run) or "preview"
+# (only a downsampled RGB COG of at most IMAGERY_PREVIEW_SIZE pixels per side)
+IMAGERY_MODE = os.environ.get("IMAGERY_MODE", "store")
+IMAGERY_PREVIEW_SIZE = int(os.environ.get("IMAGERY_PREVIEW_SIZE", "1024"))
+# Open raster handles kept by the /point query pool
+DATASET_POOL_SIZE = int(os.environ.get("DATASET_POOL_SIZE", "32"))
 
-# Ensure storage exists
-STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+# Background pipeline jobs: how many run at once and how many may wait
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "1"))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "8"))
+# Batch pipeline (backend.app.batch): properties processed at the same time over the shared worker pool
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "2"))
+# Paddock polygons (GeoJSON) summarised per run; empty disables per-paddock stats
+PADDOCKS_PATH = os.environ.get("PADDOCKS_PATH", str(Path(__file__).resolve().parent / "data" / "sample_property.geojson"))
+# Steps (months) covered by the rolling NDVI statistics in the time-series cube
+TIMESERIES_ROLLING = int(os.environ.get("TIMESERIES_ROLLING", "3"))
+# Dump a cProfile of each run_inference call to <run>/profile.pstats (pstats / snakeviz readable)
+PROFILE_RUNS = os.environ.get("PROFILE_RUNS", "0") == "1"
+# Skip the forest for cloud / nodata pixels (bright blue, source nodata, S2 SCL band) and
+# write them straight to the cloud class; blue reflectance (0-1) above which a pixel is cloud
+MASK_CLOUDS = os.environ.get("MASK_CLOUDS", "1") == "1"
+CLOUD_BLUE_THRESHOLD = float(os.environ.get("CLOUD_BLUE_THRESHOLD", "0.4"))
+# Training: per-class reservoir size and where sampled feature matrices are cached
+TRAINING_SAMPLES_PER_CLASS = int(os.environ.get("TRAINING_SAMPLES_PER_CLASS", "50000"))
+TRAINING_CACHE_DIR = Path(os.environ.get("TRAINING_CACHE_DIR", str(STORAGE_DIR / "training_cache")))
+# Feature set new models are trained on ("base" per-pixel, "context" adds neighbourhood NDVI/BSI
+# statistics, see ml.features.FEATURE_SETS); inference always uses the set saved with the model
+FEATURE_SET = os.environ.get("FEATURE_SET", "base")
+
+# STORAGE_DIR and its subfolders are created by whatever first writes there (storage.new_run_folder, ...)
 
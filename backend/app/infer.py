@@ -3,118 +3,412 @@ Inference utilities and a CLI to run the demo pipeline.
 Also provides a small function that the API uses to perform inference on input geometry.
 
 Outputs:
- - imagery.tif  (source/synthetic)
+ - imagery.tif  (source/synthetic, COG with averaged overviews by default; for catalogued runs a
+                 link to the content-addressed imagery store, see storage.save_imagery)
+ - preview.tif  (downsampled RGB COG, instead of imagery.tif when imagery_mode="preview")
  - classification.tif (INT8)
- - summary.geojson (areas per class)
+ - probabilities.tif (UINT8 per-class probabilities, scaled 0-255)
+ - change.tif (UINT8 NDVI change class vs the previous run on the same grid, when appended to the time series)
+ - summary.geojson (FeatureCollection: per-paddock class areas and index means, scene class areas)
+ - for catalogued runs, the same statistics as rows of the STORAGE_DIR/stats Parquet dataset (see runstats.py)
 """
 import argparse
+import cProfile
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import numpy as np
 import rasterio
-from rasterio.transform import from_origin
-from rasterio import Affine
+from rasterio.transform import array_bounds
+from rasterio.windows import Window
+from rasterio.warp import transform_bounds
 import json
-from .ml.features import ndvi, ndwi, bsi, simple_cloud_mask
-from .ml.model import load_model
-from .storage import new_run_folder, save_summary_geojson
-from .config import MODEL_PATH
+from .ml.features import feature_stack, invalid_mask, CLOUD_CLASS, INDEX_COLUMNS, N_FEATURES
+from .ml.raster_io import BlockBuffers, iter_windows, read_bands, read_context
+from .ml.model import load_model, model_feature_set, model_version
+from .metrics import RunMetrics, activate, current, registry, stage
+from .storage import new_run_folder, save_summary_geojson, save_imagery, resolve_imagery, write_cog, is_catalogued
+from .tiles import seed_tiles
+from .zonal import load_paddocks, paddock_labels, row_areas, zones_dir, ZonalAccumulator
+from .config import (MODEL_PATH, INFERENCE_WINDOW_SIZE, INFERENCE_WORKERS, TILE_SEED_ZOOMS,
+                     OUTPUT_COG, COG_BLOCKSIZE, PADDOCKS_PATH, MASK_CLOUDS, CLOUD_BLUE_THRESHOLD,
+                     PROFILE_RUNS, IMAGERY_MODE, TRAINING_CACHE_DIR)
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("infer")
 
-def read_imagery(path: str):
+@stage("read")
+def read_imagery(path: str, window: Window = None):
     with rasterio.open(path) as src:
-        arrs = [src.read(i) for i in range(1, min(6, src.count)+1)]
+        arr = src.read(indexes=list(range(1, min(6, src.count)+1)), window=window)  # B, H, W
         meta = src.meta.copy()
-    arr = np.stack(arrs, axis=0)  # B, H, W
     return arr, meta
 
-def extract_features_from_array(arr: np.ndarray):
+def extract_features_from_array(arr: np.ndarray, out: np.ndarray = None):
     """
     arr: B, H, W in order B02,B03,B04,B08,B11,B12
+    out: optional preallocated float32 (H*W, 9) buffer, see features.feature_stack
     returns feature array: H*W x features
     """
-    blue = arr[0].astype(float)
-    green = arr[1].astype(float)
-    red = arr[2].astype(float)
-    nir = arr[3].astype(float)
-    swir1 = arr[4].astype(float)
-    swir2 = arr[5].astype(float)
-    ndvi_img = ndvi(nir, red)
-    ndwi_img = ndwi(green, nir)
-    bsi_img = bsi(blue, red, nir, swir1)
-    H, W = blue.shape
-    X = np.column_stack([
-        blue.reshape(-1),
-        green.reshape(-1),
-        red.reshape(-1),
-        nir.reshape(-1),
-        swir1.reshape(-1),
-        swir2.reshape(-1),
-        ndvi_img.reshape(-1),
-        ndwi_img.reshape(-1),
-        bsi_img.reshape(-1),
-    ])
+    _, H, W = arr.shape
+    X = feature_stack(arr, out=out)
     return X, (H, W)
 
-def run_inference(imagery_tif: str, model_path: str = MODEL_PATH, out_folder: str = None):
-    # Read imagery
-    arr, meta = read_imagery(imagery_tif)
-    X, (H, W) = extract_features_from_array(arr)
-    # Load model
+def _scl_index(src):
+    """1-based index of a band described as "SCL" (Sentinel-2 scene classification), or None."""
+    for i, desc in enumerate(src.descriptions, start=1):
+        if desc and desc.upper() == "SCL":
+            return i
+    return None
+
+def read_block(src, window: Window, mask_clouds: bool = MASK_CLOUDS, buffers: BlockBuffers = None):
+    """
+    Spectral bands of one window (see read_bands) plus its invalid-pixel mask
+    (features.invalid_mask from the blue band, src.nodata and an SCL band if the
+    file has one), or None for the mask when mask_clouds is off.
+    """
+    with stage("read"):
+        arr = read_bands(src, window, buffers)
+    if not mask_clouds:
+        return arr, None
+    with stage("mask"):
+        scl = _scl_index(src)
+        return arr, invalid_mask(arr, src.nodata, src.read(scl, window=window) if scl else None,
+                                 threshold=CLOUD_BLUE_THRESHOLD)
+
+def predict_block(model, arr: np.ndarray, mask: np.ndarray = None, buffers: BlockBuffers = None,
+                  context: np.ndarray = None):
+    """
+    arr: B, h, w band block; mask: optional (h, w) bool, True where the pixel is
+    cloud / nodata. Masked pixels skip feature extraction and the forest and are
+    written as CLOUD_CLASS with probability 255 for that class (0 elsewhere).
+    buffers: optional BlockBuffers whose float32 feature matrix is reused.
+    context: optional (h*w, k) read_context block appended after the per-pixel features.
+    returns (class block (h, w) uint8, probability block (n_classes, h, w) uint8 scaled 0-255,
+    index block (3, h, w) float32 NDVI / NDWI / BSI from the same features, 0 where masked)
+    Labels come from the argmax of a single predict_proba pass, exactly as the
+    forest's own predict() derives them, so the trees are only traversed once.
+    """
+    _, h, w = arr.shape
+    width = N_FEATURES + (context.shape[1] if context is not None else 0)
+
+    def features_out(n):
+        if buffers is not None:
+            return buffers.features(n, width)
+        return np.empty((n, width), dtype=np.float32) if context is not None else None
+
+    if mask is None or not mask.any():
+        with stage("features"):
+            X, _ = extract_features_from_array(arr, out=features_out(h * w))
+            if context is not None:
+                X[:, N_FEATURES:] = context
+        with stage("predict"):
+            proba = model.predict_proba(X)
+            preds = model.classes_.take(np.argmax(proba, axis=1))
+        class_block = preds.reshape(h, w).astype('uint8')
+        proba_block = np.rint(proba.T * 255).astype('uint8').reshape(-1, h, w)
+        # copied out: X may be the reused feature buffer
+        return class_block, proba_block, X[:, INDEX_COLUMNS].T.copy().reshape(-1, h, w)
+    valid = ~mask.reshape(-1)
+    class_block = np.full(h * w, CLOUD_CLASS, dtype=np.uint8)
+    proba_block = np.zeros((len(model.classes_), h * w), dtype=np.uint8)
+    proba_block[model.classes_ == CLOUD_CLASS, :] = 255
+    index_block = np.zeros((3, h * w), dtype=np.float32)
+    if valid.any():
+        # valid pixels as a 1-pixel-high strip: feature_stack only sees what the forest needs
+        with stage("features"):
+            strip = arr.reshape(arr.shape[0], 1, -1)[:, :, valid]
+            X, _ = extract_features_from_array(strip, out=features_out(strip.shape[2]))
+            if context is not None:
+                X[:, N_FEATURES:] = context[valid]
+        with stage("predict"):
+            proba = model.predict_proba(X)
+            class_block[valid] = model.classes_.take(np.argmax(proba, axis=1))
+        proba_block[:, valid] = np.rint(proba.T * 255)
+        index_block[:, valid] = X[:, INDEX_COLUMNS].T
+    return class_block.reshape(h, w), proba_block.reshape(-1, h, w), index_block.reshape(-1, h, w)
+
+# Per-process state for pool workers: the model is loaded once in _init_worker and source
+# datasets are opened on first use and kept open, so neither is pickled per task and one
+# pool can serve many scenes.
+_worker = {}
+WORKER_OPEN_SCENES = 4
+
+def _init_worker(model_path: str, mask_clouds: bool = MASK_CLOUDS):
     model = load_model(model_path)
-    proba = model.predict_proba(X)
-    preds = model.predict(X)
-    # reshape back
-    class_raster = preds.reshape(H, W).astype('uint8')
-    # Save classification GeoTIFF aligned with source
+    if hasattr(model, "n_jobs"):
+        # the pool already spreads work across cores; avoid oversubscribing each one
+        model.n_jobs = 1
+    _worker.update(model=model, feature_set=model_feature_set(model), mask_clouds=mask_clouds,
+                   buffers=BlockBuffers(), srcs=OrderedDict())
+
+def _worker_src(imagery_tif: str):
+    srcs = _worker["srcs"]
+    key = (imagery_tif, Path(imagery_tif).stat().st_mtime_ns)
+    src = srcs.get(key)
+    if src is None:
+        src = srcs[key] = rasterio.open(imagery_tif)
+        while len(srcs) > WORKER_OPEN_SCENES:
+            srcs.popitem(last=False)[1].close()
+    srcs.move_to_end(key)
+    return src
+
+def _predict_window(imagery_tif: str, window: Window, indices: bool = False):
+    """
+    (class_block, proba_block, index_block or None, stage totals) for one window;
+    timings travel back with the result, the indices only when asked for.
+    """
+    buffers = _worker["buffers"]
+    with activate(RunMetrics()) as m:
+        src = _worker_src(imagery_tif)
+        arr, mask = read_block(src, window, _worker["mask_clouds"], buffers)
+        context = read_context(src, window, _worker["feature_set"])
+        class_block, proba_block, index_block = predict_block(_worker["model"], arr, mask, buffers, context)
+    return class_block, proba_block, index_block if indices else None, m.stages
+
+def _pool_result(fut):
+    class_block, proba_block, index_block, stages = fut.result()
+    if current() is not None:
+        current().merge(stages)
+    return class_block, proba_block, index_block
+
+def inference_pool(model_path: str, workers: int, mask_clouds: bool = MASK_CLOUDS) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers each hold the model, for classify_windows(pool=...).
+    It can be shared by any number of scenes (and threads) classified with that model.
+    """
+    # spawn rather than fork: GDAL and the BLAS/OpenMP thread pools are not fork-safe
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                               initargs=(str(model_path), mask_clouds))
+
+def classify_windows(imagery_tif: str, model_path: str, windows, workers: int = 1, model=None,
+                     mask_clouds: bool = MASK_CLOUDS, pool=None, indices: bool = False):
+    """
+    Yield (window, class_block, proba_block, index_block) for each window, in the
+    order given; index_block (see predict_block) is None unless indices=True.
+    With workers > 1 windows are dispatched to a process pool; at most 2 * workers
+    blocks are in flight so memory stays bounded while output order stays deterministic.
+    mask_clouds: see read_block / predict_block.
+    Features follow the feature set saved with the model (ml.model.model_feature_set),
+    neighbourhood columns via read_context.
+    pool: an inference_pool to use instead of starting one (its own model and
+    mask_clouds apply; workers is taken from the pool).
+    """
+    if pool is not None:
+        yield from _classify_in_pool(pool, str(imagery_tif), windows, pool._max_workers, indices)
+        return
+    if workers <= 1:
+        if model is None:
+            with stage("model_load"):
+                model = load_model(model_path)
+        buffers = BlockBuffers()
+        feature_set = model_feature_set(model)
+        with rasterio.open(imagery_tif) as src:
+            for window in windows:
+                arr, mask = read_block(src, window, mask_clouds, buffers)
+                context = read_context(src, window, feature_set)
+                class_block, proba_block, index_block = predict_block(model, arr, mask, buffers, context)
+                yield window, class_block, proba_block, index_block if indices else None
+        return
+    with inference_pool(model_path, workers, mask_clouds) as pool:
+        yield from _classify_in_pool(pool, str(imagery_tif), windows, workers, indices)
+
+def _classify_in_pool(pool, imagery_tif: str, windows, workers: int, indices: bool):
+    pending = deque()
+    for window in windows:
+        pending.append((window, pool.submit(_predict_window, imagery_tif, window, indices)))
+        if len(pending) >= 2 * workers:
+            done, fut = pending.popleft()
+            yield (done, *_pool_result(fut))
+    while pending:
+        done, fut = pending.popleft()
+        yield (done, *_pool_result(fut))
+
+def run_inference(imagery_tif: str, model_path: str = MODEL_PATH, out_folder: str = None,
+                  window_size: int = INFERENCE_WINDOW_SIZE, workers: int = INFERENCE_WORKERS,
+                  seed_zooms=TILE_SEED_ZOOMS, cog: bool = OUTPUT_COG, progress=None,
+                  property_id: str = None, paddocks: str = PADDOCKS_PATH, timeseries: bool = None,
+                  mask_clouds: bool = MASK_CLOUDS,
+                  profile: bool = PROFILE_RUNS, pool=None, imagery_mode: str = IMAGERY_MODE):
+    """
+    Classify imagery_tif window by window and write classification.tif and
+    probabilities.tif (one uint8 band per class, probability * 255) incrementally.
+    Peak memory is bounded by window_size (features for window_size**2 pixels at a time);
+    window_size=0 processes the whole scene as a single block.
+    workers > 1 spreads windows over a process pool; output is identical to workers=1.
+    Tiles for seed_zooms are pre-rendered into <out_folder>/tiles for the /tile endpoint.
+    With cog=True all rasters are written as Cloud-Optimized GeoTIFFs (see storage.write_cog).
+    progress, if given, is called as progress(windows_done, windows_total) after each window.
+    property_id tags the run in the storage catalogue (and its folder name).
+    paddocks is a GeoJSON FeatureCollection of paddock polygons; summary.geojson gets
+    one Feature per paddock with class areas, mean indices and cloud fraction.
+    timeseries appends the run to its grid's time-series cube and writes change.tif;
+    by default only runs catalogued under STORAGE_DIR are appended.
+    mask_clouds writes cloud / nodata pixels (see read_block) as CLOUD_CLASS without
+    running the forest on them, so cost scales with the cloud-free area.
+    Per-stage wall/CPU time and RSS (see metrics.py) are written to <out_folder>/metrics.json,
+    returned under "metrics" and fed to the /metrics registry; profile=True also dumps a
+    cProfile of the run (main process only) to <out_folder>/profile.pstats.
+    pool: a shared inference_pool (see batch.py); replaces workers and mask_clouds for
+    the classification itself.
+    imagery_mode: how the source imagery is kept ("store", "copy" or "preview", see
+    storage.save_imagery).
+    """
     if out_folder is None:
-        out_folder = new_run_folder()
+        out_folder = new_run_folder(property_id=property_id)
     else:
         out_folder = Path(out_folder)
         out_folder.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile() if profile else None
+    with activate(RunMetrics()) as run_metrics:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            res = _run_pipeline(imagery_tif, model_path, out_folder, window_size, workers, seed_zooms, cog,
+                                progress, paddocks, timeseries, mask_clouds, pool, imagery_mode)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(str(out_folder / "profile.pstats"))
+    metrics = dict(run_metrics.as_dict(), run=out_folder.name, megapixels=res.pop("megapixels"),
+                   throughput_mpx_s=res["throughput_mpx_s"], window_size=window_size, workers=workers,
+                   mask_clouds=mask_clouds)
+    with open(out_folder / "metrics.json", "w") as f:
+        json.dump(metrics, f, indent=2)
+    registry.observe_run(metrics, metrics["megapixels"])
+    logger.info("Stage seconds: %s", {k: round(v["seconds"], 3) for k, v in metrics["stages"].items()})
+    res["metrics"] = metrics
+    return res
 
+def _run_pipeline(imagery_tif, model_path, out_folder: Path, window_size, workers, seed_zooms, cog,
+                  progress, paddocks, timeseries, mask_clouds, pool, imagery_mode) -> dict:
+    with stage("model_load"):
+        model = load_model(model_path)
+    class_path = out_folder / "classification.tif"
+    proba_path = out_folder / "probabilities.tif"
+    started = time.perf_counter()
+    with rasterio.open(imagery_tif) as src:
+        meta = src.meta.copy()
+    # Save classification GeoTIFF aligned with source
     class_meta = meta.copy()
     class_meta.update({
         "count": 1,
         "dtype": "uint8"
     })
-    class_path = out_folder / "classification.tif"
-    with rasterio.open(class_path, "w", **class_meta) as dst:
-        dst.write(class_raster, 1)
-
-    # Also copy the source imagery to output folder for display
-    imagery_out = out_folder / "imagery.tif"
-    # For simplicity, copy file
-    import shutil
-    shutil.copy(imagery_tif, imagery_out)
-
-    # Summarize area per class (pixel counts -> approximate areas)
-    unique, counts = np.unique(class_raster, return_counts=True)
-    summary = {"date": datetime.utcnow().isoformat(), "classes": []}
-    pixel_area = abs(meta['transform'][0] * meta['transform'][4])  # approx
-    for c, cnt in zip(unique.tolist(), counts.tolist()):
-        summary["classes"].append({
-            "class": int(c),
-            "pixels": int(cnt),
-            "approx_area_m2": float(cnt * pixel_area)
-        })
-    summary_path = save_summary_geojson(out_folder, summary)
+    if cog:
+        # stream into tiled scratch files, then translate to COG once overviews can be built
+        class_meta.update({"tiled": True, "blockxsize": COG_BLOCKSIZE, "blockysize": COG_BLOCKSIZE})
+    proba_meta = class_meta.copy()
+    proba_meta["count"] = len(model.classes_)
+    class_tmp = out_folder / "classification.partial.tif" if cog else class_path
+    proba_tmp = out_folder / "probabilities.partial.tif" if cog else proba_path
+    windows = list(iter_windows(meta["height"], meta["width"], window_size))
+    shape = (meta["height"], meta["width"])
+    with stage("paddock_labels"):
+        paddock_features = load_paddocks(paddocks) if paddocks else []
+        labels = (paddock_labels(paddocks, meta["crs"], meta["transform"], shape, zones_dir(out_folder))
+                  if paddocks else np.zeros(shape, dtype=np.uint8))
+    zones = ZonalAccumulator(len(paddock_features), row_areas(meta["crs"], meta["transform"], shape[0]),
+                             n_classes=max(int(max(model.classes_)), CLOUD_CLASS) + 1)
+    done = 0
+    with rasterio.open(class_tmp, "w", **class_meta) as dst, \
+            rasterio.open(proba_tmp, "w", **proba_meta) as proba_dst:
+        proba_dst.update_tags(classes=",".join(str(int(c)) for c in model.classes_), scale=str(1 / 255))
+        for band, c in enumerate(model.classes_, start=1):
+            proba_dst.set_band_description(band, "class_%d" % int(c))
+        # paddock means reuse the indices the forest's features already hold for each window
+        for window, class_block, proba_block, index_block in classify_windows(
+                imagery_tif, model_path, windows, workers, model=model, mask_clouds=mask_clouds, pool=pool,
+                indices=bool(paddock_features)):
+            with stage("write"):
+                dst.write(class_block, 1, window=window)
+                proba_dst.write(proba_block, window=window)
+            rows, cols = window.toslices()
+            with stage("zonal"):
+                zones.add(labels[rows, cols], class_block, index_block, window.row_off)
+            done += 1
+            if progress is not None:
+                progress(done, len(windows))
+    elapsed = time.perf_counter() - started
+    megapixels = meta["height"] * meta["width"] / 1e6
+    logger.info("Classified %.2f MP in %.2fs with %d worker(s): %.2f MP/s",
+                megapixels, elapsed, pool._max_workers if pool is not None else workers, megapixels / elapsed)
+
+    if cog:
+        with stage("cog"):
+            for tmp, final in ((class_tmp, class_path), (proba_tmp, proba_path)):
+                write_cog(tmp, final, resampling="nearest")
+                tmp.unlink()
+    with stage("imagery"):
+        # Keep the source imagery for display / point queries without a full copy per run
+        save_imagery(imagery_tif, out_folder, imagery_mode, cog)
+
+    with stage("summary"):
+        # Summarize geodesic area per class over the scene and per paddock
+        summary = {
+            "type": "FeatureCollection",
+            "date": datetime.utcnow().isoformat(),
+            "classes": zones.scene_classes(),
+            "features": zones.features(paddock_features),
+        }
+        summary_path = save_summary_geojson(
+            out_folder, summary,
+            bounds=list(transform_bounds(meta["crs"], "EPSG:4326",
+                                         *array_bounds(meta["height"], meta["width"], meta["transform"]))),
+            model_version=model_version(model_path))
+    if timeseries is None:
+        timeseries = is_catalogued(out_folder)
+    if timeseries:
+        from .timeseries import append_run
+        with stage("timeseries"):
+            append_run(out_folder, summary["date"], window_size=window_size, cog=cog, imagery=imagery_tif)
+    if is_catalogued(out_folder):
+        from .runstats import export_run_stats
+        with stage("stats"):
+            try:
+                export_run_stats(out_folder, summary)
+            except Exception as e:
+                # the stats dataset is derived and can be backfilled; never fail the run over it
+                logger.warning("Stats export failed for %s: %s", out_folder, e)
+    if seed_zooms:
+        with stage("tiles"):
+            seed_tiles(out_folder, seed_zooms)
+            if (out_folder / "change.tif").exists():
+                seed_tiles(out_folder, seed_zooms, layer="change")
     logger.info("Wrote outputs to %s", out_folder)
     return {
         "folder": str(out_folder),
         "classification_tif": str(class_path),
-        "imagery_tif": str(imagery_out),
-        "summary": summary
+        "probabilities_tif": str(proba_path),
+        "imagery_tif": str(resolve_imagery(out_folder) or "") or None,
+        "preview_tif": str(out_folder / "preview.tif") if imagery_mode == "preview" else None,
+        "summary": summary,
+        "throughput_mpx_s": megapixels / elapsed,
+        "megapixels": megapixels,
     }
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser()
     parser.add_argument("--imagery", default="demo/sample_sentinel.tif", help="Input imagery (demo)")
     parser.add_argument("--model", default=MODEL_PATH, help="Model path")
     parser.add_argument("--out", default=None, help="Output folder (optional)")
+    parser.add_argument("--window-size", type=int, default=INFERENCE_WINDOW_SIZE,
+                        help="Window side length in pixels for streaming inference (0 = whole scene)")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS,
+                        help="Number of worker processes for tiled inference")
+    parser.add_argument("--no-cog", dest="cog", action="store_false", default=OUTPUT_COG,
+                        help="Write plain GeoTIFFs instead of Cloud-Optimized GeoTIFFs")
+    parser.add_argument("--no-cloud-mask", dest="mask_clouds", action="store_false", default=MASK_CLOUDS,
+                        help="Run the model on every pixel instead of writing cloud/nodata straight to class 3")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_RUNS,
+                        help="Dump a cProfile of the run to <run>/profile.pstats")
+    parser.add_argument("--imagery-mode", choices=("store", "copy", "preview"), default=IMAGERY_MODE,
+                        help="Link the scene from the imagery store, copy it, or keep only an RGB preview")
     parser.add_argument("--demo-run", action="store_true", help="Run demo pipeline: generate data, train model, infer")
     args = parser.parse_args()
     if args.demo_run:
@@ -122,11 +416,17 @@ if __name__ == "__main__":
         import demo.generate_sample_data as gen
         gen.main()  # create demo/sample_sentinel.tif
         from .ml.train_demo import train_and_save
-        train_and_save()
+        train_and_save(cache_dir=TRAINING_CACHE_DIR)
         from .config import STORAGE_DIR
-        res = run_inference("demo/sample_sentinel.tif", out_folder=None)
+        res = run_inference("demo/sample_sentinel.tif", out_folder=None,
+                            window_size=args.window_size, workers=args.workers, cog=args.cog,
+                            mask_clouds=args.mask_clouds, profile=args.profile,
+                            imagery_mode=args.imagery_mode)
         print(res)
     else:
-        res = run_inference(args.imagery, model_path=args.model, out_folder=args.out)
+        res = run_inference(args.imagery, model_path=args.model, out_folder=args.out,
+                            window_size=args.window_size,
+                            workers=args.workers, cog=args.cog, mask_clouds=args.mask_clouds,
+                            profile=args.profile, imagery_mode=args.imagery_mode)
         print(res)
 
@@ -0,0 +1,121 @@
+"""
+Minimal in-process background job queue for long-running pipeline runs.
+
+Jobs run on a bounded thread pool (JOB_CONCURRENCY at a time, at most
+JOB_QUEUE_LIMIT waiting); the CPU-heavy work inside them is already spread over
+processes by run_inference's worker pool. Submitting a job whose dedup key
+matches one that is still queued or running returns the existing job instead
+of starting a duplicate. State lives in memory, so it is per API process.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Optional
+import logging
+import time
+import uuid
+from .config import JOB_CONCURRENCY, JOB_QUEUE_LIMIT
+
+logger = logging.getLogger("jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, key: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = QUEUED
+        self.progress = 0.0
+        self.done = 0
+        self.total = 0
+        self.created = datetime.utcnow().isoformat()
+        self.started = None
+        self.finished = None
+        self.timings = {}
+        self.result = None
+        self.error = None
+
+    def report(self, done: int, total: int):
+        """Progress callback: done of total units (e.g. windows) processed."""
+        self.done, self.total = done, total
+        self.progress = done / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "done": self.done,
+            "total": self.total,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "timings": self.timings,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, queue_limit: int = JOB_QUEUE_LIMIT):
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+        self._queue_limit = queue_limit
+        self._jobs = {}
+        self._active = {}  # dedup key -> job still queued/running
+        self._lock = Lock()
+
+    def submit(self, key: str, fn: Callable, params: dict) -> Job:
+        """
+        Queue fn(job, **params) unless an identical job (same key) is in flight,
+        in which case that job is returned. Raises QueueFull past the queue limit.
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None:
+                return existing
+            queued = sum(1 for j in self._active.values() if j.status == QUEUED)
+            if queued >= self._queue_limit:
+                raise QueueFull("%d jobs already queued" % queued)
+            job = Job(key, params)
+            self._jobs[job.id] = job
+            self._forget_old()
+            self._active[key] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable):
+        job.status = RUNNING
+        job.started = datetime.utcnow().isoformat()
+        t0 = time.perf_counter()
+        status = FAILED
+        try:
+            job.result = fn(job, **job.params)
+            status = SUCCEEDED
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = "%s: %s" % (type(e).__name__, e)
+        finally:
+            job.timings["total"] = time.perf_counter() - t0
+            with self._lock:
+                # leave the dedup table before the job is visibly finished
+                self._active.pop(job.key, None)
+                job.finished = datetime.utcnow().isoformat()
+                job.status = status
+
+    def _forget_old(self, keep: int = 1000):
+        # drop the oldest finished jobs so the table doesn't grow without bound
+        finished = [j for j in self._jobs.values() if j.status in (SUCCEEDED, FAILED)]
+        for j in finished[:max(0, len(self._jobs) - keep)]:
+            del self._jobs[j.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [j.as_dict() for j in self._jobs.values()]
+
+jobs = JobManager()
@@ -0,0 +1,189 @@
+"""
+Pipeline instrumentation and Prometheus exposition.
+
+Per-run stage timings: run_inference activates a RunMetrics, and code anywhere
+below it wraps work in `with stage("predict"):` (or decorates a function with
+@stage("model_load")). Each stage accumulates wall time, CPU time, call count
+and the largest resident set size seen when it finishes. Nothing is recorded when
+no run is active, so library callers pay only a context-variable lookup.
+Pool workers record into their own RunMetrics and ship the totals back with
+each window (RunMetrics.merge).
+
+Process-wide metrics for the API live in `registry`: a few hand-rolled
+counters/histograms rendered in the Prometheus text format (version 0.0.4) by
+GET /metrics, so no client library is needed.
+"""
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+import os
+import resource
+import time
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class RunMetrics:
+    """Stage totals for one pipeline run."""
+
+    def __init__(self):
+        self.stages: Dict[str, dict] = {}
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float, cpu_seconds: float, rss: float, calls: int = 1):
+        s = self.stages.setdefault(name, {"seconds": 0.0, "cpu_seconds": 0.0, "calls": 0, "rss_mb_max": 0.0})
+        s["seconds"] += seconds
+        s["cpu_seconds"] += cpu_seconds
+        s["calls"] += calls
+        s["rss_mb_max"] = max(s["rss_mb_max"], rss)
+
+    def merge(self, stages: Dict[str, dict]):
+        for name, s in stages.items():
+            self.record(name, s["seconds"], s["cpu_seconds"], s["rss_mb_max"], s["calls"])
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {k: dict(v, seconds=round(v["seconds"], 6), cpu_seconds=round(v["cpu_seconds"], 6))
+                       for k, v in self.stages.items()},
+        }
+
+_current: ContextVar[Optional[RunMetrics]] = ContextVar("run_metrics", default=None)
+
+def current() -> Optional[RunMetrics]:
+    return _current.get()
+
+class activate:
+    """Make a RunMetrics the target of stage() for the enclosed block."""
+
+    def __init__(self, metrics: RunMetrics):
+        self.metrics = metrics
+
+    def __enter__(self) -> RunMetrics:
+        self._token = _current.set(self.metrics)
+        return self.metrics
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+class stage(ContextDecorator):
+    """Time the enclosed block (or decorated function) as one call of stage `name` of the active run."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _recreate_cm(self):
+        # a fresh timer per decorated call, so nested / concurrent calls don't share state
+        return stage(self.name)
+
+    def __enter__(self):
+        self._metrics = _current.get()
+        if self._metrics is not None:
+            self._t0 = time.perf_counter()
+            self._c0 = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        if self._metrics is not None:
+            self._metrics.record(self.name, time.perf_counter() - self._t0,
+                                 time.process_time() - self._c0, rss_mb())
+        return False
+
+# --- Prometheus ---------------------------------------------------------------
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name, self.doc, self.labelnames = name, doc, labels
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield "# HELP %s %s" % (self.name, self.doc)
+        yield "# TYPE %s counter" % self.name
+        with self._lock:
+            for labels, v in sorted(self._values.items()):
+                yield "%s%s %r" % (self.name, _labels(self.labelnames, labels), v)
+
+class Histogram:
+    def __init__(self, name: str, doc: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name, self.doc, self.labelnames = name, doc, labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            s = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield "# HELP %s %s" % (self.name, self.doc)
+        yield "# TYPE %s histogram" % self.name
+        with self._lock:
+            for labels, s in sorted(self._series.items()):
+                for b, n in zip(self.buckets, s):
+                    yield "%s_bucket%s %d" % (self.name, _labels(self.labelnames, labels, 'le="%r"' % b), n)
+                yield "%s_bucket%s %d" % (self.name, _labels(self.labelnames, labels, 'le="+Inf"'), s[-1])
+                yield "%s_sum%s %r" % (self.name, _labels(self.labelnames, labels), s[-2])
+                yield "%s_count%s %d" % (self.name, _labels(self.labelnames, labels), s[-1])
+
+def gauge_lines(name: str, doc: str, samples: Iterable[Tuple[dict, float]]) -> Iterable[str]:
+    """Gauge computed at scrape time from (labels dict, value) pairs."""
+    yield "# HELP %s %s" % (name, doc)
+    yield "# TYPE %s gauge" % name
+    for labels, value in samples:
+        yield "%s%s %r" % (name, _labels(tuple(labels), tuple(labels.values())), float(value))
+
+class Registry:
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "pipeline_stage_seconds", "Wall time per pipeline stage per run",
+            (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900), labels=("stage",))
+        self.runs = Counter("pipeline_runs_total", "Completed pipeline runs")
+        self.megapixels = Counter("pipeline_megapixels_total", "Megapixels classified")
+        self.tile_seconds = Histogram(
+            "tile_request_seconds", "GET /tile latency", (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+            labels=("layer", "source"))
+
+    def observe_run(self, run_metrics: dict, megapixels: float):
+        for name, s in run_metrics["stages"].items():
+            self.stage_seconds.observe(s["seconds"], name)
+        self.runs.inc()
+        self.megapixels.inc(megapixels)
+
+    def render(self, gauges: Iterable[str] = ()) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.runs, self.megapixels, self.tile_seconds):
+            lines.extend(metric.render())
+        lines.extend(gauges)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
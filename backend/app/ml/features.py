@@ -1,17 +1,86 @@
 """
 Feature extraction utilities.
 Computes indices like NDVI, NDWI, BSI and a simple cloud mask.
+
+Models are trained on a named, versioned FeatureSet (FEATURE_SETS) that is saved
+with the model, so inference always rebuilds the columns the model was fitted on:
+"base" is the per-pixel feature_stack, "context" appends context_features, the
+mean / std of NDVI and BSI over square neighbourhoods, for less speckly maps
+without a convolutional model.
 """
-from typing import Tuple
+from typing import NamedTuple, Tuple
 import numpy as np
+from ..config import CLOUD_BLUE_THRESHOLD
+
+FEATURE_NAMES = ("B02", "B03", "B04", "B08", "B11", "B12", "NDVI", "NDWI", "BSI")
+N_FEATURES = len(FEATURE_NAMES)
+# Feature columns of the spectral indices (NDVI, NDWI, BSI) used for zonal means
+INDEX_COLUMNS = slice(6, 9)
+# Class written for cloud / no-data pixels (the forest's own "Cloud/NoData" label)
+CLOUD_CLASS = 3
+# Sentinel-2 L2A scene classification (SCL) values masked before inference:
+# no data, saturated/defective, cloud shadow, cloud medium/high probability, thin cirrus
+SCL_INVALID = (0, 1, 3, 8, 9, 10)
+# Bump whenever feature values change, so cached training samples are rebuilt
+FEATURE_VERSION = 1
+# Indices summarised over each neighbourhood by context_features
+CONTEXT_INDICES = ("NDVI", "BSI")
+
+class FeatureSet(NamedTuple):
+    """feature_stack columns plus, for each radius, context_features over (2r+1)^2 windows."""
+    name: str
+    version: int
+    radii: Tuple[int, ...] = ()
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return FEATURE_NAMES + tuple("%s_%s_r%d" % (index, stat, r) for r in self.radii
+                                     for index in CONTEXT_INDICES for stat in ("mean", "std"))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.names)
+
+    @property
+    def halo(self) -> int:
+        """Pixels of neighbouring context a block needs on each side."""
+        return max(self.radii, default=0)
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "version": self.version, "radii": list(self.radii)}
+
+FEATURE_SETS = {fs.name: fs for fs in (
+    FeatureSet("base", FEATURE_VERSION),
+    FeatureSet("context", 1, (2, 5, 10)),
+)}
+
+def get_feature_set(spec=None) -> FeatureSet:
+    """
+    The registered FeatureSet for a name or a saved spec (FeatureSet.as_dict());
+    None (models saved before feature sets existed) means "base". A saved spec
+    whose version or radii differ from the registered set is refused: the model
+    was trained on features this code no longer computes.
+    """
+    if spec is None:
+        return FEATURE_SETS["base"]
+    if isinstance(spec, FeatureSet):
+        spec = spec.as_dict()
+    name = spec if isinstance(spec, str) else spec["name"]
+    if name not in FEATURE_SETS:
+        raise ValueError("unknown feature set %r (known: %s)" % (name, ", ".join(FEATURE_SETS)))
+    fs = FEATURE_SETS[name]
+    if isinstance(spec, dict) and (spec["version"] != fs.version or tuple(spec["radii"]) != fs.radii):
+        raise ValueError("model expects feature set %r version %s %s, this code provides version %s %s"
+                         % (name, spec["version"], spec["radii"], fs.version, list(fs.radii)))
+    return fs
 
 def ndvi(nir: np.ndarray, red: np.ndarray) -> np.ndarray:
     """
     NDVI = (NIR - Red) / (NIR + Red)
     """
-    np.seterr(divide='ignore', invalid='ignore')
-    denom = (nir + red).astype(float)
-    nd = (nir - red) / denom
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = (nir + red).astype(float)
+        nd = (nir - red) / denom
     nd[np.isnan(nd)] = 0.0
     return nd
 
@@ -19,9 +88,9 @@ def ndwi(green: np.ndarray, nir: np.ndarray) -> np.ndarray:
     """
     NDWI = (Green - NIR) / (Green + NIR)
     """
-    np.seterr(divide='ignore', invalid='ignore')
-    denom = (green + nir).astype(float)
-    nd = (green - nir) / denom
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = (green + nir).astype(float)
+        nd = (green - nir) / denom
     nd[np.isnan(nd)] = 0.0
     return nd
 
@@ -30,15 +99,115 @@ def bsi(blue: np.ndarray, red: np.ndarray, nir: np.ndarray, swir: np.ndarray) ->
     Bare Soil Index (BSI) simplified:
     BSI = (SWIR + Red - NIR - Blue) / (SWIR + Red + NIR + Blue)
     """
-    np.seterr(divide='ignore', invalid='ignore')
-    denom = (swir + red + nir + blue).astype(float)
-    out = (swir + red - nir - blue) / denom
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = (swir + red + nir + blue).astype(float)
+        out = (swir + red - nir - blue) / denom
     out[np.isnan(out)] = 0.0
     return out
 
-def simple_cloud_mask(blue: np.ndarray, cirrus: np.ndarray = None, threshold: float = 0.2) -> np.ndarray:
+def feature_stack(bands: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Fused feature kernel: B02,B03,B04,B08,B11,B12 + NDVI, NDWI, BSI in one pass.
+
+    bands: B, H, W (B >= 6) in order B02,B03,B04,B08,B11,B12, typically uint16
+    out: optional C-contiguous float32 buffer of shape (H*W, C >= 9); the first 9
+    columns are written, later ones are left for extra blocks (context_features)
+    returns out, one row per pixel (indices are 0 where the denominator is 0)
+
+    Indices are computed with out=/where= ufuncs straight into their columns, so the
+    only temporaries are two float32 scratch rows and the where mask. uint16 band
+    sums are exact in float32, so the values equal the float64 index functions above
+    rounded to float32 (which is what the forest compares against anyway).
+    """
+    _, H, W = bands.shape
+    n = H * W
+    if out is None:
+        out = np.empty((n, N_FEATURES), dtype=np.float32)
+    elif (out.ndim != 2 or out.shape[0] != n or out.shape[1] < N_FEATURES or out.dtype != np.float32
+          or not out.flags.c_contiguous):
+        raise ValueError("out must be a C-contiguous float32 array of shape (%d, >= %d)" % (n, N_FEATURES))
+    for i in range(6):
+        out[:, i] = bands[i].reshape(-1)
+    blue, green, red, nir, swir1 = (out[:, i] for i in range(5))
+    num = np.empty(n, dtype=np.float32)
+    den = np.empty(n, dtype=np.float32)
+
+    def _ratio(col):
+        out[:, col] = 0.0
+        np.divide(num, den, out=out[:, col], where=den != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(nir, red, out=num)
+        np.add(nir, red, out=den)
+        _ratio(6)
+        np.subtract(green, nir, out=num)
+        np.add(green, nir, out=den)
+        _ratio(7)
+        np.add(swir1, red, out=num)
+        np.add(swir1, red, out=den)
+        np.subtract(num, nir, out=num)
+        np.subtract(num, blue, out=num)
+        np.add(den, nir, out=den)
+        np.add(den, blue, out=den)
+        _ratio(8)
+    return out
+
+def _integral(a: np.ndarray) -> np.ndarray:
+    """Summed-area table with a leading zero row and column, in float64."""
+    out = np.zeros((a.shape[0] + 1, a.shape[1] + 1))
+    np.cumsum(a, axis=0, dtype=np.float64, out=out[1:, 1:])
+    np.cumsum(out[1:, 1:], axis=1, out=out[1:, 1:])
+    return out
+
+def _box(table: np.ndarray, r: int, halo: int, h: int, w: int) -> np.ndarray:
+    """Sums over the (2r+1)^2 window around every core pixel of a halo-padded block."""
+    a, b = halo + r + 1, halo - r
+    return table[a:a + h, a:a + w] - table[b:b + h, a:a + w] - table[a:a + h, b:b + w] + table[b:b + h, b:b + w]
+
+def context_features(bands: np.ndarray, valid: np.ndarray, radii, halo: int) -> np.ndarray:
+    """
+    Neighbourhood block: mean and std of NDVI and BSI over the (2r+1)^2 window
+    around each pixel, for each r in radii.
+
+    bands: B, h + 2*halo, w + 2*halo (B >= 5, order B02,B03,B04,B08,B11): the block
+    plus `halo` >= max(radii) pixels of its surroundings on every side, so adjacent
+    blocks see the same neighbours and windowed output matches a whole-scene pass.
+    valid: bool, same spatial shape; False pixels (padding beyond the scene edge,
+    nodata) are left out of every window, so edge pixels average what exists.
+    returns float32 (h*w, 4 * len(radii)): NDVI mean, NDVI std, BSI mean, BSI std per radius.
+
+    Sums come from integral images, so each window costs four lookups whatever
+    its radius, and one set of tables serves all radii.
+    """
+    _, H, W = bands.shape
+    h, w = H - 2 * halo, W - 2 * halo
+    blue, red, nir, swir1 = (bands[i].astype(np.float32) for i in (0, 2, 3, 4))
+    v = valid.astype(np.float32)
+    indices = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for num, den in ((nir - red, nir + red), (swir1 + red - nir - blue, swir1 + red + nir + blue)):
+            x = np.zeros_like(num)
+            np.divide(num, den, out=x, where=den != 0)
+            x *= v
+            indices.append((_integral(x), _integral(x * x)))
+    count = _integral(v)
+    out = np.empty((h * w, 4 * len(radii)), dtype=np.float32)
+    col = 0
+    for r in radii:
+        n = np.maximum(_box(count, r, halo, h, w), 1)
+        for total, squares in indices:
+            mean = _box(total, r, halo, h, w) / n
+            var = _box(squares, r, halo, h, w) / n - mean * mean
+            out[:, col] = mean.reshape(-1)
+            out[:, col + 1] = np.sqrt(np.maximum(var, 0)).reshape(-1)
+            col += 2
+    return out
+
+def simple_cloud_mask(blue: np.ndarray, cirrus: np.ndarray = None,
+                      threshold: float = CLOUD_BLUE_THRESHOLD) -> np.ndarray:
     """
     Very simple cloud mask based on bright blue reflectance (band 2) thresholding.
+    The default threshold is config.CLOUD_BLUE_THRESHOLD, the one inference masks with.
     Returns boolean mask: True where cloud.
     """
     # blue expected to be scaled reflectance 0-1 or 0-10000 depending on input; we assume 0-10000 and normalize if max>1
@@ -49,3 +218,18 @@ def simple_cloud_mask(blue: np.ndarray, cirrus: np.ndarray = None, threshold: fl
     mask = b > threshold
     return mask
 
+
+def invalid_mask(bands: np.ndarray, nodata=None, scl: np.ndarray = None,
+                 threshold: float = CLOUD_BLUE_THRESHOLD) -> np.ndarray:
+    """
+    Pixels not worth classifying: bright-blue cloud (simple_cloud_mask at threshold),
+    any band equal to the source nodata value, or an SCL class in SCL_INVALID.
+    bands: B, H, W in order B02,B03,...; scl: optional H, W SCL band.
+    Returns boolean H, W mask: True where invalid.
+    """
+    mask = simple_cloud_mask(bands[0], threshold=threshold)
+    if nodata is not None:
+        mask |= (bands == nodata).any(axis=0)
+    if scl is not None:
+        mask |= np.isin(scl, SCL_INVALID)
+    return mask
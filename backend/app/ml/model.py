@@ -1,14 +1,256 @@
 """
 Wrapper utilities for saving/loading the scikit-learn model.
+
+Loaded estimators are memoized per process, keyed by path + mtime + size, so
+repeated inference calls reuse the same object and a retrained model.joblib is
+picked up automatically. With mmap_mode='r' the pickled arrays are read
+through the page cache (shared by every worker loading the same file) instead
+of each process buffering a private copy; note sklearn trees still copy their
+node arrays in __setstate__, so the fitted forest itself is per-process.
+
+load_flat_model converts the forest once into contiguous node arrays
+(FlatForest) cached as .npy files beside the model under <model>.flat/<version>/.
+They load without unpickling and, memory-mapped, are genuinely shared between
+processes. FlatForest.predict_proba matches sklearn but, in pure NumPy, is
+several times slower than sklearn's compiled tree walk, so inference keeps
+using the sklearn estimator.
+
+joblib is imported on first save / load, so serving processes that only report
+model_cache_stats() never pay for it.
 """
-from joblib import dump, load
 from pathlib import Path
+from threading import Lock
 from typing import Any
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+from .features import FeatureSet, get_feature_set
+from ..config import MODEL_MMAP_MODE
+
+logger = logging.getLogger("model")
+
+_registry = {}
+_registry_lock = Lock()
+_stats = {"loads": 0, "hits": 0, "load_seconds": 0.0, "last_load_seconds": 0.0}
 
 def save_model(estimator: Any, path: str):
     Path(path).parent.mkdir(parents=True, exist_ok=True)
-    dump(estimator, path)
+    # write-then-rename: processes holding a memory-mapped copy of the old file
+    # keep reading the old inode instead of faulting on a truncated one
+    from joblib import dump
+    tmp = "%s.tmp%d" % (path, os.getpid())
+    dump(estimator, tmp)
+    os.replace(tmp, path)
+
+def _cache_key(path: str):
+    p = Path(path).resolve()
+    st = os.stat(p)
+    return str(p), st.st_mtime_ns, st.st_size
+
+def load_model(path: str, mmap_mode: str = MODEL_MMAP_MODE):
+    from joblib import load  # joblib (and sklearn, on unpickling) only for processes that predict
+    key = _cache_key(path) + (mmap_mode,)
+    with _registry_lock:
+        model = _registry.get(key)
+        if model is not None:
+            _stats["hits"] += 1
+            return model
+        started = time.perf_counter()
+        model = load(path, mmap_mode=mmap_mode)
+        elapsed = time.perf_counter() - started
+        # drop stale versions of the same file
+        for k in [k for k in _registry if k[0] == key[0] and k[1:3] != key[1:3]]:
+            del _registry[k]
+        _registry[key] = model
+        _stats["loads"] += 1
+        _stats["load_seconds"] += elapsed
+        _stats["last_load_seconds"] = elapsed
+    logger.info("Loaded model %s in %.3fs (mmap_mode=%s)", path, elapsed, mmap_mode)
+    return model
+
+_versions = {}
+
+def model_version(path: str) -> str:
+    """Short content hash of the model file, memoized per path + mtime + size."""
+    key = _cache_key(path)
+    version = _versions.get(key)
+    if version is None:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        version = _versions[key] = h.hexdigest()[:12]
+    return version
+
+def model_cache_stats() -> dict:
+    with _registry_lock:
+        return dict(_stats, cached=len(_registry))
+
+def clear_model_cache():
+    with _registry_lock:
+        _registry.clear()
+
+# (row, tree) pairs evaluated per batch by FlatForest: bounds the per-level index arrays
+FLAT_CHUNK = 1 << 20
+
+class FlatForest:
+    """
+    A fitted forest classifier as one array-of-nodes for all trees:
+    feature / threshold / left / right per node, normalised class distributions
+    in value, and each tree's root in roots. Leaves point to themselves.
+
+    predict_proba walks a batch of rows down all trees at once, one level per
+    step: every (row, tree) pair still above a leaf moves to its child, so the
+    Python loop runs once per tree level rather than per tree and level. Leaf
+    distributions are then summed tree by tree and compared as float32 features
+    against float64 thresholds, exactly as sklearn does, so the probabilities
+    match RandomForestClassifier.predict_proba.
+    """
+
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes_")
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes_, feature_set_=None):
+        self.feature_set_ = feature_set_
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes_
+        self.is_leaf = left == np.arange(len(left))
+
+    @classmethod
+    def from_estimator(cls, estimator) -> "FlatForest":
+        trees = [e.tree_ for e in estimator.estimators_]
+        if trees and trees[0].n_outputs != 1:
+            raise ValueError("FlatForest supports single-output classifiers only")
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+        feature, left, right, value = [], [], [], []
+        for t, off in zip(trees, offsets):
+            ids = np.arange(t.node_count)
+            leaf = t.children_left < 0
+            feature.append(np.where(leaf, 0, t.feature))
+            left.append(np.where(leaf, ids, t.children_left) + off)
+            right.append(np.where(leaf, ids, t.children_right) + off)
+            v = t.value[:, 0, :].astype(np.float64)
+            norm = v.sum(axis=1, keepdims=True)
+            value.append(v / np.where(norm == 0, 1, norm))
+        return cls(
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate([t.threshold for t in trees]).astype(np.float64),
+            left=np.concatenate(left).astype(np.intp),
+            right=np.concatenate(right).astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(value)),
+            roots=offsets[:-1].astype(np.intp),
+            classes_=np.asarray(estimator.classes_),
+            feature_set_=getattr(estimator, "feature_set_", None),
+        )
+
+    def _proba_chunk(self, X: np.ndarray, out: np.ndarray):
+        m, n_trees = len(X), len(self.roots)
+        flat_x = np.ascontiguousarray(X.T).reshape(-1)  # feature-major: x[f, i] at f * m + i
+        leaf_of = np.empty((m, n_trees), dtype=np.intp)
+        # active (row, tree) pairs, flattened as row * n_trees + tree
+        pairs = np.arange(m * n_trees)
+        rows = pairs // n_trees
+        node = np.tile(self.roots, m)
+        while len(pairs):
+            go_left = flat_x[self.feature[node] * m + rows] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            done = self.is_leaf[node]
+            leaf_of.reshape(-1)[pairs[done]] = node[done]
+            active = ~done
+            pairs, rows, node = pairs[active], rows[active], node[active]
+        out[:] = 0
+        for t in range(n_trees):  # in tree order, like sklearn's accumulation
+            out += self.value[leaf_of[:, t]]
+        out /= n_trees
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        step = max(1, FLAT_CHUNK // max(1, len(self.roots)))
+        for start in range(0, len(X), step):
+            self._proba_chunk(X[start:start + step], out[start:start + step])
+        return out
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def save(self, folder: Path):
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(folder / ("%s.npy" % name), getattr(self, name))
+        if self.feature_set_ is not None:
+            with open(folder / "feature_set.json", "w") as f:
+                json.dump(self.feature_set_, f)
+
+    @classmethod
+    def load(cls, folder: Path, mmap_mode: str = MODEL_MMAP_MODE) -> "FlatForest":
+        folder = Path(folder)
+        feature_set = None
+        if (folder / "feature_set.json").exists():
+            with open(folder / "feature_set.json") as f:
+                feature_set = json.load(f)
+        return cls(**{name: np.load(folder / ("%s.npy" % name), mmap_mode=mmap_mode) for name in cls.ARRAYS},
+                   feature_set_=feature_set)
+
+def model_feature_set(model) -> FeatureSet:
+    """
+    The FeatureSet a model was trained on, from the feature_set_ spec train_demo
+    stores on it (models saved without one used "base").
+    """
+    fs = get_feature_set(getattr(model, "feature_set_", None))
+    n = getattr(model, "n_features_in_", fs.n_features)
+    if n != fs.n_features:
+        raise ValueError("model takes %d features but its feature set %r has %d" % (n, fs.name, fs.n_features))
+    return fs
 
-def load_model(path: str):
-    return load(path)
+def flat_model_dir(path: str) -> Path:
+    """Cache folder of a model's flattened form for the current model file contents."""
+    p = Path(path)
+    return p.with_name(p.name + ".flat") / model_version(path)
 
+def load_flat_model(path: str, mmap_mode: str = MODEL_MMAP_MODE) -> FlatForest:
+    """
+    FlatForest for the model at path, memoized like load_model. Converted from
+    the joblib file on first use and written beside it; stale versions are removed.
+    """
+    key = _cache_key(path) + ("flat", mmap_mode)
+    with _registry_lock:
+        model = _registry.get(key)
+        if model is not None:
+            _stats["hits"] += 1
+            return model
+        started = time.perf_counter()
+        folder = flat_model_dir(path)
+        if not (folder / "meta.json").exists():
+            tmp = folder.with_name("%s.tmp%d" % (folder.name, os.getpid()))
+            from joblib import load
+            FlatForest.from_estimator(load(path)).save(tmp)
+            with open(tmp / "meta.json", "w") as f:
+                json.dump({"source": Path(path).name, "version": folder.name}, f)
+            try:
+                os.replace(tmp, folder)
+            except OSError:
+                shutil.rmtree(tmp)  # another process converted it first
+            for old in folder.parent.iterdir():
+                if old != folder and "." not in old.name:  # leave other processes' tmp folders alone
+                    shutil.rmtree(old, ignore_errors=True)
+            logger.info("Flattened model %s into %s", path, folder)
+        model = FlatForest.load(folder, mmap_mode=mmap_mode)
+        elapsed = time.perf_counter() - started
+        for k in [k for k in _registry if k[0] == key[0] and k[1:3] != key[1:3]]:
+            del _registry[k]
+        _registry[key] = model
+        _stats["loads"] += 1
+        _stats["load_seconds"] += elapsed
+        _stats["last_load_seconds"] = elapsed
+    logger.info("Loaded flat model %s in %.3fs (mmap_mode=%s)", path, elapsed, mmap_mode)
+    return model
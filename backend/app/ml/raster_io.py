@@ -0,0 +1,82 @@
+"""
+Windowed raster reads shared by inference (infer.py) and training (sampling.py,
+train_demo.py): the window grid, reusable block buffers, the spectral bands of a
+window and the halo-padded reads behind neighbourhood features.
+"""
+import numpy as np
+from rasterio.windows import Window
+from .features import N_FEATURES, context_features
+from ..metrics import stage
+from ..config import INFERENCE_WINDOW_SIZE
+
+def iter_windows(height: int, width: int, window_size: int = INFERENCE_WINDOW_SIZE):
+    """
+    Yield row-major square windows of at most window_size pixels covering a height x width grid.
+    A window_size of 0 (or None) yields a single window covering the whole grid.
+    """
+    if not window_size:
+        yield Window(0, 0, width, height)
+        return
+    for row_off in range(0, height, window_size):
+        for col_off in range(0, width, window_size):
+            yield Window(col_off, row_off,
+                         min(window_size, width - col_off),
+                         min(window_size, height - row_off))
+
+class BlockBuffers:
+    """
+    Reusable per-window buffers, so the hot loop allocates nothing per window:
+    band reads land in native-dtype (uint16) arrays via src.read(out=...) and
+    features in one float32 (n, n_features) matrix per feature width. Keyed by
+    block shape, so the few distinct edge-window shapes each get their own band buffer.
+    """
+
+    def __init__(self):
+        self._bands = {}
+        self._features = {}
+
+    def bands(self, count: int, height: int, width: int, dtype) -> np.ndarray:
+        key = (count, height, width, np.dtype(dtype).str)
+        buf = self._bands.get(key)
+        if buf is None:
+            buf = self._bands[key] = np.empty((count, height, width), dtype=dtype)
+        return buf
+
+    def features(self, n: int, width: int = N_FEATURES) -> np.ndarray:
+        buf = self._features.get(width)
+        if buf is None or len(buf) < n:
+            buf = self._features[width] = np.empty((n, width), dtype=np.float32)
+        return buf[:n]
+
+def read_bands(src, window: Window, buffers: BlockBuffers = None) -> np.ndarray:
+    """The (up to) six spectral bands of a window in their stored dtype, into a reused buffer if given."""
+    indexes = list(range(1, min(6, src.count)+1))
+    if buffers is None:
+        return src.read(indexes=indexes, window=window)
+    out = buffers.bands(len(indexes), int(window.height), int(window.width), src.dtypes[0])
+    return src.read(indexes=indexes, window=window, out=out)
+
+def read_context(src, window: Window, feature_set) -> np.ndarray:
+    """
+    features.context_features for a window's pixels, or None when the feature set
+    has none. The window is read with a halo of feature_set.halo pixels (cut at
+    the scene edge, where padding is marked invalid), so every block sees the
+    same neighbours as a whole-scene pass would.
+    """
+    halo = feature_set.halo
+    if not halo:
+        return None
+    row, col, h, w = int(window.row_off), int(window.col_off), int(window.height), int(window.width)
+    r0, c0 = max(0, row - halo), max(0, col - halo)
+    r1, c1 = min(src.height, row + h + halo), min(src.width, col + w + halo)
+    top, left = r0 - (row - halo), c0 - (col - halo)
+    bands = np.zeros((5, h + 2 * halo, w + 2 * halo), dtype=src.dtypes[0])
+    valid = np.zeros(bands.shape[1:], dtype=bool)
+    with stage("read"):
+        bands[:, top:top + r1 - r0, left:left + c1 - c0] = src.read(
+            indexes=[1, 2, 3, 4, 5], window=Window(c0, r0, c1 - c0, r1 - r0))
+    valid[top:top + r1 - r0, left:left + c1 - c0] = True
+    if src.nodata is not None:
+        valid &= ~(bands == src.nodata).any(axis=0)
+    with stage("context"):
+        return context_features(bands, valid, feature_set.radii, halo)
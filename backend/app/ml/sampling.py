@@ -0,0 +1,148 @@
+"""
+Out-of-core training samples.
+
+Scenes are streamed window by window; each window's pixels go through
+feature_stack (plus raster_io.read_context for feature sets with neighbourhood
+features) and into a per-class reservoir of at most `per_class` rows, so the
+training set is a uniform, stratified sample of every labelled pixel while memory
+stays bounded by the reservoirs plus one window.
+
+The reservoir is the random-key variant (keep the `per_class` pixels with the
+smallest uniform keys): it gives the same distribution as Algorithm R but is
+vectorised per window, and once a reservoir is full only pixels whose key beats
+its current maximum are copied at all.
+
+Sampled matrices can be cached as .npz in a cache_dir (the CLI and pipeline use
+TRAINING_CACHE_DIR) keyed by the input files (path, size, mtime), the sampling parameters and the feature set, so
+retraining on unchanged imagery skips the scan entirely.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import numpy as np
+import rasterio
+from .raster_io import BlockBuffers, iter_windows, read_bands, read_context
+from .features import FEATURE_VERSION, N_FEATURES, feature_stack, get_feature_set
+from ..config import INFERENCE_WINDOW_SIZE, TRAINING_SAMPLES_PER_CLASS
+
+logger = logging.getLogger("sampling")
+
+LABEL_BAND = 7
+LABEL_NODATA = 255
+
+def synthetic_labels(X: np.ndarray) -> np.ndarray:
+    """Demo labels from feature rows when a scene has no label band: NDVI thresholds plus bright-blue cloud."""
+    ndvi_col = X[:, 6]
+    # classes: 0: Poor, 1: Moderate, 2: Good, 3: Cloud/NoData
+    y = np.zeros(len(X), dtype=np.uint8)
+    y[ndvi_col > 0.4] = 2
+    y[(ndvi_col > 0.15) & (ndvi_col <= 0.4)] = 1
+    y[X[:, 0] > 2500] = 3
+    return y
+
+class ClassReservoir:
+    """Uniform sample without replacement of at most `size` feature rows per class."""
+
+    def __init__(self, size: int, seed: int = 0, width: int = N_FEATURES):
+        self.size = size
+        self.width = width
+        self.rng = np.random.default_rng(seed)
+        self.keys = {}  # class -> float64 keys of the kept rows
+        self.rows = {}  # class -> float32 (n, width) kept rows
+        self.seen = {}  # class -> pixels offered so far
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        for c in np.unique(y):
+            c = int(c)
+            idx = np.flatnonzero(y == c)
+            self.seen[c] = self.seen.get(c, 0) + len(idx)
+            keys = self.rng.random(len(idx))
+            kept = self.keys.get(c)
+            if kept is not None and len(kept) >= self.size:
+                # full: only rows that would displace a kept one are candidates
+                beat = keys < kept.max()
+                idx, keys = idx[beat], keys[beat]
+                if not len(idx):
+                    continue
+            keys = keys if kept is None else np.concatenate([kept, keys])
+            rows = X[idx] if kept is None else np.concatenate([self.rows[c], X[idx]])
+            if len(keys) > self.size:
+                keep = np.argpartition(keys, self.size - 1)[:self.size]
+                keys, rows = keys[keep], rows[keep]
+            self.keys[c], self.rows[c] = keys, rows
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        classes = sorted(self.rows)
+        if not classes:
+            return np.empty((0, self.width), dtype=np.float32), np.empty(0, dtype=np.uint8)
+        X = np.concatenate([self.rows[c] for c in classes])
+        y = np.concatenate([np.full(len(self.rows[c]), c, dtype=np.uint8) for c in classes])
+        return X, y
+
+def sample_scenes(tif_paths: Sequence, per_class: int = TRAINING_SAMPLES_PER_CLASS, seed: int = 0,
+                  window_size: int = INFERENCE_WINDOW_SIZE, feature_set="base"
+                  ) -> Tuple[np.ndarray, np.ndarray, Dict[int, int]]:
+    """
+    Stream every scene window by window into a ClassReservoir. Labels come from
+    band LABEL_BAND when present (LABEL_NODATA pixels skipped), else synthetic_labels.
+    feature_set: name (or FeatureSet) of the columns to build, see features.FEATURE_SETS.
+    Returns (X float32, y uint8, pixels seen per class).
+    """
+    fs = get_feature_set(feature_set)
+    reservoir = ClassReservoir(per_class, seed, fs.n_features)
+    buffers = BlockBuffers()
+    for path in tif_paths:
+        with rasterio.open(str(path)) as src:
+            has_labels = src.count >= LABEL_BAND
+            for window in iter_windows(src.height, src.width, window_size):
+                n = int(window.height) * int(window.width)
+                X = feature_stack(read_bands(src, window, buffers), out=buffers.features(n, fs.n_features))
+                if fs.radii:
+                    X[:, N_FEATURES:] = read_context(src, window, fs)
+                if has_labels:
+                    y = src.read(LABEL_BAND, window=window).reshape(-1)
+                    valid = y != LABEL_NODATA
+                    X, y = X[valid], y[valid]
+                else:
+                    y = synthetic_labels(X)
+                reservoir.add(X, y)
+    X, y = reservoir.result()
+    return X, y, reservoir.seen
+
+def sample_key(tif_paths: Sequence, per_class: int, seed: int, window_size: int, feature_set="base") -> str:
+    """Cache key: input file identities + sampling parameters + FEATURE_VERSION and feature set."""
+    files = []
+    for path in tif_paths:
+        p = Path(path).resolve()
+        st = p.stat()
+        files.append((str(p), st.st_size, st.st_mtime_ns))
+    spec = {"files": files, "per_class": per_class, "seed": seed, "window_size": window_size,
+            "feature_version": FEATURE_VERSION, "feature_set": get_feature_set(feature_set).as_dict()}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+def load_samples(tif_paths: Sequence, per_class: int = TRAINING_SAMPLES_PER_CLASS, seed: int = 0,
+                 window_size: int = INFERENCE_WINDOW_SIZE, cache_dir: Optional[Path] = None,
+                 feature_set="base") -> Tuple[np.ndarray, np.ndarray, bool]:
+    """
+    sample_scenes, reusing the cached matrix when the inputs are unchanged.
+    cache_dir=None (the default) disables the cache. Returns (X, y, cache_hit).
+    """
+    if cache_dir is None:
+        X, y, _ = sample_scenes(tif_paths, per_class, seed, window_size, feature_set)
+        return X, y, False
+    cache_dir = Path(cache_dir)
+    path = cache_dir / ("%s.npz" % sample_key(tif_paths, per_class, seed, window_size, feature_set))
+    if path.exists():
+        with np.load(path) as data:
+            logger.info("Reusing cached training samples %s", path)
+            return data["X"], data["y"], True
+    X, y, seen = sample_scenes(tif_paths, per_class, seed, window_size, feature_set)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, X=X, y=y)
+    tmp.replace(path)
+    logger.info("Sampled %d of %d pixels from %d scenes into %s",
+                len(y), sum(seen.values()), len(tif_paths), path)
+    return X, y, False
@@ -2,9 +2,19 @@
 Train a demo RandomForest classifier on synthetic GeoTIFF data.
 
 - Loads synthetic sample data produced by demo/generate_sample_data.py
-- Extracts pixel-wise features: B02,B03,B04,B08,B11,B12 + NDVI, NDWI, BSI, cloud mask
+- Extracts pixel-wise features: B02,B03,B04,B08,B11,B12 + NDVI, NDWI, BSI, cloud mask,
+  plus neighbourhood NDVI/BSI statistics with --feature-set context (stored on the model)
 - Trains RandomForest classifier with simple cross-validation and saves model.joblib
+
+train_and_save samples pixels out-of-core (ml/sampling.py), so it also scales to
+many full-size scenes: python -m backend.app.ml.train_demo scene1.tif scene2.tif ...
 """
+from typing import Sequence
+import argparse
+import json
+import resource
+import time
+import tracemalloc
 import numpy as np
 import rasterio
 from rasterio.windows import Window
@@ -14,18 +24,22 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import StratifiedKFold, cross_val_predict
 from sklearn.metrics import classification_report, confusion_matrix
 from joblib import dump
-from .features import ndvi, ndwi, bsi, simple_cloud_mask
+from .features import FEATURE_SETS, N_FEATURES, feature_stack, get_feature_set
 from .model import save_model
-from ..data import sample_property
+from .raster_io import read_context
+from .sampling import load_samples
+from ..config import MODEL_PATH, TRAINING_SAMPLES_PER_CLASS, TRAINING_CACHE_DIR, FEATURE_SET
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("train_demo")
 
 DEMO_TIF = Path(__file__).resolve().parents[2] / "demo" / "sample_sentinel.tif"
-MODEL_OUT = Path(__file__).resolve().parents[1] / "ml" / "model.joblib"
+if not DEMO_TIF.exists():
+    # running from a checkout rather than the container: demo data lives under cwd
+    DEMO_TIF = Path("demo") / "sample_sentinel.tif"
+MODEL_OUT = Path(MODEL_PATH)
 
-def load_sample_features(tif_path: str):
+def load_sample_features(tif_path: str, feature_set="base"):
     """
     Read small sample GeoTIFF and build feature matrix X and labels y.
     For the demo, the sample GeoTIFF stores a synthetic label in band 7 if present.
@@ -37,65 +51,88 @@ def load_sample_features(tif_path: str):
       5: B11 (swir1)
       6: B12 (swir2)
       7: LABEL (optional) -- contains integer class code
+    feature_set: see features.FEATURE_SETS; neighbourhood columns come from raster_io.read_context.
     """
+    fs = get_feature_set(feature_set)
     with rasterio.open(tif_path) as src:
-        bands = [src.read(i) for i in range(1, src.count+1)]
-        arrs = np.stack(bands[:6], axis=-1)  # H x W x 6
+        arrs = src.read(indexes=list(range(1, 7)))  # 6 x H x W
         labels = None
         if src.count >= 7:
             labels = src.read(7)
-    # compute indices
-    blue = arrs[..., 0].astype(float)
-    green = arrs[..., 1].astype(float)
-    red = arrs[..., 2].astype(float)
-    nir = arrs[..., 3].astype(float)
-    swir1 = arrs[..., 4].astype(float)
-    swir2 = arrs[..., 5].astype(float)
-    ndvi_img = ndvi(nir, red)
-    ndwi_img = ndwi(green, nir)
-    bsi_img = bsi(blue, red, nir, swir1)
-
-    # Flatten
-    H, W, _ = arrs.shape
-    X = np.column_stack([
-        arrs.reshape(-1, 6),
-        ndvi_img.reshape(-1),
-        ndwi_img.reshape(-1),
-        bsi_img.reshape(-1)
-    ])
+        context = read_context(src, Window(0, 0, src.width, src.height), fs)
+    X = feature_stack(arrs, out=np.empty((arrs.shape[1] * arrs.shape[2], fs.n_features), dtype=np.float32))
+    if context is not None:
+        X[:, N_FEATURES:] = context
     y = None
     if labels is not None:
         y = labels.reshape(-1)
     return X, y
 
-def train_and_save():
-    X, y = load_sample_features(str(DEMO_TIF))
-    # For demo: if no labels, create synthetic labels based on NDVI thresholds
-    if y is None:
-        ndvi_col = X[:, 6]
-        # classes: 0: Poor, 1: Moderate, 2: Good, 3: Cloud/NoData
-        y = np.zeros_like(ndvi_col, dtype=int)
-        y[ndvi_col > 0.4] = 2
-        y[(ndvi_col > 0.15) & (ndvi_col <= 0.4)] = 1
-        # synthetic clouds where blue is bright
-        blue = X[:, 0]
-        cloud_mask = blue > 2500
-        y[cloud_mask] = 3
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def train_and_save(tif_paths: Sequence = None, per_class: int = TRAINING_SAMPLES_PER_CLASS,
+                   model_out=MODEL_OUT, cache_dir=None, evaluate: bool = True,
+                   feature_set: str = FEATURE_SET) -> dict:
+    """
+    Train on a stratified, bounded sample of every pixel in tif_paths (default:
+    the demo scene) and save the model. The sample is streamed window by window
+    and, with cache_dir (the CLI passes TRAINING_CACHE_DIR), cached on disk (see
+    sampling.py), so retrains on unchanged imagery skip the scan. The feature set is saved on the model as feature_set_, so inference
+    rebuilds the same columns. Returns sampling/training times and peak memory.
+    """
+    tif_paths = [str(p) for p in (tif_paths or [DEMO_TIF])]
+    fs = get_feature_set(feature_set)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    X, y, cache_hit = load_samples(tif_paths, per_class=per_class, cache_dir=cache_dir, feature_set=fs)
+    sampling_s = time.perf_counter() - t0
+    sampling_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    counts = np.bincount(y)
+    logger.info("Training samples per class: %s", {int(c): int(counts[c]) for c in np.flatnonzero(counts)})
 
-    # Filter out no-data pixels if any (here assume none)
-    # Train RandomForest with cross-validation
     clf = RandomForestClassifier(n_estimators=50, n_jobs=2, random_state=42)
-    skf = StratifiedKFold(n_splits=3, shuffle=True, random_state=42)
-    logger.info("Running cross-validated predictions for evaluation...")
-    y_pred = cross_val_predict(clf, X, y, cv=skf, n_jobs=2)
-    logger.info("Classification report:\n%s", classification_report(y, y_pred))
-    logger.info("Confusion matrix:\n%s", confusion_matrix(y, y_pred))
+    t0 = time.perf_counter()
+    if evaluate:
+        skf = StratifiedKFold(n_splits=3, shuffle=True, random_state=42)
+        logger.info("Running cross-validated predictions for evaluation...")
+        y_pred = cross_val_predict(clf, X, y, cv=skf, n_jobs=2)
+        logger.info("Classification report:\n%s", classification_report(y, y_pred))
+        logger.info("Confusion matrix:\n%s", confusion_matrix(y, y_pred))
 
-    # Fit on all data and save
+    # Fit on the whole sample and save
     clf.fit(X, y)
-    save_model(clf, str(MODEL_OUT))
-    logger.info("Saved model to %s", MODEL_OUT)
+    train_s = time.perf_counter() - t0
+    clf.feature_set_ = fs.as_dict()
+    save_model(clf, str(model_out))
+    report = {
+        "scenes": len(tif_paths),
+        "feature_set": fs.name,
+        "samples": int(len(y)),
+        "cache_hit": cache_hit,
+        "sampling_s": round(sampling_s, 3),
+        "train_s": round(train_s, 3),
+        "sampling_peak_mb": round(sampling_peak / 2 ** 20, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "model": str(model_out),
+    }
+    logger.info("Saved model to %s (%s)", model_out, report)
+    return report
 
 if __name__ == "__main__":
-    train_and_save()
-
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Train the RandomForest on sampled pixels of one or more GeoTIFFs")
+    parser.add_argument("tifs", nargs="*", help="Scenes to sample (default: the demo scene)")
+    parser.add_argument("--per-class", type=int, default=TRAINING_SAMPLES_PER_CLASS,
+                        help="Maximum training pixels kept per class")
+    parser.add_argument("--out", default=str(MODEL_OUT), help="Where to save the model")
+    parser.add_argument("--no-cache", action="store_true", help="Resample even if a cached sample exists")
+    parser.add_argument("--no-eval", dest="evaluate", action="store_false", help="Skip cross-validation")
+    parser.add_argument("--feature-set", choices=sorted(FEATURE_SETS), default=FEATURE_SET,
+                        help="Per-pixel features only (base) or with neighbourhood statistics (context)")
+    args = parser.parse_args()
+    print(json.dumps(train_and_save(args.tifs, per_class=args.per_class, model_out=args.out,
+                                    cache_dir=None if args.no_cache else TRAINING_CACHE_DIR,
+                                    evaluate=args.evaluate, feature_set=args.feature_set), indent=2))
@@ -0,0 +1,114 @@
+"""
+Per-pixel queries (click-to-inspect) against a run's rasters.
+
+Each lookup is a 1x1 windowed read from the run's imagery (storage.resolve_imagery),
+classification.tif and probabilities.tif. Open datasets are kept in a small LRU pool keyed by path +
+mtime, so repeated clicks skip the file-open cost; a per-dataset lock keeps
+concurrent requests from sharing a GDAL handle mid-read.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Sequence, Tuple
+import os
+import rasterio
+from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
+from .storage import resolve_imagery
+from .config import DATASET_POOL_SIZE
+
+BAND_NAMES = ("B02", "B03", "B04", "B08", "B11", "B12")
+
+class DatasetPool:
+    """LRU of open rasterio datasets, each paired with a lock guarding reads."""
+
+    def __init__(self, maxsize: int = DATASET_POOL_SIZE):
+        self.maxsize = maxsize
+        self._open = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, path):
+        """Return (dataset, lock) for path, reopening if the file changed on disk."""
+        path = str(path)
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is None:
+                entry = (rasterio.open(path), Lock())
+                self._open[key] = entry
+                for stale in [k for k in self._open if k[0] == path and k != key]:
+                    self._close(stale)
+                while len(self._open) > self.maxsize:
+                    self._close(next(iter(self._open)))
+            self._open.move_to_end(key)
+            return entry
+
+    def _close(self, key):
+        src, lock = self._open.pop(key)
+        with lock:
+            src.close()
+
+    def size(self) -> int:
+        return len(self._open)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._open):
+                self._close(key)
+
+dataset_pool = DatasetPool()
+
+def pixel_index(src, lon: float, lat: float) -> Optional[Tuple[int, int]]:
+    """(row, col) of lon/lat in src, or None outside the raster."""
+    if src.crs and src.crs.to_epsg() != 4326:
+        xs, ys = warp_transform("EPSG:4326", src.crs, [lon], [lat])
+        x, y = xs[0], ys[0]
+    else:
+        x, y = lon, lat
+    row, col = src.index(x, y)
+    if not (0 <= row < src.height and 0 <= col < src.width):
+        return None
+    return row, col
+
+def _read_pixel(path: Path, lon: float, lat: float, with_tags: bool = False):
+    """Returns ((row, col) or None, pixel values across bands, dataset tags or None)."""
+    while True:
+        src, lock = dataset_pool.get(path)
+        with lock:
+            if src.closed:
+                continue  # evicted between get() and lock; fetch a fresh handle
+            tags = src.tags() if with_tags else None
+            rc = pixel_index(src, lon, lat)
+            if rc is None:
+                return None, None, tags
+            row, col = rc
+            return rc, src.read(window=Window(col, row, 1, 1))[:, 0, 0], tags
+
+def query_point(run_folder: Path, lon: float, lat: float) -> Optional[dict]:
+    """
+    Class, class probabilities, band values and NDVI at lon/lat for one run,
+    or None if the point falls outside the scene.
+    """
+    run_folder = Path(run_folder)
+    rc, cls, _ = _read_pixel(run_folder / "classification.tif", lon, lat)
+    if rc is None:
+        return None
+    out = {"lon": lon, "lat": lat, "row": rc[0], "col": rc[1], "class": int(cls[0])}
+    proba_path = run_folder / "probabilities.tif"
+    if proba_path.exists():
+        _, proba, tags = _read_pixel(proba_path, lon, lat, with_tags=True)
+        classes = [int(c) for c in tags["classes"].split(",")]
+        scale = float(tags.get("scale", 1 / 255))
+        out["probabilities"] = {str(c): round(float(p) * scale, 4) for c, p in zip(classes, proba)}
+    imagery_path = resolve_imagery(run_folder)
+    if imagery_path is not None:
+        _, bands, _ = _read_pixel(imagery_path, lon, lat)
+        values = {name: int(v) for name, v in zip(BAND_NAMES, bands)}
+        out["bands"] = values
+        nir, red = values.get("B08"), values.get("B04")
+        if nir is not None and red is not None:
+            out["ndvi"] = (nir - red) / (nir + red) if nir + red else 0.0
+    return out
+
+def query_points(run_folder: Path, points: Sequence[Sequence[float]]) -> List[Optional[dict]]:
+    return [query_point(run_folder, lon, lat) for lon, lat in points]
@@ -0,0 +1,203 @@
+"""
+Columnar run statistics for bulk analytics.
+
+Every catalogued run also writes its scene and per-paddock class statistics to a
+Parquet dataset under STORAGE_DIR/stats, hive-partitioned by property and month:
+
+  stats/property=<id>/month=<YYYY-MM>/<run>.parquet
+
+one row per (run, paddock, class); paddock_id -1 is the whole scene, and the
+paddock-level means (NDVI, NDWI, BSI, cloud fraction) repeat on each class row.
+Runs without a property land in the hive null partition.
+
+trends() scans the dataset with property / month / paddock filters pushed down
+(whole partitions are skipped, row groups pruned by their statistics) and groups
+the matching rows into monthly aggregates inside pyarrow, so trend tables never
+open summary.geojson files or walk rows in Python. Analysts can read the same folder directly, e.g.
+pyarrow.dataset.dataset(path, partitioning="hive") or pandas.read_parquet(path).
+
+pyarrow is optional: it is imported on first use, and without it run exports are
+skipped with a warning. Runs catalogued before it was installed can be exported with
+
+    python -m backend.app.runstats --backfill
+"""
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote
+import argparse
+import json
+import logging
+import os
+from .storage import get_run, query_runs, storage_root
+
+logger = logging.getLogger("runstats")
+
+STATS_DIR = "stats"
+# hive partition value that pyarrow reads back as null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+SCENE_PADDOCK = -1
+INDEX_COLUMNS = ("mean_ndvi", "mean_ndwi", "mean_bsi", "cloud_fraction")
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+def stats_available() -> bool:
+    return _pyarrow() is not None
+
+def stats_root(root: Path = None) -> Path:
+    return Path(root) if root is not None else storage_root() / STATS_DIR
+
+def _schema(pa):
+    return pa.schema([
+        ("run", pa.string()),
+        ("date", pa.string()),
+        ("model_version", pa.string()),
+        ("paddock_id", pa.int32()),
+        ("paddock", pa.string()),
+        ("class", pa.int32()),
+        ("pixels", pa.int64()),
+        ("area_m2", pa.float64()),
+        *((name, pa.float64()) for name in INDEX_COLUMNS),
+    ])
+
+def _partitioning(pa):
+    # explicit string types: a property id like "123" must not be inferred as an integer
+    return pa.dataset.partitioning(pa.schema([("property", pa.string()), ("month", pa.string())]), flavor="hive")
+
+def run_rows(run_id: str, summary: dict, date: str = None, model_version: str = None) -> List[dict]:
+    """Flatten a run summary (see infer.run_inference) into one row per (paddock, class)."""
+    base = {"run": run_id, "date": date or summary.get("date"), "model_version": model_version}
+    rows = [dict(base, paddock_id=SCENE_PADDOCK, paddock=None, **{"class": c["class"]}, pixels=c["pixels"],
+                 area_m2=c["approx_area_m2"], **{name: None for name in INDEX_COLUMNS})
+            for c in summary.get("classes", [])]
+    for feat in summary.get("features", []):
+        props = feat["properties"]
+        for c, pixels in props.get("class_pixels", {}).items():
+            rows.append(dict(base, paddock_id=props["paddock_id"], paddock=props.get("name"),
+                             **{"class": int(c)}, pixels=pixels, area_m2=props["class_area_m2"][c],
+                             **{name: props.get(name) for name in INDEX_COLUMNS}))
+    return rows
+
+def partition_dir(property_id: Optional[str], date: str, root: Path = None) -> Path:
+    prop = quote(property_id, safe="") if property_id else NULL_PARTITION
+    return stats_root(root) / ("property=%s" % prop) / ("month=%s" % date[:7])
+
+def export_run_stats(run_folder: Path, summary: dict = None, root: Path = None) -> Optional[Path]:
+    """
+    Write a catalogued run's statistics to the stats dataset (replacing an earlier
+    export of the same run). Property, date and model version come from the
+    catalogue; summary defaults to the run's summary.geojson. Returns the file
+    written, or None when pyarrow is not installed.
+    """
+    pa = _pyarrow()
+    if pa is None:
+        logger.warning("pyarrow not installed; skipping stats export for %s", run_folder)
+        return None
+    run_folder = Path(run_folder)
+    if summary is None:
+        with open(run_folder / "summary.geojson") as f:
+            summary = json.load(f)
+    entry = get_run(run_folder.name) or {}
+    date = entry.get("date") or summary["date"]
+    table = pa.Table.from_pylist(run_rows(run_folder.name, summary, date, entry.get("model_version")),
+                                 schema=_schema(pa))
+    folder = partition_dir(entry.get("property"), date, root)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / ("%s.parquet" % run_folder.name)
+    # dot-prefixed files are ignored by dataset scans, so readers never see a partial file
+    tmp = folder / (".%s.tmp%d" % (path.name, os.getpid()))
+    pa.parquet.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+def trends(property_id: str = None, since: str = None, until: str = None, paddock_id: int = None,
+           root: Path = None) -> List[dict]:
+    """
+    Monthly aggregates over every exported run, one dict per (property, paddock, month)
+    sorted in that order: number of runs, mean area per class per run, and the
+    pixel-weighted mean indices / cloud fraction. since / until are months
+    (YYYY-MM, or ISO dates, which are cut to the month), inclusive; paddock_id -1
+    selects whole-scene rows. Raises RuntimeError when pyarrow is not installed.
+    """
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("pyarrow is required for run statistics")
+    root = stats_root(root)
+    if not root.exists():
+        return []
+    ds = pa.dataset
+    dataset = ds.dataset(str(root), format="parquet", partitioning=_partitioning(pa))
+    expr = None
+    for cond in ((ds.field("property") == property_id) if property_id is not None else None,
+                 (ds.field("month") >= since[:7]) if since else None,
+                 (ds.field("month") <= until[:7]) if until else None,
+                 (ds.field("paddock_id") == paddock_id) if paddock_id is not None else None):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    keys = ["property", "paddock_id", "month"]
+    columns = [*keys, "run", "paddock", "class", "pixels", "area_m2", *INDEX_COLUMNS]
+    table = dataset.to_table(columns=columns, filter=expr)
+    pc = pa.compute
+    pixels = pc.cast(table["pixels"], pa.float64())
+    aggregates = [("run", "count_distinct"), ("paddock", "min")]
+    for name in INDEX_COLUMNS:
+        # paddock means repeat on every class row: weighting by class pixels sums to
+        # paddock pixels, i.e. a pixel-weighted mean across runs (null means carry no weight)
+        table = table.append_column("%s_sum" % name, pc.multiply(table[name], pixels))
+        table = table.append_column("%s_weight" % name,
+                                    pc.if_else(pc.is_valid(table[name]), pixels, pa.scalar(0.0)))
+        aggregates += [("%s_sum" % name, "sum"), ("%s_weight" % name, "sum")]
+    totals = table.group_by(keys).aggregate(aggregates).to_pylist()
+    areas = table.group_by([*keys, "class"]).aggregate([("area_m2", "sum")]).to_pylist()
+    class_area = {}
+    for row in areas:
+        class_area.setdefault(tuple(row[k] for k in keys), {})[row["class"]] = row["area_m2_sum"]
+    out = []
+    for row in sorted(totals, key=lambda r: (r["property"] or "", r["paddock_id"], r["month"])):
+        runs = row["run_count_distinct"]
+        area = class_area[tuple(row[k] for k in keys)]
+        item = {"property": row["property"], "paddock_id": row["paddock_id"], "paddock": row["paddock_min"],
+                "month": row["month"], "runs": runs,
+                "class_area_m2": {str(c): area[c] / runs for c in sorted(area)}}
+        for name in INDEX_COLUMNS:
+            w = row["%s_weight_sum" % name]
+            item[name] = row["%s_sum_sum" % name] / w if w else None
+        out.append(item)
+    return out
+
+def backfill(root: Path = None, force: bool = False) -> int:
+    """Export every catalogued run with a summary (only runs missing from the dataset unless force)."""
+    done = 0
+    for entry in query_runs()[0]:
+        folder = storage_root() / entry["run"]
+        if not (folder / "summary.geojson").exists():
+            continue
+        date = entry.get("date")
+        if (not force and date
+                and (partition_dir(entry.get("property"), date, root) / ("%s.parquet" % entry["run"])).exists()):
+            continue
+        if export_run_stats(folder, root=root) is None:
+            break
+        done += 1
+    return done
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Columnar run statistics (STORAGE_DIR/stats)")
+    parser.add_argument("--backfill", action="store_true", help="Export catalogued runs missing from the dataset")
+    parser.add_argument("--force", action="store_true", help="With --backfill, re-export every run")
+    parser.add_argument("--property", default=None, help="Print monthly trends for one property")
+    parser.add_argument("--since", default=None)
+    parser.add_argument("--until", default=None)
+    args = parser.parse_args()
+    if args.backfill:
+        logger.info("Exported %d run(s)", backfill(force=args.force))
+    else:
+        print(json.dumps(trends(args.property, args.since, args.until), indent=2))
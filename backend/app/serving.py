@@ -0,0 +1,193 @@
+"""
+Read-only serving endpoints: run listings, summaries, imagery, pixel / time-series
+queries, tiles and metrics.
+
+Nothing here imports the inference pipeline, training code, scikit-learn or
+joblib, so a worker that only serves maps starts in a fraction of a second:
+
+    gunicorn -k uvicorn.workers.UvicornWorker app.serving:app
+
+api.app mounts the same router next to the pipeline / job endpoints.
+
+ - /health
+ - /runs -> list available run dates
+ - /summary/{run}.geojson -> serve summary
+ - /imagery/{run} -> the run's source imagery COG wherever it is kept (?preview=true: RGB preview)
+ - /tile/{z}/{x}/{y}.png -> returns PNG tile for classification (or ?layer=change) for latest run or requested run via ?run=
+ - /timeseries?lon=&lat= or ?paddock= -> per-run history from the time-series cube
+ - /trends?property=&since=&until=&paddock= -> monthly class-area / index trends from the run stats dataset
+ - /point?lon=&lat= and /points (POST) -> pixel class, probabilities, bands and NDVI
+ - /metrics -> Prometheus text format: stage timings, tile latency, cache hit rates
+"""
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from fastapi.middleware.cors import CORSMiddleware
+from .storage import query_runs, latest_run, get_run, resolve_imagery
+from .query import query_point, query_points, dataset_pool
+from .tiles import fetch_tile, tile_cache, LAYERS
+from .timeseries import series_at_point, series_for_paddock
+from .runstats import stats_available, trends as stats_trends
+from .jobs import jobs
+from .ml.model import model_cache_stats
+from .metrics import registry, gauge_lines
+from .config import STORAGE_DIR
+from pathlib import Path
+import time
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+
+router = APIRouter()
+
+def add_cors(app: FastAPI):
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"]
+    )
+
+@router.get("/health")
+def health():
+    return {"status": "ok", "model_cache": model_cache_stats()}
+
+@router.get("/runs")
+def runs(property: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+         limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """
+    List catalogued runs newest first; filter by property and ISO date range,
+    page with limit/offset. "runs" keeps the plain list of run ids.
+    """
+    entries, total = query_runs(property, since, until, limit, offset)
+    return {"runs": [e["run"] for e in entries], "items": entries, "total": total}
+
+@router.get("/summary/{run_id}")
+def get_summary(run_id: str):
+    p = STORAGE_DIR / run_id / "summary.geojson"
+    if not p.exists():
+        raise HTTPException(status_code=404, detail="Run not found")
+    return FileResponse(str(p), media_type="application/geo+json")
+
+@router.get("/imagery/{run_id}")
+def get_imagery(run_id: str, preview: bool = Query(False)):
+    """
+    Serve a run's imagery: the full scene, resolved through the imagery store's
+    links / manifest, or with ?preview=true the downsampled RGB preview.tif.
+    """
+    folder = STORAGE_DIR / run_id
+    p = folder / "preview.tif" if preview else resolve_imagery(folder)
+    if p is None or not p.exists():
+        raise HTTPException(status_code=404, detail="Imagery not found for run")
+    return FileResponse(str(p), media_type="image/tiff; application=geotiff")
+
+class PointsRequest(BaseModel):
+    points: List[Tuple[float, float]]  # [[lon, lat], ...]
+    run: Optional[str] = None
+
+def _run_folder(run: Optional[str]) -> Path:
+    if run is None:
+        run = latest_run()
+        if run is None:
+            raise HTTPException(status_code=404, detail="No runs available")
+    folder = STORAGE_DIR / run
+    if not (folder / "classification.tif").exists():
+        raise HTTPException(status_code=404, detail="Classification not found for run")
+    return folder
+
+def _run_date(folder: Path) -> Optional[str]:
+    entry = get_run(folder.name)
+    return entry.get("date") if entry else None
+
+@router.get("/point")
+def point(lon: float, lat: float, run: Optional[str] = Query(None)):
+    """
+    Pixel attributes at lon/lat for the latest (or ?run=) run: class, class
+    probabilities, band values and NDVI, via 1x1 windowed reads.
+    """
+    folder = _run_folder(run)
+    res = query_point(folder, lon, lat)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Point outside run extent")
+    return dict(res, run=folder.name, date=_run_date(folder))
+
+@router.post("/points")
+def points(req: PointsRequest):
+    """Batched /point; points outside the scene come back as null."""
+    folder = _run_folder(req.run)
+    return {"run": folder.name, "date": _run_date(folder), "points": query_points(folder, req.points)}
+
+@router.get("/timeseries")
+def timeseries(lon: Optional[float] = None, lat: Optional[float] = None, paddock: Optional[int] = None,
+               run: Optional[str] = Query(None)):
+    """
+    History of the latest (or ?run=) run's scene grid: per-step class and NDVI
+    plus running NDVI stats at lon/lat, or per-step class fractions and mean NDVI
+    for ?paddock=<paddock_id>.
+    """
+    folder = _run_folder(run)
+    if paddock is not None:
+        try:
+            return {"paddock": paddock, "series": series_for_paddock(folder, paddock)}
+        except IndexError:
+            raise HTTPException(status_code=404, detail="Paddock not found")
+    if lon is None or lat is None:
+        raise HTTPException(status_code=422, detail="Give lon and lat, or paddock")
+    res = series_at_point(folder, lon, lat)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Point outside run extent")
+    return dict(res, lon=lon, lat=lat)
+
+@router.get("/trends")
+def trends(property: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+           paddock: Optional[int] = None):
+    """
+    Monthly trends across runs from the Parquet run stats (runstats.trends): per
+    property, paddock (-1 = whole scene) and month, the run count, mean class
+    areas and pixel-weighted index means. Filters are pushed down to the dataset,
+    so only matching partitions / row groups are read.
+    """
+    if not stats_available():
+        raise HTTPException(status_code=501, detail="Run statistics need pyarrow installed")
+    return {"trends": stats_trends(property, since, until, paddock)}
+
+@router.get("/tile/{z}/{x}/{y}.png")
+def tile(z: int, x: int, y: int, run: Optional[str] = Query(None), layer: str = Query("classification")):
+    """
+    Serve a web-mercator PNG tile of the latest run, or the requested run via
+    ?run=; ?layer=change serves the NDVI change map instead of the classification.
+    Tiles come from the run's pre-rendered pyramid / in-memory LRU and are only
+    rendered (windowed) on a cache miss.
+    """
+    folder = _run_folder(run)
+    if layer not in LAYERS or not (folder / LAYERS[layer][0]).exists():
+        raise HTTPException(status_code=404, detail="Layer %s not found for run" % layer)
+    t0 = time.perf_counter()
+    png, source = fetch_tile(folder, z, x, y, layer)
+    registry.tile_seconds.observe(time.perf_counter() - t0, layer, source)
+    return Response(content=png, media_type="image/png",
+                    headers={"Cache-Control": "public, max-age=86400"})
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint (text format 0.0.4)."""
+    lookups = tile_cache.hits + tile_cache.misses
+    model = model_cache_stats()
+    model_lookups = model["loads"] + model["hits"]
+    statuses = {}
+    for j in jobs.list():
+        statuses[j["status"]] = statuses.get(j["status"], 0) + 1
+    gauges = [
+        *gauge_lines("tile_cache_hits", "In-memory tile LRU hits", [({}, tile_cache.hits)]),
+        *gauge_lines("tile_cache_misses", "In-memory tile LRU misses", [({}, tile_cache.misses)]),
+        *gauge_lines("tile_cache_hit_ratio", "In-memory tile LRU hit ratio",
+                     [({}, tile_cache.hits / lookups if lookups else 0.0)]),
+        *gauge_lines("model_cache_hit_ratio", "Model registry hit ratio",
+                     [({}, model["hits"] / model_lookups if model_lookups else 0.0)]),
+        *gauge_lines("model_load_seconds", "Total seconds spent loading models", [({}, model["load_seconds"])]),
+        *gauge_lines("dataset_pool_open", "Open datasets in the /point pool", [({}, dataset_pool.size())]),
+        *gauge_lines("jobs", "Pipeline jobs by status", [({"status": k}, v) for k, v in sorted(statuses.items())]),
+    ]
+    return PlainTextResponse(registry.render(gauges), media_type="text/plain; version=0.0.4")
+
+app = FastAPI(title="Grazing Mapper tiles")
+add_cors(app)
+app.include_router(router)
@@ -1,29 +1,336 @@
 """
 Simple storage helpers for saving outputs under timestamped folders.
+
+Runs are catalogued in STORAGE_DIR/runs.json (run id, date, property, model
+version, bounds, summary stats), rewritten atomically by new_run_folder and
+save_summary_geojson, so listing runs never has to scan the storage directory.
+A run is catalogued as "running" when its folder is created and becomes
+"complete" once its summary is saved; query_runs / latest_run only see complete
+runs, so a run in progress (or one that failed) never replaces the latest one.
+
+Source imagery is kept once per scene in a content-addressed store,
+STORAGE_DIR/imagery/<sha256[:2]>/<sha256>[.cog].tif. A run folder references its
+scene through imagery.json ({"store", "sha256"}) plus an imagery.tif hardlink, or a
+symlink where hardlinks fail (other filesystem). resolve_imagery finds the file
+whichever way it was saved. IMAGERY_MODE="preview" keeps only a downsampled RGB
+preview.tif, and "copy" keeps the old full copy per run.
 """
 from pathlib import Path
 from datetime import datetime
-from typing import Tuple
+from typing import List, Optional, Tuple
+from contextlib import contextmanager
+import fcntl
+import hashlib
 import json
-from .config import STORAGE_DIR
+import os
+import shutil
+import threading
+import numpy as np
+import rasterio
+from rasterio import Affine
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as rio_copy
+from .config import STORAGE_DIR, COG_COMPRESS, COG_BLOCKSIZE, IMAGERY_MODE, IMAGERY_PREVIEW_SIZE
+
+INDEX_NAME = "runs.json"
+IMAGERY_DIR = "imagery"
+_hash_memo = {}
+_index_cache = {"stamp": None, "runs": {}}
+_latest_cache = {"stamp": None, "runs": {}}
+RUNNING, COMPLETE = "running", "complete"
+
+def _index_path() -> Path:
+    return STORAGE_DIR / INDEX_NAME
+
+@contextmanager
+def _index_lock():
+    # serialises read-modify-write of the index across processes
+    STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(STORAGE_DIR / (INDEX_NAME + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _scan_runs() -> dict:
+    """Rebuild catalogue entries from run folders (used once, when no index exists)."""
+    runs = {}
+    for p in STORAGE_DIR.iterdir():
+        if p.is_dir() and (p / "summary.geojson").exists():
+            entry = {"run": p.name, "date": None, "property": None, "status": COMPLETE}
+            try:
+                with open(p / "summary.geojson") as f:
+                    entry["date"] = json.load(f).get("date")
+            except ValueError:
+                pass
+            runs[p.name] = entry
+    return runs
 
-def new_run_folder(ts: datetime = None) -> Path:
+def _read_index(locked: bool = False) -> dict:
+    """
+    Run catalogue {run_id: entry}, re-parsed only when runs.json changes on disk.
+    A missing index is rebuilt from the run folders (pass locked=True when the
+    caller already holds _index_lock).
+    """
+    path = _index_path()
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        if not STORAGE_DIR.exists():
+            return {}
+        if locked:
+            _write_index(_scan_runs())
+        else:
+            with _index_lock():
+                if not path.exists():
+                    _write_index(_scan_runs())
+        return _read_index(locked)
+    stamp = (str(path), st.st_mtime_ns, st.st_size)
+    if _index_cache["stamp"] != stamp:
+        with open(path) as f:
+            _index_cache.update(stamp=stamp, runs=json.load(f)["runs"])
+    return _index_cache["runs"]
+
+def _write_index(runs: dict):
+    path = _index_path()
+    tmp = path.with_suffix(".json.tmp%d" % os.getpid())
+    with open(tmp, "w") as f:
+        json.dump({"runs": runs}, f)
+    os.replace(tmp, path)
+
+def _update_index(run_id: str, **fields):
+    with _index_lock():
+        runs = dict(_read_index(locked=True))
+        entry = dict(runs.get(run_id, {"run": run_id}))
+        entry.update(fields)
+        runs[run_id] = entry
+        _write_index(runs)
+
+def update_run(run_id: str, **fields):
+    """Merge extra fields (e.g. a batch input hash) into a run's catalogue entry."""
+    _update_index(run_id, **fields)
+
+def storage_root() -> Path:
+    """The catalogue's root folder, read at call time so every caller agrees on it."""
+    return STORAGE_DIR
+
+def is_catalogued(folder: Path) -> bool:
+    return Path(folder).resolve().parent == STORAGE_DIR.resolve()
+
+def new_run_folder(ts: datetime = None, property_id: str = None) -> Path:
     if ts is None:
         ts = datetime.utcnow()
-    folder = STORAGE_DIR / ts.strftime("%Y-%m-%dT%H-%M-%SZ")
+    run_id = ts.strftime("%Y-%m-%dT%H-%M-%SZ")
+    if property_id:
+        run_id += "_" + property_id
+    folder = STORAGE_DIR / run_id
     folder.mkdir(parents=True, exist_ok=True)
+    _update_index(run_id, date=ts.isoformat(), property=property_id, status=RUNNING)
     return folder
 
-def save_summary_geojson(folder: Path, summary: dict):
+def save_summary_geojson(folder: Path, summary: dict, **catalogue):
+    """
+    Write summary.geojson and, for run folders under STORAGE_DIR, record the
+    summary stats plus any extra catalogue fields (bounds, model_version, ...)
+    and mark the run complete.
+    """
     target = folder / "summary.geojson"
     with open(target, "w") as f:
         json.dump(summary, f)
+    if is_catalogued(folder):
+        _update_index(Path(folder).name, summary=summary.get("classes"), status=COMPLETE, **catalogue)
     return target
 
-def list_runs():
-    runs = []
-    for p in sorted(STORAGE_DIR.iterdir(), reverse=True):
-        if p.is_dir():
-            runs.append(p.name)
-    return runs
+def query_runs(property_id: str = None, since: str = None, until: str = None,
+               limit: int = None, offset: int = 0) -> Tuple[List[dict], int]:
+    """
+    Complete catalogue entries newest first, filtered by property and ISO date
+    range (inclusive), paged by limit/offset. Returns (entries, total matching).
+    """
+    entries = [e for e in _read_index().values()
+               if _complete(e) and (property_id is None or e.get("property") == property_id)
+               and (since is None or (e.get("date") or "") >= since)
+               and (until is None or (e.get("date") or "") <= until)]
+    entries.sort(key=_newest, reverse=True)
+    total = len(entries)
+    end = None if limit is None else offset + limit
+    return entries[offset:end], total
+
+def _complete(entry: dict) -> bool:
+    # entries written before run status was recorded are finished runs
+    return entry.get("status", COMPLETE) == COMPLETE
+
+def _newest(entry: dict):
+    return entry.get("date") or "", entry["run"]
+
+def list_runs(property_id: str = None, limit: int = None, offset: int = 0) -> List[str]:
+    return [e["run"] for e in query_runs(property_id, limit=limit, offset=offset)[0]]
+
+def get_run(run_id: str) -> Optional[dict]:
+    return _read_index().get(run_id)
+
+def latest_run(property_id: str = None) -> Optional[str]:
+    """Newest complete run (of a property), memoized per property until runs.json changes."""
+    runs = _read_index()
+    stamp = _index_cache["stamp"]
+    if stamp is None or stamp[0] != str(_index_path()):
+        stamp = None  # no index under this STORAGE_DIR (yet): nothing to key the memo on
+    if stamp is None or _latest_cache["stamp"] != stamp:
+        _latest_cache.update(stamp=stamp, runs={})
+    latest = _latest_cache["runs"]
+    if property_id not in latest:
+        done = [e for e in runs.values()
+                if _complete(e) and (property_id is None or e.get("property") == property_id)]
+        latest[property_id] = max(done, key=_newest)["run"] if done else None
+    return latest[property_id]
+
+def write_cog(src_path, dst_path, resampling: str = "nearest", compress: str = COG_COMPRESS):
+    """
+    Translate src_path into a Cloud-Optimized GeoTIFF at dst_path: internally
+    tiled, compressed, with overviews built using `resampling` ("nearest" for
+    class maps, "average" for imagery) so low-zoom reads touch only overview blocks.
+    """
+    rio_copy(str(src_path), str(dst_path), driver="COG",
+             COMPRESS=compress, BLOCKSIZE=COG_BLOCKSIZE,
+             RESAMPLING=resampling.upper(), OVERVIEW_RESAMPLING=resampling.upper(),
+             BIGTIFF="IF_SAFER")
+    return Path(dst_path)
+
+# --- imagery ------------------------------------------------------------------
+
+def file_sha256(path) -> str:
+    """sha256 of a file's bytes, memoized on (path, size, mtime) for this process."""
+    st = os.stat(path)
+    key = (str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+    if key not in _hash_memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _hash_memo[key] = h.hexdigest()
+    return _hash_memo[key]
+
+def store_imagery(src_path, cog: bool = True) -> Path:
+    """
+    Put a scene in the content-addressed store (as a COG with averaged overviews
+    when cog=True) and return its path. A scene already stored costs only the hash.
+    """
+    digest = file_sha256(src_path)
+    target = STORAGE_DIR / IMAGERY_DIR / digest[:2] / (digest + (".cog.tif" if cog else ".tif"))
+    if target.exists():
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name("%s.tmp%d-%d" % (target.name, os.getpid(), threading.get_ident()))
+    try:
+        if cog:
+            write_cog(src_path, tmp, resampling="average")
+        else:
+            shutil.copyfile(src_path, tmp)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return target
+
+def link_imagery(run_folder, stored: Path) -> str:
+    """
+    Reference a stored scene from a run folder: imagery.json always, and
+    imagery.tif as a hardlink, else a relative symlink. Returns "hardlink",
+    "symlink" or "manifest" (only imagery.json could be written).
+    """
+    run_folder, stored = Path(run_folder), Path(stored)
+    with open(run_folder / "imagery.json", "w") as f:
+        json.dump({"store": stored.relative_to(STORAGE_DIR).as_posix(), "sha256": stored.name.split(".")[0]}, f)
+    dst = run_folder / "imagery.tif"
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        os.link(stored, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.relpath(stored, run_folder), dst)
+        return "symlink"
+    except OSError:
+        return "manifest"
+
+def resolve_imagery(run_folder) -> Optional[Path]:
+    """A run's full-resolution imagery (copy, hardlink, live symlink or store entry), or None."""
+    run_folder = Path(run_folder)
+    direct = run_folder / "imagery.tif"
+    if direct.exists():
+        return direct
+    try:
+        with open(run_folder / "imagery.json") as f:
+            stored = STORAGE_DIR / json.load(f)["store"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return stored if stored.exists() else None
+
+def write_preview(src_path, dst_path, max_size: int = IMAGERY_PREVIEW_SIZE, reflectance_max: float = 0.3):
+    """
+    Downsampled true-colour (B04, B03, B02) uint8 COG of a scene, at most
+    max_size pixels on its long side, reflectance 0..reflectance_max stretched to 0..255.
+    """
+    dst_path = Path(dst_path)
+    with rasterio.open(str(src_path)) as src:
+        factor = max(1.0, max(src.width, src.height) / max_size)
+        h, w = max(1, round(src.height / factor)), max(1, round(src.width / factor))
+        # band order is blue, green, red, nir, swir1
+        rgb = src.read([3, 2, 1], out_shape=(3, h, w), resampling=Resampling.average).astype(np.float32)
+        scale = reflectance_max * (10000 if np.issubdtype(np.dtype(src.dtypes[0]), np.integer) else 1)
+        profile = {"driver": "GTiff", "width": w, "height": h, "count": 3, "dtype": "uint8", "crs": src.crs,
+                   "transform": src.transform * Affine.scale(src.width / w, src.height / h)}
+    tmp = dst_path.with_name(dst_path.stem + ".partial.tif")
+    with rasterio.open(str(tmp), "w", **profile) as dst:
+        dst.write(np.clip(rgb * (255 / scale), 0, 255).astype(np.uint8))
+    write_cog(tmp, dst_path, resampling="average")
+    tmp.unlink()
+    return dst_path
+
+def save_imagery(src_path, run_folder, mode: str = IMAGERY_MODE, cog: bool = True) -> dict:
+    """
+    Keep a run's source imagery according to `mode` (see module docstring) and
+    record how in the catalogue. Folders outside STORAGE_DIR always get a
+    self-contained copy unless mode is "preview".
+    """
+    run_folder = Path(run_folder)
+    if mode == "preview":
+        write_preview(src_path, run_folder / "preview.tif")
+        ref = {"mode": "preview"}
+    elif mode == "store" and is_catalogued(run_folder):
+        stored = store_imagery(src_path, cog)
+        ref = {"mode": "store", "store": stored.relative_to(STORAGE_DIR).as_posix(),
+               "link": link_imagery(run_folder, stored)}
+    elif mode in ("store", "copy"):
+        if cog:
+            write_cog(src_path, run_folder / "imagery.tif", resampling="average")
+        else:
+            shutil.copy(src_path, run_folder / "imagery.tif")
+        ref = {"mode": "copy"}
+    else:
+        raise ValueError("unknown imagery mode %r" % mode)
+    if is_catalogued(run_folder):
+        _update_index(run_folder.name, imagery=ref)
+    return ref
 
+def prune_imagery() -> int:
+    """Delete stored scenes no run folder references any more; returns bytes freed."""
+    store = STORAGE_DIR / IMAGERY_DIR
+    if not store.exists():
+        return 0
+    referenced = set()
+    for manifest in STORAGE_DIR.glob("*/imagery.json"):
+        try:
+            with open(manifest) as f:
+                referenced.add(json.load(f)["store"])
+        except (OSError, ValueError, KeyError):
+            continue
+    freed = 0
+    for path in store.glob("*/*.tif"):
+        if path.relative_to(STORAGE_DIR).as_posix() not in referenced:
+            freed += path.stat().st_size
+            path.unlink()
+    return freed
@@ -0,0 +1,185 @@
+"""
+Web-mercator PNG tiles for run rasters (classification and NDVI change layers).
+
+Tiles are rendered with a windowed warp of only the pixels under the requested
+z/x/y, coloured with a paletted PNG (no per-class Python loop), and cached in
+memory (LRU keyed by (run, z, x, y)). Tiles that intersect the scene within the
+seeded zoom range (TILE_SEED_ZOOMS) are also kept on disk under
+<run>/tiles/z/x/y.png; anything else a client asks for (empty tiles outside the
+scene, deep zooms) lives only in the LRU, so a run's disk use is bounded by its
+pyramid rather than by client traffic. A run's classification never changes
+once written, so cached tiles never expire.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Iterable
+import io
+import logging
+import mercantile
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+from PIL import Image
+from .config import TILE_CACHE_SIZE, TILE_SEED_ZOOMS
+
+logger = logging.getLogger("tiles")
+
+TILE_SIZE = 256
+NODATA = 255  # palette index left transparent (outside the scene)
+
+CLASS_COLORS = {
+    0: (180, 50, 50),    # poor
+    1: (240, 180, 60),   # moderate
+    2: (60, 180, 75),    # good
+    3: (200, 200, 200),  # cloud/no-data
+}
+
+# NDVI change classes written by timeseries.append_run
+CHANGE_COLORS = {
+    0: (165, 0, 38),     # strong decline
+    1: (244, 109, 67),   # decline
+    2: (255, 255, 191),  # stable
+    3: (116, 196, 118),  # increase
+    4: (0, 104, 55),     # strong increase
+}
+
+def _palette(colors):
+    pal = np.zeros((256, 3), dtype=np.uint8)
+    for k, v in colors.items():
+        pal[k] = v
+    return pal.reshape(-1).tolist()
+
+PALETTE = _palette(CLASS_COLORS)
+
+# tile layer -> (raster in the run folder, palette)
+LAYERS = {
+    "classification": ("classification.tif", PALETTE),
+    "change": ("change.tif", _palette(CHANGE_COLORS)),
+}
+
+class TileCache:
+    """Thread-safe in-memory LRU of encoded PNG bytes."""
+
+    def __init__(self, maxsize: int = TILE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._data.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png: bytes):
+        with self._lock:
+            self._data[key] = png
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+tile_cache = TileCache()
+
+def read_tile(src, z: int, x: int, y: int) -> np.ndarray:
+    """
+    Nearest-neighbour warp of the classification under tile z/x/y into a
+    256x256 uint8 array; pixels outside the scene are NODATA.
+    """
+    west, south, east, north = mercantile.xy_bounds(x, y, z)
+    with WarpedVRT(src, crs="EPSG:3857",
+                   transform=from_bounds(west, south, east, north, TILE_SIZE, TILE_SIZE),
+                   width=TILE_SIZE, height=TILE_SIZE,
+                   resampling=Resampling.nearest, nodata=NODATA) as vrt:
+        return vrt.read(1)
+
+def encode_png(arr: np.ndarray, palette=PALETTE) -> bytes:
+    img = Image.fromarray(arr)
+    img.putpalette(palette)  # L -> P: the palette does the colour lookup
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", transparency=NODATA)
+    return buf.getvalue()
+
+def render_tile(tif: Path, z: int, x: int, y: int, palette=PALETTE) -> bytes:
+    with rasterio.open(str(tif)) as src:
+        return encode_png(read_tile(src, z, x, y), palette)
+
+def _in_scene(src, z: int, x: int, y: int) -> bool:
+    west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+    b = mercantile.bounds(x, y, z)
+    return b.west < east and b.east > west and b.south < north and b.north > south
+
+def _tile_path(run_folder: Path, z: int, x: int, y: int, layer: str = "classification") -> Path:
+    root = run_folder / "tiles"
+    if layer != "classification":
+        root = root / layer
+    return root / str(z) / str(x) / ("%d.png" % y)
+
+def _write_atomic(path: Path, png: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".png.tmp")
+    tmp.write_bytes(png)
+    tmp.replace(path)
+
+def fetch_tile(run_folder: Path, z: int, x: int, y: int, layer: str = "classification",
+               persist_zooms: Iterable[int] = TILE_SEED_ZOOMS):
+    """
+    (PNG bytes, source) for tile z/x/y of one of a run's LAYERS: from the memory
+    cache ("memory"), then the on-disk pyramid ("disk"), rendering only on a miss
+    in both ("render"). Rendered tiles are written to disk only when z lies within
+    persist_zooms' range and the tile intersects the scene.
+    """
+    run_folder = Path(run_folder)
+    key = (str(run_folder), layer, z, x, y)
+    png = tile_cache.get(key)
+    if png is not None:
+        return png, "memory"
+    path = _tile_path(run_folder, z, x, y, layer)
+    if path.exists():
+        png, source = path.read_bytes(), "disk"
+    else:
+        name, palette = LAYERS[layer]
+        with rasterio.open(str(run_folder / name)) as src:
+            png, source = encode_png(read_tile(src, z, x, y), palette), "render"
+            zooms = list(persist_zooms)
+            if zooms and min(zooms) <= z <= max(zooms) and _in_scene(src, z, x, y):
+                _write_atomic(path, png)
+    tile_cache.put(key, png)
+    return png, source
+
+def get_tile(run_folder: Path, z: int, x: int, y: int, layer: str = "classification") -> bytes:
+    """PNG bytes for tile z/x/y of a run layer; see fetch_tile."""
+    return fetch_tile(run_folder, z, x, y, layer)[0]
+
+def seed_tiles(run_folder: Path, zooms: Iterable[int], layer: str = "classification") -> int:
+    """
+    Pre-render the on-disk pyramid for every tile intersecting one of the run's
+    LAYERS at the given zoom levels. Returns the number of tiles written.
+    """
+    run_folder = Path(run_folder)
+    name, palette = LAYERS[layer]
+    written = 0
+    with rasterio.open(str(run_folder / name)) as src:
+        west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        for t in mercantile.tiles(west, south, east, north, list(zooms)):
+            path = _tile_path(run_folder, t.z, t.x, t.y, layer)
+            if path.exists():
+                continue
+            _write_atomic(path, encode_png(read_tile(src, t.z, t.x, t.y), palette))
+            written += 1
+    logger.info("Seeded %d %s tiles in %s", written, layer, run_folder)
+    return written
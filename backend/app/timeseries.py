@@ -0,0 +1,261 @@
+"""
+Multi-month time-series cube and incremental change detection.
+
+Every catalogued run is appended to a cube for its property and scene grid under
+<storage root>/timeseries/<key>/ (the storage root being the run folder's parent):
+
+  steps.json            [{"run", "date"}, ...] in time order
+  class/<t>.npy         uint8 class map for step t
+  ndvi/<t>.npy          int16 NDVI * NDVI_SCALE for step t
+  stats/<n>/*.npy       running NDVI count/mean/M2 (Welford) and rolling sum/count
+                        over the last `rolling` steps after n steps, cloud pixels excluded
+
+Each step is its own memory-mapped .npy (the cube is chunked along time), so a
+pixel's history is one element per step and appending never rewrites history.
+Appending computes the NDVI delta against the previous step only and writes the
+run's change.tif (CHANGE_BINS classes) for the "change" tile layer; the rolling
+window needs just the one step that falls out of it. The step's files and a new
+stats/<n + 1> set are written next to the current ones and committed by replacing
+steps.json, so a failed append leaves the cube as it was and can be retried.
+"""
+from pathlib import Path
+from typing import List, Optional
+import fcntl
+import hashlib
+import json
+import logging
+import shutil
+import numpy as np
+import rasterio
+from rasterio.features import bounds as geom_bounds
+from rasterio.warp import transform_geom
+from rasterio.windows import from_bounds
+from .ml.features import CLOUD_CLASS
+from .ml.raster_io import iter_windows
+from .query import pixel_index
+from .storage import get_run, is_catalogued, resolve_imagery, write_cog
+from .zonal import load_paddocks, paddock_labels, zones_dir
+from .config import TIMESERIES_ROLLING, INFERENCE_WINDOW_SIZE, PADDOCKS_PATH
+
+logger = logging.getLogger("timeseries")
+
+TIMESERIES_DIR = "timeseries"
+NDVI_SCALE = 10000
+CHANGE_NODATA = 255
+# NDVI delta edges -> change classes 0 (strong decline) .. 4 (strong increase)
+CHANGE_BINS = np.array([-0.15, -0.05, 0.05, 0.15])
+
+def grid_key(crs, transform, shape, property_id: str = None) -> str:
+    """Cube key: the scene grid, plus the property so properties sharing a grid keep separate histories."""
+    grid = (crs.to_wkt() if crs else None, tuple(transform), tuple(shape))
+    h = hashlib.sha1(repr(grid if property_id is None else grid + (property_id,)).encode())
+    return h.hexdigest()[:16]
+
+def cube_dir(run_folder: Path, root: Path = None) -> Path:
+    """
+    Cube directory for a run's property (from the catalogue) and the grid of its
+    classification.tif, under root (default: <run_folder's parent>/timeseries).
+    """
+    run_folder = Path(run_folder)
+    root = Path(root) if root is not None else run_folder.parent / TIMESERIES_DIR
+    entry = get_run(run_folder.name) if is_catalogued(run_folder) else None
+    with rasterio.open(str(run_folder / "classification.tif")) as src:
+        return root / grid_key(src.crs, src.transform, src.shape, entry.get("property") if entry else None)
+
+def read_steps(cube: Path) -> List[dict]:
+    path = Path(cube) / "steps.json"
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def _write_steps(cube: Path, steps: List[dict]):
+    tmp = cube / "steps.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(steps, f)
+    tmp.replace(cube / "steps.json")
+
+def _npy(cube: Path, kind: str, t: int) -> Path:
+    return cube / kind / ("%05d.npy" % t)
+
+def _open_new(path: Path, dtype, shape):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+STATS = (("count", np.uint16), ("mean", np.float32), ("m2", np.float32),
+         ("rolling_sum", np.float32), ("rolling_count", np.uint16))
+
+def _stats_dir(cube: Path, n: int) -> Path:
+    return cube / "stats" / ("%05d" % n)
+
+def _stats(cube: Path, n: int) -> Optional[dict]:
+    """Running statistics after n steps (read-only memmaps), or None if there are none."""
+    folder = _stats_dir(cube, n)
+    if n == 0 or not all((folder / ("%s.npy" % name)).exists() for name, _ in STATS):
+        return None
+    return {name: np.load(folder / ("%s.npy" % name), mmap_mode="r") for name, _ in STATS}
+
+def append_run(run_folder: Path, date: str, root: Path = None, rolling: int = TIMESERIES_ROLLING,
+               window_size: int = INFERENCE_WINDOW_SIZE, cog: bool = True, imagery=None) -> Optional[int]:
+    """
+    Append a run's class map and NDVI to its grid's cube, write the updated
+    running statistics and <run_folder>/change.tif against the previous step.
+    Window by window, so memory stays bounded. Returns the new step index, or None
+    if the run is already in the cube or older than its last step.
+    NDVI is read from `imagery` (default: the run's imagery, storage.resolve_imagery).
+    """
+    run_folder = Path(run_folder)
+    cube = cube_dir(run_folder, root)
+    cube.mkdir(parents=True, exist_ok=True)
+    with open(cube / ".lock", "w") as lock:
+        # one writer per cube: step t and stats/<t + 1> are written in place before the commit
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _append_locked(run_folder, cube, date, rolling, window_size, cog,
+                              imagery or resolve_imagery(run_folder))
+
+def _append_locked(run_folder: Path, cube: Path, date: str, rolling: int, window_size: int,
+                   cog: bool, imagery) -> Optional[int]:
+    steps = read_steps(cube)
+    if any(s["run"] == run_folder.name for s in steps) or (steps and date < steps[-1]["date"]):
+        logger.warning("Not appending %s to %s: already present or out of order", run_folder.name, cube)
+        return None
+    t = len(steps)
+    with rasterio.open(str(run_folder / "classification.tif")) as cls_src, \
+            rasterio.open(str(imagery)) as img_src:
+        shape = cls_src.shape
+        cls_out = _open_new(_npy(cube, "class", t), np.uint8, shape)
+        ndvi_out = _open_new(_npy(cube, "ndvi", t), np.int16, shape)
+        prev_cls = np.load(_npy(cube, "class", t - 1), mmap_mode="r") if t else None
+        prev_ndvi = np.load(_npy(cube, "ndvi", t - 1), mmap_mode="r") if t else None
+        old = t - rolling
+        old_cls = np.load(_npy(cube, "class", old), mmap_mode="r") if old >= 0 else None
+        old_ndvi = np.load(_npy(cube, "ndvi", old), mmap_mode="r") if old >= 0 else None
+        prev = _stats(cube, t)
+        new_dir = _stats_dir(cube, t + 1)
+        shutil.rmtree(new_dir, ignore_errors=True)  # left by an append that failed before committing
+        stats = {name: _open_new(new_dir / ("%s.npy" % name), dtype, shape) for name, dtype in STATS}
+        change_meta = cls_src.meta.copy()
+        change_meta.update(count=1, dtype="uint8", nodata=CHANGE_NODATA)
+        change_tmp = run_folder / ("change.partial.tif" if cog else "change.tif")
+        with rasterio.open(str(change_tmp), "w", **change_meta) as change_dst:
+            for window in iter_windows(shape[0], shape[1], window_size):
+                rows, cols = window.toslices()
+                cls = cls_src.read(1, window=window)
+                red, nir = img_src.read(indexes=[3, 4], window=window).astype(np.float32)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ndvi = np.where(nir + red != 0, (nir - red) / (nir + red), 0.0)
+                ndvi_q = np.rint(ndvi * NDVI_SCALE).astype(np.int16)
+                cls_out[rows, cols] = cls
+                ndvi_out[rows, cols] = ndvi_q
+                valid = cls != CLOUD_CLASS
+                v = ndvi_q.astype(np.float32) / NDVI_SCALE
+                before = {name: prev[name][rows, cols] if prev else np.zeros(cls.shape, dtype)
+                          for name, dtype in STATS}
+
+                # Welford update of the all-time NDVI mean / variance
+                count = before["count"] + valid
+                delta = np.where(valid, v - before["mean"], 0)
+                mean = before["mean"] + np.where(valid, delta / np.maximum(count, 1), 0)
+                stats["m2"][rows, cols] = before["m2"] + np.where(valid, delta * (v - mean), 0)
+                stats["mean"][rows, cols] = mean
+                stats["count"][rows, cols] = count
+
+                # rolling window: add this step, drop the one that fell out
+                rolling_sum = before["rolling_sum"] + np.where(valid, v, 0)
+                rolling_count = before["rolling_count"] + valid
+                if old_cls is not None:
+                    old_valid = old_cls[rows, cols] != CLOUD_CLASS
+                    old_v = old_ndvi[rows, cols].astype(np.float32) / NDVI_SCALE
+                    rolling_sum -= np.where(old_valid, old_v, 0)
+                    rolling_count -= old_valid
+                stats["rolling_sum"][rows, cols] = rolling_sum
+                stats["rolling_count"][rows, cols] = rolling_count
+
+                change = np.full(cls.shape, CHANGE_NODATA, dtype=np.uint8)
+                if prev_cls is not None:
+                    both = valid & (prev_cls[rows, cols] != CLOUD_CLASS)
+                    d = v - prev_ndvi[rows, cols].astype(np.float32) / NDVI_SCALE
+                    change[both] = np.digitize(d[both], CHANGE_BINS)
+                change_dst.write(change, 1, window=window)
+        for arr in (cls_out, ndvi_out, *stats.values()):
+            arr.flush()
+    if cog:
+        write_cog(change_tmp, run_folder / "change.tif", resampling="nearest")
+        change_tmp.unlink()
+    steps.append({"run": run_folder.name, "date": date})
+    _write_steps(cube, steps)
+    # readers that loaded steps.json just before the commit may still open stats/<t>
+    for old_stats in (cube / "stats").iterdir():
+        if old_stats.name < "%05d" % t:
+            shutil.rmtree(old_stats, ignore_errors=True)
+    logger.info("Appended %s as step %d of %s", run_folder.name, t, cube)
+    return t
+
+def _pixel_stats(stats, row: int, col: int) -> dict:
+    n = int(stats["count"][row, col])
+    rn = int(stats["rolling_count"][row, col])
+    return {
+        "count": n,
+        "mean_ndvi": float(stats["mean"][row, col]) if n else None,
+        "std_ndvi": float(np.sqrt(stats["m2"][row, col] / n)) if n else None,
+        "rolling_mean_ndvi": float(stats["rolling_sum"][row, col] / rn) if rn else None,
+    }
+
+def pixel_series(cube: Path, row: int, col: int) -> dict:
+    """Class and NDVI at one pixel for every step, plus the running statistics."""
+    cube = Path(cube)
+    steps = read_steps(cube)
+    series = []
+    for t, step in enumerate(steps):
+        cls = int(np.load(_npy(cube, "class", t), mmap_mode="r")[row, col])
+        ndvi = int(np.load(_npy(cube, "ndvi", t), mmap_mode="r")[row, col]) / NDVI_SCALE
+        series.append(dict(step, **{"class": cls, "ndvi": None if cls == CLOUD_CLASS else ndvi}))
+    stats = _stats(cube, len(steps))
+    return {"series": series, "stats": _pixel_stats(stats, row, col) if stats else None}
+
+def paddock_series(cube: Path, paddocks_path, paddock_id: int, crs, transform, shape,
+                   zones_cache: Path = None) -> List[dict]:
+    """
+    Per-step class fractions and mean NDVI (cloud-free pixels) over one paddock,
+    reading only the paddock's bounding window from each step.
+    zones_cache: label raster cache folder, see zonal.paddock_labels.
+    """
+    if paddock_id < 0:
+        # label 0 is "no paddock", so a negative index must not wrap around to the last paddock
+        raise IndexError("paddock ids start at 0")
+    cube = Path(cube)
+    feature = load_paddocks(paddocks_path)[paddock_id]
+    geom = transform_geom("EPSG:4326", crs, feature["geometry"]) if crs else feature["geometry"]
+    win = from_bounds(*geom_bounds(geom), transform=transform).round_offsets().round_lengths()
+    win = win.intersection(rasterio.windows.Window(0, 0, shape[1], shape[0]))
+    rows, cols = win.toslices()
+    labels = paddock_labels(paddocks_path, crs, transform, shape, zones_cache)
+    mask = np.asarray(labels[rows, cols]) == paddock_id + 1
+    n = int(mask.sum())
+    out = []
+    for t, step in enumerate(read_steps(cube)):
+        cls = np.load(_npy(cube, "class", t), mmap_mode="r")[rows, cols][mask]
+        ndvi = np.load(_npy(cube, "ndvi", t), mmap_mode="r")[rows, cols][mask]
+        valid = cls != CLOUD_CLASS
+        counts = np.bincount(cls, minlength=CLOUD_CLASS + 1)
+        out.append(dict(step, **{
+            "pixels": n,
+            "class_fraction": {str(c): float(counts[c] / n) for c in np.flatnonzero(counts)} if n else {},
+            "mean_ndvi": float(ndvi[valid].mean() / NDVI_SCALE) if valid.any() else None,
+        }))
+    return out
+
+def series_at_point(run_folder: Path, lon: float, lat: float, root: Path = None) -> Optional[dict]:
+    """pixel_series at lon/lat on the grid of run_folder, or None outside it."""
+    with rasterio.open(str(Path(run_folder) / "classification.tif")) as src:
+        rc = pixel_index(src, lon, lat)
+    if rc is None:
+        return None
+    return dict(pixel_series(cube_dir(run_folder, root), *rc), row=rc[0], col=rc[1])
+
+def series_for_paddock(run_folder: Path, paddock_id: int, paddocks_path=PADDOCKS_PATH,
+                       root: Path = None) -> List[dict]:
+    with rasterio.open(str(Path(run_folder) / "classification.tif")) as src:
+        crs, transform, shape = src.crs, src.transform, src.shape
+    return paddock_series(cube_dir(run_folder, root), paddocks_path, paddock_id, crs, transform, shape,
+                          zones_dir(run_folder))
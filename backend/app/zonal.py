@@ -0,0 +1,158 @@
+"""
+Per-paddock zonal statistics for summary.geojson.
+
+Paddock polygons are rasterised once per (geometry file, scene grid) into a
+label raster (0 = outside every paddock, i + 1 = feature i) cached as .npy under
+zones_dir(run) and memory-mapped on reuse. Statistics are then accumulated
+window by window with np.bincount: class areas, mean NDVI/NDWI/BSI over
+cloud-free pixels and cloud fraction per paddock, with ellipsoidal per-row pixel
+areas for geographic grids. Cloud is the published classification's CLOUD_CLASS,
+so cloud_fraction always agrees with the map.
+"""
+from pathlib import Path
+from typing import List
+import hashlib
+import json
+import logging
+import numpy as np
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from .ml.features import CLOUD_CLASS
+from .storage import is_catalogued
+
+logger = logging.getLogger("zonal")
+
+ZONES_DIR = "zones"
+
+# WGS84
+_A = 6378137.0
+_F = 1 / 298.257223563
+_B = _A * (1 - _F)
+_E = np.sqrt(_F * (2 - _F))
+
+def load_paddocks(path) -> List[dict]:
+    with open(path) as f:
+        return json.load(f)["features"]
+
+def _area_to_lat(lat_deg: np.ndarray) -> np.ndarray:
+    """Ellipsoid surface area (m^2) between the equator and lat, per radian of longitude."""
+    s = np.sin(np.radians(lat_deg))
+    es = _E * s
+    return _B ** 2 / 2 * (s / (1 - es ** 2) + np.log((1 + es) / (1 - es)) / (2 * _E))
+
+def row_areas(crs, transform, height: int) -> np.ndarray:
+    """
+    Area in m^2 of one pixel in each row. Geographic grids use the exact WGS84
+    area of each lat/lon cell; projected grids use the pixel size (CRS units assumed metres).
+    """
+    if crs is not None and crs.is_geographic:
+        edges = transform.f + transform.e * np.arange(height + 1)
+        return np.abs(np.diff(_area_to_lat(edges))) * np.radians(abs(transform.a))
+    return np.full(height, abs(transform.a * transform.e))
+
+def _labels_key(paddocks_path, crs, transform, shape) -> str:
+    h = hashlib.sha1(Path(paddocks_path).read_bytes())
+    h.update(repr((crs.to_wkt() if crs else None, tuple(transform), tuple(shape))).encode())
+    return h.hexdigest()[:16]
+
+def zones_dir(run_folder: Path) -> Path:
+    """
+    Label raster cache for a run: shared by every run of a storage root for
+    catalogued runs, otherwise kept inside the run folder itself.
+    """
+    run_folder = Path(run_folder)
+    return (run_folder.parent if is_catalogued(run_folder) else run_folder) / ZONES_DIR
+
+def paddock_labels(paddocks_path, crs, transform, shape, cache_dir: Path = None) -> np.ndarray:
+    """
+    Label raster aligned to the scene grid. With cache_dir (see zones_dir) it is
+    rasterised once and memory-mapped from disk afterwards; None skips the cache.
+    """
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / ("%s.npy" % _labels_key(paddocks_path, crs, transform, shape))
+        if path.exists():
+            return np.load(path, mmap_mode="r")
+    features = load_paddocks(paddocks_path)
+    dtype = np.uint16 if len(features) < np.iinfo(np.uint16).max else np.int32
+    shapes = ((transform_geom("EPSG:4326", crs, feat["geometry"]) if crs else feat["geometry"], i + 1)
+              for i, feat in enumerate(features))
+    labels = rasterize(shapes, out_shape=shape, transform=transform, fill=0, dtype=dtype)
+    if path is None:
+        return labels
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, labels)
+    tmp.replace(path)
+    logger.info("Rasterised %d paddocks to %s", len(features), path)
+    return np.load(path, mmap_mode="r")
+
+class ZonalAccumulator:
+    """
+    Streams per-window class rasters and features into per-zone sums.
+    Zone 0 is "outside every paddock"; it also makes the scene totals cheap.
+    """
+
+    def __init__(self, n_zones: int, row_area: np.ndarray, n_classes: int):
+        self.n_zones = n_zones
+        self.n_classes = n_classes
+        self.row_area = row_area
+        z = n_zones + 1
+        self.class_pixels = np.zeros(z * n_classes, dtype=np.int64)
+        self.class_area = np.zeros(z * n_classes, dtype=np.float64)
+        self.pixels = np.zeros(z, dtype=np.int64)
+        self.sums = np.zeros((3, z), dtype=np.float64)  # ndvi, ndwi, bsi over cloud-free pixels
+        self.cloud = np.zeros(z, dtype=np.int64)
+
+    def add(self, labels: np.ndarray, class_block: np.ndarray, indices: np.ndarray, row_off: int):
+        """
+        labels / class_block: (h, w) blocks; indices: (3, h, w) NDVI / NDWI / BSI
+        for the same block (infer.predict_block), or None to only count classes;
+        row_off: the block's first row in the scene. Pixels classified CLOUD_CLASS
+        (cloud, nodata and SCL-invalid pixels when cloud masking is on) count as
+        cloud and are left out of the index means.
+        """
+        h, w = class_block.shape
+        z = self.n_zones + 1
+        lab = np.asarray(labels, dtype=np.intp).reshape(-1)
+        area = np.repeat(self.row_area[row_off:row_off + h], w)
+        idx = lab * self.n_classes + class_block.reshape(-1)
+        self.class_pixels += np.bincount(idx, minlength=z * self.n_classes)
+        self.class_area += np.bincount(idx, weights=area, minlength=z * self.n_classes)
+        self.pixels += np.bincount(lab, minlength=z)
+        cloud = class_block.reshape(-1) == CLOUD_CLASS
+        self.cloud += np.bincount(lab[cloud], minlength=z)
+        if indices is None:
+            return
+        clear = ~cloud
+        for i in range(3):
+            self.sums[i] += np.bincount(lab[clear], weights=indices[i].reshape(-1)[clear], minlength=z)
+
+    def scene_classes(self) -> List[dict]:
+        pixels = self.class_pixels.reshape(-1, self.n_classes).sum(axis=0)
+        area = self.class_area.reshape(-1, self.n_classes).sum(axis=0)
+        return [{"class": int(c), "pixels": int(pixels[c]), "approx_area_m2": float(area[c])}
+                for c in np.flatnonzero(pixels)]
+
+    def features(self, paddocks: List[dict]) -> List[dict]:
+        pixels = self.class_pixels.reshape(-1, self.n_classes)
+        area = self.class_area.reshape(-1, self.n_classes)
+        out = []
+        for i, feat in enumerate(paddocks):
+            zone = i + 1
+            n = int(self.pixels[zone])
+            clear = n - int(self.cloud[zone])
+            props = dict(feat.get("properties") or {})
+            props.update({
+                "paddock_id": i,
+                "pixels": n,
+                "area_m2": float(area[zone].sum()),
+                "class_pixels": {str(c): int(pixels[zone, c]) for c in np.flatnonzero(pixels[zone])},
+                "class_area_m2": {str(c): float(area[zone, c]) for c in np.flatnonzero(pixels[zone])},
+                "mean_ndvi": float(self.sums[0, zone] / clear) if clear else None,
+                "mean_ndwi": float(self.sums[1, zone] / clear) if clear else None,
+                "mean_bsi": float(self.sums[2, zone] / clear) if clear else None,
+                "cloud_fraction": float(self.cloud[zone] / n) if n else None,
+            })
+            out.append({"type": "Feature", "geometry": feat["geometry"], "properties": props})
+        return out
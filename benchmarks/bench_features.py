@@ -0,0 +1,60 @@
+"""
+Benchmark the fused feature kernel against the original per-index path.
+
+Usage: python -m benchmarks.bench_features [--size 2048] [--repeat 3]
+
+Reports best-of-N wall time and tracemalloc peak for:
+ - legacy: float64 band casts + ndvi/ndwi/bsi + column_stack (the pre-fusion
+   extract_features_from_array)
+ - fused: features.feature_stack into a fresh float32 buffer
+ - fused (reused out): feature_stack into a caller-provided buffer
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from backend.app.ml.features import ndvi, ndwi, bsi, feature_stack, N_FEATURES
+
+def legacy_features(arr: np.ndarray) -> np.ndarray:
+    blue, green, red, nir, swir1, swir2 = (arr[i].astype(float) for i in range(6))
+    return np.column_stack([
+        blue.reshape(-1), green.reshape(-1), red.reshape(-1),
+        nir.reshape(-1), swir1.reshape(-1), swir2.reshape(-1),
+        ndvi(nir, red).reshape(-1),
+        ndwi(green, nir).reshape(-1),
+        bsi(blue, red, nir, swir1).reshape(-1),
+    ])
+
+def measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2048, help="Scene side length in pixels")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 10000, size=(6, args.size, args.size), dtype=np.uint16)
+    buf = np.empty((args.size * args.size, N_FEATURES), dtype=np.float32)
+    cases = [
+        ("legacy", lambda: legacy_features(arr)),
+        ("fused", lambda: feature_stack(arr)),
+        ("fused (reused out)", lambda: feature_stack(arr, out=buf)),
+    ]
+    mpx = args.size * args.size / 1e6
+    print("%-20s %10s %10s %12s" % ("case", "time (s)", "MP/s", "peak (MiB)"))
+    for name, fn in cases:
+        secs, peak = measure(fn, args.repeat)
+        print("%-20s %10.3f %10.1f %12.1f" % (name, secs, mpx / secs, peak / 2**20))
+
+if __name__ == "__main__":
+    main()
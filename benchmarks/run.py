@@ -0,0 +1,264 @@
+"""
+Benchmark suite: how each pipeline stage scales with scene size.
+
+Usage: python -m benchmarks.run [--sizes 256,1024,2048] [--cases indices,features,...]
+                                [--repeat 3] [--out bench.json]
+                                [--compare previous.json] [--tolerance 1.25]
+
+For every size a synthetic scene is generated with demo/generate_sample_data.make_synthetic
+and each case runs in its own spawned process, so peak RSS (ru_maxrss) belongs
+to that case alone. Cases:
+
+ - indices:   ndvi / ndwi / bsi on float64 band arrays (the per-index functions)
+ - features:  infer.extract_features_from_array (fused float32 feature_stack)
+ - predict:   infer.predict_block over the whole scene (features + forest)
+ - inference: infer.run_inference end to end (COG output, no tiles/paddocks)
+ - tiles:     load test of GET /tile through the FastAPI app with TestClient and
+              concurrent clients; a cold pass (render) then a warm pass (LRU)
+
+Results are written as JSON (one record per case and size, plus environment
+metadata). With --compare, records slower than tolerance x the previous file's
+wall time are listed and the exit status is 1, so CI can track regressions.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import numpy as np
+
+CASES = ("indices", "features", "predict", "inference", "tiles")
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_scene(path: Path, size: int) -> Path:
+    from demo.generate_sample_data import main as gen_main
+    gen_main(out=path, width=size, height=size)
+    return path
+
+def train_model(scene: Path, path: Path) -> Path:
+    """Production-sized forest (50 trees) on a sample of the scene's labels."""
+    from sklearn.ensemble import RandomForestClassifier
+    from backend.app.ml.model import save_model
+    from backend.app.ml.train_demo import load_sample_features
+    X, y = load_sample_features(str(scene))
+    idx = np.random.default_rng(0).choice(len(y), min(len(y), 50000), replace=False)
+    save_model(RandomForestClassifier(n_estimators=50, random_state=42).fit(X[idx], y[idx]), str(path))
+    return path
+
+def _timed(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+def _case_indices(scene, model, repeat):
+    from backend.app.infer import read_imagery
+    from backend.app.ml.features import ndvi, ndwi, bsi
+    arr, _ = read_imagery(str(scene))
+    blue, green, red, nir, swir1 = (arr[i].astype(float) for i in range(5))
+    return _timed(lambda: (ndvi(nir, red), ndwi(green, nir), bsi(blue, red, nir, swir1)), repeat), {}
+
+def _case_features(scene, model, repeat):
+    from backend.app.infer import read_imagery, extract_features_from_array
+    arr, _ = read_imagery(str(scene))
+    return _timed(lambda: extract_features_from_array(arr), repeat), {}
+
+def _case_predict(scene, model, repeat):
+    from backend.app.infer import read_imagery, predict_block
+    from backend.app.ml.model import load_model
+    arr, _ = read_imagery(str(scene))
+    m = load_model(str(model))
+    return _timed(lambda: predict_block(m, arr), repeat), {}
+
+def _case_inference(scene, model, repeat):
+    from backend.app.infer import run_inference
+    out = Path(tempfile.mkdtemp(prefix="bench-inference-"))
+    try:
+        times = _timed(lambda: run_inference(str(scene), model_path=str(model), out_folder=str(out),
+                                             seed_zooms=[], paddocks=None, timeseries=False), repeat)
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    return times, {}
+
+def tile_load_test(scene: Path, model: Path, zooms=(12, 13, 14), clients: int = 8,
+                   max_tiles: int = 256) -> dict:
+    """
+    Serve one run's tiles through the API app: every tile over the scene at the
+    given zooms (up to max_tiles), requested by `clients` concurrent threads,
+    first cold (each tile rendered) then warm (in-memory LRU).
+    """
+    import mercantile
+    import rasterio
+    from rasterio.warp import transform_bounds
+    from fastapi.testclient import TestClient
+    from backend.app.serving import app
+    from backend.app.infer import run_inference
+    from backend.app.tiles import tile_cache
+    run = "bench-%s" % uuid.uuid4().hex[:8]
+    with _temp_storage() as root:
+        folder = root / run
+        run_inference(str(scene), model_path=str(model), out_folder=str(folder), seed_zooms=[],
+                      paddocks=None, timeseries=False)
+        with rasterio.open(str(folder / "classification.tif")) as src:
+            bounds = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        tiles = list(mercantile.tiles(*bounds, list(zooms)))[:max_tiles]
+        tile_cache.clear()
+        out = {"tiles": len(tiles), "clients": clients}
+        with TestClient(app) as client:
+            def get(t):
+                t0 = time.perf_counter()
+                r = client.get("/tile/%d/%d/%d.png" % (t.z, t.x, t.y), params={"run": run})
+                r.raise_for_status()
+                return time.perf_counter() - t0
+            for name in ("cold", "warm"):
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(clients) as pool:
+                    latencies = sorted(pool.map(get, tiles))
+                elapsed = time.perf_counter() - t0
+                out[name] = {
+                    "requests_per_s": len(tiles) / elapsed,
+                    "latency_p50_ms": 1000 * latencies[len(latencies) // 2],
+                    "latency_p95_ms": 1000 * latencies[int(len(latencies) * 0.95)],
+                }
+        out["cache_hits"], out["cache_misses"] = tile_cache.hits, tile_cache.misses
+        return out
+
+@contextmanager
+def _temp_storage():
+    """
+    Point the catalogue, the serving app and config at a throwaway STORAGE_DIR,
+    so a benchmark run, its catalogue entry and its imagery store copy never
+    reach the real runs.json / store, and are all removed afterwards.
+    """
+    from backend.app import config, serving, storage
+    root = Path(tempfile.mkdtemp(prefix="bench-storage-"))
+    saved = {mod: mod.STORAGE_DIR for mod in (config, storage, serving)}
+    for mod in saved:
+        mod.STORAGE_DIR = root
+    try:
+        yield root
+    finally:
+        for mod, path in saved.items():
+            mod.STORAGE_DIR = path
+        shutil.rmtree(root, ignore_errors=True)
+
+def _case_tiles(scene, model, repeat):
+    extra = tile_load_test(scene, model)
+    return [extra["tiles"] / extra["cold"]["requests_per_s"]], extra
+
+def run_case(case: str, scene: Path, model: Path, size: int, repeat: int) -> dict:
+    """One case in the current process: timings, throughput and peak RSS."""
+    baseline = _rss_mb()
+    times, extra = globals()["_case_" + case](scene, model, repeat)
+    mpx = size * size / 1e6
+    best = min(times)
+    return dict({
+        "case": case,
+        "size": size,
+        "megapixels": mpx,
+        "repeat": len(times),
+        "wall_s_best": best,
+        "wall_s_median": statistics.median(times),
+        "mpx_s": mpx / best if best else None,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _rss_mb(),
+    }, **extra)
+
+def run_suite(sizes, cases=CASES, repeat: int = 3, isolate: bool = True, workdir: Path = None) -> dict:
+    """
+    Run every case at every size. isolate=True runs each case in a fresh spawned
+    process so peak RSS is per case; isolate=False runs in-process (for tests).
+    """
+    own_workdir = workdir is None
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="bench-"))
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        results = _run_sizes(sizes, cases, repeat, isolate, workdir, ctx)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": _meta(), "results": results}
+
+def _run_sizes(sizes, cases, repeat, isolate, workdir, ctx) -> list:
+    results = []
+    for size in sizes:
+        scene = write_scene(workdir / ("scene_%d.tif" % size), size)
+        model = train_model(scene, workdir / ("model_%d.joblib" % size))
+        for case in cases:
+            if isolate:
+                with ctx.Pool(1) as pool:
+                    res = pool.apply(run_case, (case, scene, model, size, repeat))
+            else:
+                res = run_case(case, scene, model, size, repeat)
+            print("%-10s %6d  %8.3fs  %8.2f MP/s  %8.1f MiB" % (
+                case, size, res["wall_s_best"], res["mpx_s"] or 0, res["peak_rss_mb"]), file=sys.stderr)
+            results.append(res)
+    return results
+
+def _meta() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "machine": platform.machine(),
+    }
+
+def compare(current: dict, previous: dict, tolerance: float = 1.25) -> list:
+    """Records whose best wall time exceeds tolerance x the matching previous record."""
+    before = {(r["case"], r["size"]): r for r in previous["results"]}
+    regressions = []
+    for r in current["results"]:
+        old = before.get((r["case"], r["size"]))
+        if old and r["wall_s_best"] > tolerance * old["wall_s_best"]:
+            regressions.append({"case": r["case"], "size": r["size"], "previous_s": old["wall_s_best"],
+                                "current_s": r["wall_s_best"], "ratio": r["wall_s_best"] / old["wall_s_best"]})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="256,1024,2048", help="Comma-separated scene side lengths")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated subset of %s" % ", ".join(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="bench.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown ratio vs --compare")
+    args = parser.parse_args()
+    report = run_suite([int(s) for s in args.sizes.split(",")], args.cases.split(","), args.repeat)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote %s" % args.out, file=sys.stderr)
+    if report.get("regressions"):
+        for r in report["regressions"]:
+            print("REGRESSION %(case)s @ %(size)d: %(previous_s).3fs -> %(current_s).3fs (x%(ratio).2f)" % r,
+                  file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Check that the float32 / uint16-native inference path classifies a scene the
+same way as the original float64 feature path, or quantify where it doesn't.
+
+Usage: python -m benchmarks.validate_precision [--scene demo/sample_sentinel.tif]
+                                               [--model backend/ml/model.joblib]
+                                               [--window-size 1024]
+
+Reference: bands cast to float64 and features built with the per-index
+functions (bench_features.legacy_features), predicted on the whole scene.
+Candidate: infer.classify_windows, i.e. uint16 band reads into reused buffers
+and the fused float32 feature_stack, window by window. Cloud masking is off for
+both so only numeric precision differs. Prints a JSON report: per-feature max
+absolute difference, label disagreements (count, fraction, reference ->
+candidate pairs) and the largest probability difference in 1/255 steps.
+"""
+from collections import Counter
+import argparse
+import json
+import numpy as np
+from backend.app.config import MODEL_PATH, INFERENCE_WINDOW_SIZE
+from backend.app.infer import classify_windows, read_imagery
+from backend.app.ml.raster_io import iter_windows
+from backend.app.ml.features import FEATURE_NAMES, feature_stack
+from backend.app.ml.model import load_model
+from .bench_features import legacy_features
+
+def compare(scene: str, model_path: str = MODEL_PATH, window_size: int = INFERENCE_WINDOW_SIZE) -> dict:
+    model = load_model(model_path)
+    arr, meta = read_imagery(scene)
+    h, w = meta["height"], meta["width"]
+    X64 = legacy_features(arr)
+    X32 = feature_stack(arr)
+    feature_diff = np.abs(X64 - X32.astype(np.float64)).max(axis=0)
+    proba = model.predict_proba(X64)
+    ref_cls = model.classes_.take(np.argmax(proba, axis=1)).reshape(h, w).astype(np.uint8)
+    ref_proba = np.rint(proba.T * 255).astype(np.uint8).reshape(-1, h, w)
+    cls = np.empty((h, w), dtype=np.uint8)
+    cand_proba = np.empty_like(ref_proba)
+    windows = list(iter_windows(h, w, window_size))
+    for window, class_block, proba_block, _ in classify_windows(scene, model_path, windows, model=model,
+                                                             mask_clouds=False):
+        rows, cols = window.toslices()
+        cls[rows, cols] = class_block
+        cand_proba[:, rows, cols] = proba_block
+    differ = ref_cls != cls
+    pairs = Counter(zip(ref_cls[differ].tolist(), cls[differ].tolist()))
+    return {
+        "scene": str(scene),
+        "pixels": int(h * w),
+        "feature_max_abs_diff": {name: float(d) for name, d in zip(FEATURE_NAMES, feature_diff)},
+        "label_disagreements": int(differ.sum()),
+        "label_disagreement_fraction": float(differ.mean()),
+        "disagreement_pairs": {"%d->%d" % k: v for k, v in sorted(pairs.items())},
+        "max_proba_diff_255": int(np.abs(ref_proba.astype(np.int16) - cand_proba).max()),
+        "bytes_per_pixel": {"float64": X64.itemsize * X64.shape[1], "float32": X32.itemsize * X32.shape[1],
+                            "bands": arr.itemsize * arr.shape[0]},
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scene", default="demo/sample_sentinel.tif")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--window-size", type=int, default=INFERENCE_WINDOW_SIZE)
+    args = parser.parse_args()
+    print(json.dumps(compare(args.scene, args.model, args.window_size), indent=2))
+
+if __name__ == "__main__":
+    main()
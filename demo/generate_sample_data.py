@@ -53,10 +53,9 @@ def make_synthetic(width=256, height=256):
     ]
     return bands
 
-def main():
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    width = 256
-    height = 256
+def main(out=OUT, width=256, height=256):
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
     transform = from_origin(137.3, -14.2, 0.0009, 0.0009)  # arbitrary small resolution
     meta = {
         "driver": "GTiff",
@@ -68,10 +67,10 @@ def main():
         "transform": transform
     }
     bands = make_synthetic(width, height)
-    with rasterio.open(str(OUT), "w", **meta) as dst:
+    with rasterio.open(str(out), "w", **meta) as dst:
         for i, b in enumerate(bands, start=1):
             dst.write(b.astype('uint16') if i < 7 else b.astype('uint8'), i)
-    print("Wrote demo sample to", OUT)
+    print("Wrote demo sample to", out)
 
 if __name__ == "__main__":
     main()
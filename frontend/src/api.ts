@@ -7,11 +7,23 @@ export async function listRuns() {
   return res.data.runs;
 }
 
-export async function triggerRun() {
-  const res = await axios.post(`${BACKEND}/run`);
+export async function getJob(jobId: string) {
+  const res = await axios.get(`${BACKEND}/jobs/${jobId}`);
   return res.data;
 }
 
+export async function triggerRun(pollMs: number = 1000) {
+  // Queue a background run and poll until it finishes
+  const res = await axios.post(`${BACKEND}/runs`);
+  let job = await getJob(res.data.job_id);
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise(r => setTimeout(r, pollMs));
+    job = await getJob(job.id);
+  }
+  if (job.status === "failed") throw new Error(job.error);
+  return job.result;
+}
+
 export function tileURL(z: number, x:number, y:number, run?: string) {
   let url = `${BACKEND}/tile/${z}/${x}/${y}.png`;
   if (run) url += `?run=${run}`;
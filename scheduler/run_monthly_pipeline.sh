@@ -1,9 +1,17 @@
 #!/bin/sh
 # A simple script to run the demo monthly pipeline once (or ran by Docker).
+# With a batch manifest (BATCH_MANIFEST, default /app/manifest.json) every listed
+# property is processed over one shared model/worker pool; otherwise the demo run.
 set -e
 echo "Scheduler container starting demo pipeline..."
-python /app/app/infer.py --demo-run
+MANIFEST="${BATCH_MANIFEST:-/app/manifest.json}"
+# the images copy backend/app to /app/app, so there the package is "app"
+if [ -f app/batch.py ]; then PACKAGE=app; else PACKAGE=backend.app; fi
+if [ -f "$MANIFEST" ]; then
+    python -m "$PACKAGE.batch" "$MANIFEST"
+else
+    python /app/app/infer.py --demo-run
+fi
 echo "Demo pipeline finished."
 # Keep container alive for debugging (optional)
 sleep 5
-
@@ -0,0 +1,22 @@
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from demo.generate_sample_data import main as gen_main
+from backend.app.ml.train_demo import load_sample_features
+from backend.app.ml.model import save_model
+
+@pytest.fixture(scope="session")
+def demo_scene(tmp_path_factory):
+    """Synthetic 256x256 demo scene written to a session temp folder."""
+    path = tmp_path_factory.mktemp("scene") / "sample_sentinel.tif"
+    gen_main(out=path)
+    return path
+
+@pytest.fixture(scope="session")
+def demo_model(demo_scene, tmp_path_factory):
+    """Small RandomForest fitted on the demo scene labels."""
+    X, y = load_sample_features(str(demo_scene))
+    clf = RandomForestClassifier(n_estimators=10, random_state=42)
+    clf.fit(X, y)
+    path = tmp_path_factory.mktemp("model") / "model.joblib"
+    save_model(clf, str(path))
+    return path
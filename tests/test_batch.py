@@ -0,0 +1,79 @@
+import json
+import shutil
+import numpy as np
+import rasterio
+from backend.app import batch, storage, timeseries
+from backend.app.batch import load_manifest, run_batch
+
+def _manifest(tmp_path, demo_scene):
+    scenes = tmp_path / "scenes"
+    scenes.mkdir()
+    for name in ("a", "b"):
+        shutil.copy(demo_scene, scenes / ("%s.tif" % name))
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"properties": [{"id": "alpha", "scene": "scenes/a.tif"},
+                                                   {"id": "beta", "scene": "scenes/b.tif"}]}))
+    return manifest
+
+def test_batch_runs_then_skips_unchanged(demo_scene, demo_model, tmp_path, monkeypatch):
+    store = tmp_path / "store"
+    store.mkdir()
+    monkeypatch.setattr(storage, "STORAGE_DIR", store)
+    monkeypatch.setattr(batch, "STORAGE_DIR", store)
+    manifest = _manifest(tmp_path, demo_scene)
+    assert load_manifest(manifest)[0]["scene"] == str(tmp_path / "scenes" / "a.tif")
+    kw = dict(model_path=str(demo_model), workers=2, concurrency=2, seed_zooms=[], window_size=128)
+
+    first = run_batch(manifest, **kw)
+    assert first["counts"] == {"ran": 2, "skipped": 0, "failed": 0}
+    runs = {r["property"]: r["run"] for r in first["properties"]}
+    assert storage.latest_run("alpha") == runs["alpha"]
+    with rasterio.open(str(store / runs["beta"] / "classification.tif")) as src:
+        assert np.isin(src.read(1), [0, 1, 2, 3]).all()
+    assert len(list((store / "batches").glob("*.json"))) == 1
+    # same scene grid, different properties: one time-series cube each, under the run's storage root
+    cubes = [timeseries.cube_dir(store / runs[p]) for p in ("alpha", "beta")]
+    assert cubes[0] != cubes[1] and all(c.parent == store / "timeseries" for c in cubes)
+    assert [[s["run"] for s in timeseries.read_steps(c)] for c in cubes] == [[runs["alpha"]], [runs["beta"]]]
+
+    assert run_batch(manifest, **kw)["counts"] == {"ran": 0, "skipped": 2, "failed": 0}
+
+    # a changed scene reruns only its own property
+    with rasterio.open(str(tmp_path / "scenes" / "b.tif"), "r+") as dst:
+        dst.write(dst.read(1) // 2, 1)
+    third = run_batch(manifest, **dict(kw, workers=1))
+    assert {r["property"]: r["status"] for r in third["properties"]} == {"alpha": "skipped", "beta": "ran"}
+    assert run_batch(manifest, force=True, **kw)["counts"]["ran"] == 2
+
+def test_batch_reports_failures(demo_model, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(batch, "STORAGE_DIR", tmp_path)
+    report = run_batch([{"id": "ghost", "scene": str(tmp_path / "missing.tif")}],
+                       model_path=str(demo_model), workers=1)
+    assert report["counts"]["failed"] == 1 and "FileNotFoundError" in report["properties"][0]["error"]
+
+def test_failed_property_never_becomes_latest(demo_model, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(batch, "STORAGE_DIR", tmp_path)
+    scene = tmp_path / "corrupt.tif"
+    scene.write_bytes(b"not a geotiff")  # hashes fine, fails once inference opens it
+    report = run_batch([{"id": "broken", "scene": str(scene)}], model_path=str(demo_model), workers=1)
+    assert report["counts"]["failed"] == 1
+    assert storage.query_runs("broken") == ([], 0) and storage.latest_run("broken") is None
+    # the failed run stays catalogued as running, out of /runs and latest_run
+    [folder] = tmp_path.glob("*_broken")
+    assert storage.get_run(folder.name)["status"] == storage.RUNNING
+
+def test_single_worker_batch_never_starts_pools(demo_scene, demo_model, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path / "store")
+    monkeypatch.setattr(batch, "STORAGE_DIR", tmp_path / "store")
+    seen = []
+    real = batch.run_inference
+
+    def spy(*args, **kw):
+        seen.append((kw["workers"], kw["pool"]))
+        return real(*args, **kw)
+    # even with INFERENCE_WORKERS set, --workers 1 must keep every property in-process
+    monkeypatch.setattr(batch, "run_inference", spy)
+    report = run_batch(_manifest(tmp_path, demo_scene), model_path=str(demo_model), workers=1, seed_zooms=[])
+    assert report["counts"]["ran"] == 2 and seen == [(1, None), (1, None)]
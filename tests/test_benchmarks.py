@@ -0,0 +1,28 @@
+from backend.app import config, serving, storage
+from benchmarks.run import compare, run_suite
+
+def test_suite_emits_records_per_case_and_size(tmp_path, monkeypatch):
+    store = tmp_path / "store"
+    for mod in (config, storage, serving):
+        monkeypatch.setattr(mod, "STORAGE_DIR", store)
+    report = run_suite([64], cases=("indices", "features", "tiles"), repeat=2, isolate=False,
+                       workdir=tmp_path / "work")
+    # the tile load test runs against its own throwaway storage: nothing catalogued or stored here
+    assert not store.exists() and storage.STORAGE_DIR == serving.STORAGE_DIR == store
+    assert report["meta"]["python"]
+    records = {r["case"]: r for r in report["results"]}
+    assert set(records) == {"indices", "features", "tiles"}
+    for r in records.values():
+        assert r["size"] == 64 and r["wall_s_best"] > 0 and r["peak_rss_mb"] >= r["baseline_rss_mb"]
+    assert records["features"]["repeat"] == 2
+    tiles = records["tiles"]
+    assert tiles["tiles"] > 0 and tiles["cache_hits"] == tiles["tiles"]
+    assert tiles["warm"]["requests_per_s"] > 0
+
+def test_compare_flags_slowdowns():
+    prev = {"results": [{"case": "predict", "size": 256, "wall_s_best": 1.0},
+                        {"case": "features", "size": 256, "wall_s_best": 1.0}]}
+    cur = {"results": [{"case": "predict", "size": 256, "wall_s_best": 1.5},
+                       {"case": "features", "size": 256, "wall_s_best": 1.1},
+                       {"case": "tiles", "size": 256, "wall_s_best": 9.0}]}
+    assert [(r["case"], round(r["ratio"], 2)) for r in compare(cur, prev, tolerance=1.25)] == [("predict", 1.5)]
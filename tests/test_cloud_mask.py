@@ -0,0 +1,85 @@
+import numpy as np
+import rasterio
+from backend.app.infer import predict_block, read_block, run_inference
+from backend.app.config import CLOUD_BLUE_THRESHOLD
+from backend.app.ml.features import CLOUD_CLASS, invalid_mask, simple_cloud_mask
+from backend.app.ml.model import load_model
+
+def _cloudy_scene(demo_scene, path):
+    """Demo bands with a bright cloud patch, a nodata (0) patch and an SCL band flagging a shadow patch."""
+    with rasterio.open(demo_scene) as src:
+        bands = src.read(indexes=list(range(1, 7)))
+        profile = src.profile
+    bands[0, 20:60, 100:180] = 6000
+    bands[:, 200:220, :] = 0
+    scl = np.full(bands.shape[1:], 4, dtype=np.uint16)  # vegetation
+    scl[100:120, 30:90] = 3  # cloud shadow
+    profile.update(count=7, nodata=0)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(bands, indexes=list(range(1, 7)))
+        dst.write(scl, 7)
+        dst.set_band_description(7, "SCL")
+    expected = np.zeros(scl.shape, dtype=bool)
+    expected[20:60, 100:180] = expected[200:220, :] = expected[100:120, 30:90] = True
+    return expected
+
+def test_invalid_mask_sources():
+    bands = np.full((6, 2, 3), 1000, dtype=np.uint16)
+    bands[0, 0, 0] = 5000   # bright blue
+    bands[4, 1, 1] = 0      # nodata in one band
+    scl = np.array([[4, 4, 9], [4, 4, 5]])
+    mask = invalid_mask(bands, nodata=0, scl=scl, threshold=0.4)
+    assert mask.tolist() == [[True, False, True], [False, True, False]]
+    assert not invalid_mask(bands[:, 1:], threshold=0.4).any()
+    # defaults follow the shared CLOUD_BLUE_THRESHOLD (0.4), not the old 0.2
+    blue = np.array([1000, 3000, 5000], dtype=np.uint16)
+    assert simple_cloud_mask(blue).tolist() == (blue / 10000 > CLOUD_BLUE_THRESHOLD).tolist() == [False, False, True]
+
+def test_masked_pixels_skip_the_forest(demo_scene, demo_model, tmp_path):
+    path = tmp_path / "cloudy.tif"
+    expected = _cloudy_scene(demo_scene, path)
+    model = load_model(str(demo_model))
+    rows = []
+
+    class Counting:
+        classes_ = model.classes_
+
+        def predict_proba(self, X):
+            rows.append(len(X))
+            return model.predict_proba(X)
+
+    with rasterio.open(path) as src:
+        window = rasterio.windows.Window(0, 0, src.width, src.height)
+        arr, mask = read_block(src, window, mask_clouds=True)
+        plain, _ = read_block(src, window, mask_clouds=False)
+    np.testing.assert_array_equal(mask, expected)
+    cls, proba, _ = predict_block(Counting(), arr, mask)
+    assert rows == [int((~expected).sum())]
+    full_cls, full_proba, _ = predict_block(model, plain)
+    assert (cls[expected] == CLOUD_CLASS).all()
+    np.testing.assert_array_equal(cls[~expected], full_cls[~expected])
+    np.testing.assert_array_equal(proba[:, ~expected], full_proba[:, ~expected])
+    cloud_band = list(model.classes_).index(CLOUD_CLASS)
+    assert (proba[cloud_band][expected] == 255).all()
+    assert proba[:, expected].sum() == 255 * expected.sum()
+
+def test_demo_scene_output_unchanged(demo_scene, demo_model, tmp_path):
+    kw = dict(model_path=str(demo_model), window_size=64, seed_zooms=[], paddocks=None)
+    masked = run_inference(str(demo_scene), out_folder=str(tmp_path / "masked"), mask_clouds=True, **kw)
+    plain = run_inference(str(demo_scene), out_folder=str(tmp_path / "plain"), mask_clouds=False, **kw)
+    for key in ("classification_tif", "probabilities_tif"):
+        with rasterio.open(masked[key]) as a, rasterio.open(plain[key]) as b:
+            np.testing.assert_array_equal(a.read(), b.read())
+
+def test_cloudy_run_matches_unmasked_on_clear_pixels(demo_scene, demo_model, tmp_path):
+    path = tmp_path / "cloudy.tif"
+    expected = _cloudy_scene(demo_scene, path)
+    kw = dict(model_path=str(demo_model), window_size=64, seed_zooms=[], paddocks=None)
+    masked = run_inference(str(path), out_folder=str(tmp_path / "masked"), mask_clouds=True, **kw)
+    plain = run_inference(str(path), out_folder=str(tmp_path / "plain"), mask_clouds=False, **kw)
+    with rasterio.open(masked["classification_tif"]) as a, rasterio.open(plain["classification_tif"]) as b:
+        m, p = a.read(1), b.read(1)
+    assert (m[expected] == CLOUD_CLASS).all()
+    np.testing.assert_array_equal(m[~expected], p[~expected])
+    cloud = next(c for c in masked["summary"]["classes"] if c["class"] == CLOUD_CLASS)
+    assert cloud["pixels"] >= expected.sum()
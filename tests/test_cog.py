@@ -0,0 +1,31 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from backend.app.infer import run_inference
+from backend.app.storage import write_cog
+
+def test_cog_outputs_match_plain(demo_scene, demo_model, tmp_path):
+    plain = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "plain"),
+                          seed_zooms=[], cog=False)
+    cog = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "cog"),
+                        seed_zooms=[], cog=True)
+    for key in ("classification_tif", "probabilities_tif", "imagery_tif"):
+        with rasterio.open(plain[key]) as a, rasterio.open(cog[key]) as b:
+            assert np.array_equal(a.read(), b.read())
+            assert b.profile["tiled"]
+            assert b.compression is not None
+            assert b.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
+    with rasterio.open(cog["probabilities_tif"]) as src:
+        assert src.descriptions[0] == "class_0"
+    assert not list((tmp_path / "cog").glob("*.partial.tif"))
+
+def test_write_cog_builds_overviews(tmp_path):
+    src_path = tmp_path / "big.tif"
+    arr = (np.arange(2048 * 2048) % 4).astype("uint8").reshape(2048, 2048)
+    with rasterio.open(src_path, "w", driver="GTiff", width=2048, height=2048, count=1, dtype="uint8",
+                       crs="EPSG:4326", transform=from_origin(137.3, -14.2, 0.0001, 0.0001)) as dst:
+        dst.write(arr, 1)
+    write_cog(src_path, tmp_path / "big_cog.tif", resampling="nearest")
+    with rasterio.open(tmp_path / "big_cog.tif") as src:
+        assert src.overviews(1)
+        assert set(np.unique(src.read(1, out_shape=(256, 256)))) <= {0, 1, 2, 3}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.windows import Window
+from backend.app.infer import run_inference
+from backend.app.ml.raster_io import iter_windows, read_context
+from backend.app.ml.features import FEATURE_SETS, context_features, get_feature_set
+from backend.app.ml.model import load_model, model_feature_set
+from backend.app.ml.train_demo import load_sample_features, train_and_save
+
+def _brute_force(bands, valid, r):
+    blue, red, nir, swir1 = (bands[i].astype(np.float64) for i in (0, 2, 3, 4))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = np.where(nir + red != 0, (nir - red) / (nir + red), 0)
+        bsi_den = swir1 + red + nir + blue
+        bsi = np.where(bsi_den != 0, (swir1 + red - nir - blue) / bsi_den, 0)
+    h, w = valid.shape
+    out = np.zeros((h, w, 4))
+    for i in range(h):
+        for j in range(w):
+            sel = valid[max(0, i - r):i + r + 1, max(0, j - r):j + r + 1]
+            for k, index in enumerate((ndvi, bsi)):
+                vals = index[max(0, i - r):i + r + 1, max(0, j - r):j + r + 1][sel]
+                if len(vals):
+                    out[i, j, 2 * k], out[i, j, 2 * k + 1] = vals.mean(), vals.std()
+    return out.reshape(-1, 4)
+
+def test_context_features_match_brute_force():
+    rng = np.random.default_rng(0)
+    bands = rng.integers(0, 4000, size=(5, 12, 15)).astype(np.uint16)
+    valid = rng.random((12, 15)) > 0.2
+    # the caller's halo is invalid padding around the scene
+    halo = 3
+    padded = np.pad(bands, ((0, 0), (halo, halo), (halo, halo)))
+    padded_valid = np.pad(valid, halo)
+    got = context_features(padded, padded_valid, (1, 3), halo)
+    assert got.shape == (12 * 15, 8) and got.dtype == np.float32
+    np.testing.assert_allclose(got[:, :4], _brute_force(bands, valid, 1), atol=1e-5)
+    np.testing.assert_allclose(got[:, 4:], _brute_force(bands, valid, 3), atol=1e-5)
+
+def test_windowed_context_matches_whole_scene(demo_scene):
+    fs = FEATURE_SETS["context"]
+    with rasterio.open(str(demo_scene)) as src:
+        whole = read_context(src, Window(0, 0, src.width, src.height), fs).reshape(src.height, src.width, -1)
+        for window in iter_windows(src.height, src.width, 60):
+            block = read_context(src, window, fs)
+            expected = whole[window.row_off:window.row_off + window.height,
+                             window.col_off:window.col_off + window.width].reshape(-1, block.shape[1])
+            np.testing.assert_allclose(block, expected, atol=1e-5)
+        assert read_context(src, Window(0, 0, 10, 10), FEATURE_SETS["base"]) is None
+
+def test_get_feature_set_rejects_stale_spec():
+    assert get_feature_set(None) is FEATURE_SETS["base"]
+    assert get_feature_set(FEATURE_SETS["context"].as_dict()) is FEATURE_SETS["context"]
+    with pytest.raises(ValueError):
+        get_feature_set(dict(FEATURE_SETS["context"].as_dict(), version=0))
+    with pytest.raises(ValueError):
+        get_feature_set("nope")
+
+@pytest.fixture(scope="module")
+def context_model(demo_scene, tmp_path_factory):
+    folder = tmp_path_factory.mktemp("context_model")
+    report = train_and_save([demo_scene], per_class=2000, model_out=folder / "model.joblib",
+                            cache_dir=folder / "cache", evaluate=False, feature_set="context")
+    assert report["feature_set"] == "context"
+    return folder / "model.joblib"
+
+def test_trained_model_carries_feature_set(context_model, demo_scene):
+    model = load_model(str(context_model))
+    assert model_feature_set(model) is FEATURE_SETS["context"]
+    X, _ = load_sample_features(str(demo_scene), feature_set="context")
+    assert X.shape[1] == model.n_features_in_ == FEATURE_SETS["context"].n_features
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_context_inference_windowed_matches_whole_scene(context_model, demo_scene, tmp_path, workers):
+    whole = run_inference(str(demo_scene), model_path=str(context_model),
+                          out_folder=str(tmp_path / "whole"), window_size=0)
+    windowed = run_inference(str(demo_scene), model_path=str(context_model), out_folder=str(tmp_path / "windowed"),
+                             window_size=100, workers=workers)
+    for key in ("classification_tif", "probabilities_tif"):
+        with rasterio.open(whole[key]) as a, rasterio.open(windowed[key]) as b:
+            assert np.array_equal(a.read(), b.read())
@@ -7,11 +7,14 @@ from backend.app.storage import list_runs
 
 def test_demo_end_to_end(tmp_path):
     # generate sample data
-    gen_main()
-    # train
-    train_and_save()
+    scene = tmp_path / "sample_sentinel.tif"
+    gen_main(out=scene)
+    # train, keeping the model and the sample cache out of the repo's storage
+    model = tmp_path / "model.joblib"
+    train_and_save([scene], model_out=model, cache_dir=tmp_path / "training_cache")
+    assert list((tmp_path / "training_cache").glob("*.npz"))
     # run inference to a temp folder
-    out = run_inference("demo/sample_sentinel.tif", out_folder=str(tmp_path/"out"))
+    out = run_inference(str(scene), model_path=str(model), out_folder=str(tmp_path/"out"))
     assert os.path.exists(out["classification_tif"])
     assert os.path.exists(out["imagery_tif"])
     assert "summary" in out
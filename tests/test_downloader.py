@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+import rasterio
+from rasterio.warp import transform_bounds
+from rasterio.windows import from_bounds
+from backend.app.data.downloader import Downloader, SceneCache, download_sentinel_for_geometry
+
+def box(left, bottom, right, top, inset=1e-9):
+    left, bottom, right, top = left + inset, bottom + inset, right - inset, top - inset
+    return {"type": "Polygon", "coordinates": [[(left, bottom), (right, bottom), (right, top), (left, top),
+                                                 (left, bottom)]]}
+
+class StandIn(BaseHTTPRequestHandler):
+    """Static files with HEAD, ETag and single byte-range support; counts bytes served."""
+    files, served, requests, fail_after = {}, [0], [0], [None]
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        if body:
+            self.requests[0] += 1
+            if self.fail_after[0] is not None and self.requests[0] > self.fail_after[0]:
+                self.send_error(500)
+                return
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2) or len(data) - 1), len(data) - 1)
+            chunk = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, len(data)))
+        else:
+            chunk = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(chunk)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"%x"' % hash(data))
+        self.end_headers()
+        if body:
+            self.wfile.write(chunk)
+            self.served[0] += len(chunk)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    StandIn.files.clear()
+    StandIn.served[0] = StandIn.requests[0] = 0
+    StandIn.fail_after[0] = None
+    # unique prefix per test: GDAL caches /vsicurl/ reads per URL for the whole process
+    yield "http://127.0.0.1:%d/%d" % (httpd.server_address[1], time.monotonic_ns())
+    httpd.shutdown()
+
+def _publish(base, name, data):
+    StandIn.files[base[base.index("/", 7):] + "/" + name] = data
+    return base + "/" + name
+
+def test_ranged_download_resumes_and_caches(demo_scene, server, tmp_path):
+    data = demo_scene.read_bytes()
+    url = _publish(server, "scene.tif", data)
+    d = Downloader(SceneCache(tmp_path / "cache"), workers=4, chunk_size=64 * 1024)
+    StandIn.fail_after[0] = 3
+    with pytest.raises(Exception):
+        d.fetch(url, tmp_path / "scene.tif")
+    assert (tmp_path / "scene.tif.partial").exists()
+    StandIn.fail_after[0], before = None, StandIn.requests[0]
+    d.fetch(url, tmp_path / "scene.tif")
+    parts = -(-len(data) // (64 * 1024))
+    assert StandIn.requests[0] - before < parts  # finished parts were not fetched again
+    assert (tmp_path / "scene.tif").read_bytes() == data
+    cached = d.fetch_asset(url)
+    assert cached.read_bytes() == data and d.fetch_asset(url) == cached
+    stats = d.stats()
+    assert stats["cache_hits"] == 1 and stats["hit_rate"] == 0.5 and stats["throughput_mb_s"] > 0
+
+def test_clipped_scene_reads_only_the_window(demo_scene, server, tmp_path):
+    data = demo_scene.read_bytes()
+    url = _publish(server, "scene.tif", data)
+    with rasterio.open(str(demo_scene)) as src:
+        left, bottom, right, top = src.bounds
+        quarter = (left, top - (top - bottom) / 4, left + (right - left) / 4, top)
+        expected = src.read(window=from_bounds(*quarter, src.transform).round_offsets().round_lengths())
+        geometry = box(*transform_bounds(src.crs, "EPSG:4326", *quarter))
+    d = Downloader(SceneCache(tmp_path / "cache"))
+    scene = d.scene(url, geometry)
+    with rasterio.open(str(scene)) as out:
+        arr = out.read()
+    assert arr.shape[0] == expected.shape[0] and abs(arr.shape[1] - expected.shape[1]) <= 1
+    h, w = min(arr.shape[1], expected.shape[1]), min(arr.shape[2], expected.shape[2])
+    np.testing.assert_array_equal(arr[:, :h, :w], expected[:, :h, :w])
+    assert StandIn.served[0] < 0.5 * len(data)
+    served = StandIn.served[0]
+    assert d.scene(url, geometry) == scene and StandIn.served[0] == served
+    assert d.stats()["hit_rate"] == 0.5
+
+def test_band_assets_fetched_and_stacked(demo_scene, server, tmp_path):
+    with rasterio.open(str(demo_scene)) as src:
+        profile = dict(src.profile, count=1)
+        bands = {}
+        for i, name in enumerate(("B02", "B03", "B04", "B08", "B11"), start=1):
+            path = tmp_path / ("%s.tif" % name)
+            with rasterio.open(str(path), "w", **profile) as dst:
+                dst.write(src.read(i), 1)
+            bands[name] = _publish(server, path.name, path.read_bytes())
+        full = src.read(list(range(1, 6)))
+        geometry = box(*transform_bounds(src.crs, "EPSG:4326", *src.bounds))
+    out = download_sentinel_for_geometry(geometry, tmp_path / "run", assets=bands,
+                                         downloader=Downloader(SceneCache(tmp_path / "cache"), workers=5))
+    with rasterio.open(out) as scene:
+        assert scene.descriptions == tuple(bands)
+        np.testing.assert_array_equal(scene.read(), full)
+    assert download_sentinel_for_geometry(geometry, tmp_path / "run") is None
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = SceneCache(tmp_path, max_bytes=2500)
+    for key in ("aa1", "bb2", "cc3"):
+        tmp = tmp_path / "new"
+        tmp.write_bytes(b"x" * 1000)
+        if key == "cc3":
+            assert cache.get("aa1") is not None  # touch: bb2 is now the oldest
+        cache.put(key, tmp)
+        time.sleep(0.01)
+    assert cache.get("bb2") is None and cache.get("aa1") and cache.get("cc3")
+    assert cache.size() == 2000
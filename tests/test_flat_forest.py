@@ -0,0 +1,44 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from backend.app.ml import model as model_mod
+from backend.app.ml.model import FlatForest, flat_model_dir, load_flat_model, load_model, save_model
+from backend.app.ml.train_demo import load_sample_features
+
+def test_flat_forest_matches_sklearn(demo_scene):
+    X, y = load_sample_features(str(demo_scene))
+    # deep, unpruned trees with a class missing from some bootstrap samples
+    clf = RandomForestClassifier(n_estimators=7, max_features=3, random_state=0).fit(X[::3], y[::3])
+    flat = FlatForest.from_estimator(clf)
+    np.testing.assert_allclose(flat.predict_proba(X), clf.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(flat.predict(X), clf.predict(X))
+
+def test_flat_model_cached_beside_joblib(demo_model, tmp_path, monkeypatch):
+    path = tmp_path / "model.joblib"
+    path.write_bytes(demo_model.read_bytes())
+    model_mod.clear_model_cache()
+    flat = load_flat_model(str(path))
+    folder = flat_model_dir(str(path))
+    assert folder.parent == tmp_path / "model.joblib.flat" and (folder / "meta.json").exists()
+    assert load_flat_model(str(path)) is flat
+    # a fresh process reuses the files instead of converting again
+    model_mod.clear_model_cache()
+    monkeypatch.setattr(FlatForest, "from_estimator", classmethod(lambda cls, est: 1 / 0))
+    again = load_flat_model(str(path))
+    assert isinstance(again.threshold, np.memmap)
+    np.testing.assert_array_equal(again.left, flat.left)
+    monkeypatch.undo()
+    # retraining replaces the cached conversion
+    clf = load_model(str(path))
+    clf.estimators_ = clf.estimators_[:3]
+    save_model(clf, str(path))
+    model_mod.clear_model_cache()
+    assert len(load_flat_model(str(path)).roots) == 3
+    assert [p.name for p in folder.parent.iterdir()] == [flat_model_dir(str(path)).name]
+
+def test_flat_forest_chunks_match_sklearn(demo_scene, demo_model, monkeypatch):
+    # batches of a few rows x all trees, so the per-level walk crosses chunk boundaries
+    monkeypatch.setattr(model_mod, "FLAT_CHUNK", 1000)
+    X, _ = load_sample_features(str(demo_scene))
+    clf = load_model(str(demo_model))
+    np.testing.assert_allclose(FlatForest.from_estimator(clf).predict_proba(X[:5000]),
+                               clf.predict_proba(X[:5000]), rtol=0, atol=1e-12)
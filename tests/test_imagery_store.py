@@ -0,0 +1,70 @@
+import os
+import rasterio
+import rasterio.warp
+from fastapi.testclient import TestClient
+from backend.app import serving, storage, timeseries
+from backend.app.infer import run_inference
+from backend.app.query import query_point
+
+def _store(tmp_path, monkeypatch):
+    for mod in (storage, serving):
+        monkeypatch.setattr(mod, "STORAGE_DIR", tmp_path)
+    return tmp_path
+
+def _run(scene, model, **kw):
+    folder = storage.new_run_folder(property_id=kw.pop("property_id"))
+    run_inference(str(scene), model_path=str(model), out_folder=str(folder), seed_zooms=[], paddocks=None, **kw)
+    return folder
+
+def test_runs_share_one_stored_scene(demo_scene, demo_model, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    a = _run(demo_scene, demo_model, property_id="a")
+    b = _run(demo_scene, demo_model, property_id="b")
+    stored = list((store / storage.IMAGERY_DIR).glob("*/*.tif"))
+    assert len(stored) == 1 and stored[0].name == storage.file_sha256(demo_scene) + ".cog.tif"
+    for folder in (a, b):
+        assert os.path.samefile(folder / "imagery.tif", stored[0])
+        assert storage.get_run(folder.name)["imagery"]["link"] == "hardlink"
+    with rasterio.open(str(demo_scene)) as src:
+        lon, lat = rasterio.warp.transform(src.crs, "EPSG:4326", *[[v] for v in src.xy(0, 0)])
+        expected = src.read(window=((0, 1), (0, 1)))[:, 0, 0]
+    point = query_point(b, lon[0], lat[0])
+    assert [point["bands"][n] for n in ("B02", "B03", "B04")] == expected[:3].tolist()
+    # references survive while any run points at the scene
+    assert storage.prune_imagery() == 0
+    for folder in (a, b):
+        for p in folder.iterdir():
+            p.unlink()
+        folder.rmdir()
+    assert storage.prune_imagery() > 0 and not stored[0].exists()
+
+def test_symlink_and_manifest_fallbacks(demo_scene, demo_model, tmp_path, monkeypatch):
+    _store(tmp_path, monkeypatch)
+    def no_link(*args):
+        raise OSError("cross-device link")
+    monkeypatch.setattr(os, "link", no_link)
+    linked = _run(demo_scene, demo_model, property_id="sym", timeseries=False)
+    assert (linked / "imagery.tif").is_symlink()
+    monkeypatch.setattr(os, "symlink", no_link)
+    bare = _run(demo_scene, demo_model, property_id="bare", timeseries=False)
+    assert not (bare / "imagery.tif").exists() and storage.get_run(bare.name)["imagery"]["link"] == "manifest"
+    assert storage.resolve_imagery(bare) == storage.resolve_imagery(linked).resolve()
+    client = TestClient(serving.app)
+    r = client.get("/imagery/%s" % bare.name)
+    assert r.status_code == 200 and r.content == storage.resolve_imagery(bare).read_bytes()
+    assert client.get("/imagery/%s" % bare.name, params={"preview": True}).status_code == 404
+
+def test_preview_only(demo_scene, demo_model, tmp_path, monkeypatch):
+    _store(tmp_path, monkeypatch)
+    folder = _run(demo_scene, demo_model, property_id="p", imagery_mode="preview")
+    assert storage.resolve_imagery(folder) is None and not (tmp_path / storage.IMAGERY_DIR).exists()
+    # the time series still gets NDVI from the source scene
+    assert [s["run"] for s in timeseries.read_steps(timeseries.cube_dir(folder))] == [folder.name]
+    with rasterio.open(str(folder / "preview.tif")) as src:
+        assert src.count == 3 and src.dtypes[0] == "uint8"
+        lon, lat = rasterio.warp.transform(src.crs, "EPSG:4326", *[[v] for v in src.xy(0, 0)])
+    assert "bands" not in query_point(folder, lon[0], lat[0])
+    small = storage.write_preview(demo_scene, tmp_path / "small.tif", max_size=100)
+    with rasterio.open(str(small)) as src, rasterio.open(str(demo_scene)) as full:
+        assert src.shape == (100, 100)
+        assert src.bounds == full.bounds
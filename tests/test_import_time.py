@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import pytest
+
+# Cumulative import time allowed for the serving app (measured ~0.7 s, most of it fastapi itself)
+SERVING_BUDGET_S = 1.5
+HEAVY = ("sklearn", "joblib", "backend.app.infer", "backend.app.ml.train_demo", "backend.app.batch")
+
+def _python(code: str, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, check=True)
+
+def _cumulative_us(importtime_log: str, module: str) -> int:
+    for line in importtime_log.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise AssertionError("%s not in -X importtime output" % module)
+
+@pytest.mark.parametrize("module", ["backend.app.serving", "backend.app.api"])
+def test_app_import_skips_pipeline(module):
+    out = _python("import sys, %s; print(' '.join(sorted(sys.modules)))" % module).stdout.split()
+    assert [m for m in HEAVY if m in out] == []
+
+def test_training_does_not_import_pipeline():
+    # ml/ sits below the pipeline: windowed reads come from ml.raster_io, not infer
+    out = _python("import sys, backend.app.ml.sampling; print(' '.join(sorted(sys.modules)))").stdout.split()
+    assert "backend.app.infer" not in out
+
+def test_serving_import_budget():
+    # best of three, so a busy machine doesn't fail the check on one slow start
+    times = [_cumulative_us(_python("import backend.app.serving", "-X", "importtime").stderr,
+                            "backend.app.serving") / 1e6 for _ in range(3)]
+    assert min(times) < SERVING_BUDGET_S, "backend.app.serving import took %.2fs" % min(times)
+
+def test_imports_have_no_side_effects():
+    # no directories created and no logging configured just by importing the pipeline
+    code = ("import logging, pathlib\n"
+            "def refuse(*a, **k): raise AssertionError('mkdir at import time')\n"
+            "pathlib.Path.mkdir = refuse\n"
+            "import backend.app.api, backend.app.infer, backend.app.ml.train_demo, backend.app.batch\n"
+            "assert not logging.getLogger().handlers, 'logging configured at import time'\n")
+    _python(code)
@@ -22,3 +22,22 @@ def test_bsi_bounds():
     out = bsi(b,r,n,s)
     assert out.shape == (1,1)
 
+
+def test_feature_stack_matches_index_functions():
+    import pytest
+    from backend.app.ml.features import feature_stack, N_FEATURES
+    rng = np.random.default_rng(0)
+    bands = rng.integers(0, 10000, size=(6, 20, 30), dtype=np.uint16)
+    bands[:, 0, :5] = 0  # zero denominators
+    out = np.full((600, N_FEATURES), np.nan, dtype=np.float32)
+    X = feature_stack(bands, out=out)
+    assert X is out
+    f = bands.astype(float)
+    blue, green, red, nir, swir1 = f[:5]
+    expected = np.column_stack([f[:6].reshape(6, -1).T,
+                                ndvi(nir, red).reshape(-1),
+                                ndwi(green, nir).reshape(-1),
+                                bsi(blue, red, nir, swir1).reshape(-1)]).astype(np.float32)
+    assert np.array_equal(X, expected)
+    with pytest.raises(ValueError):
+        feature_stack(bands, out=np.empty((600, N_FEATURES)))
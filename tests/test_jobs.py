@@ -0,0 +1,48 @@
+import threading
+import time
+import pytest
+from backend.app.jobs import JobManager, QueueFull, RUNNING, SUCCEEDED, FAILED
+from backend.app.infer import run_inference
+
+def _wait(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.status not in (SUCCEEDED, FAILED):
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def test_job_lifecycle_dedup_and_limits():
+    manager = JobManager(concurrency=1, queue_limit=1)
+    gate = threading.Event()
+
+    def work(job, n):
+        gate.wait(5)
+        for i in range(n):
+            job.report(i + 1, n)
+        return {"n": n}
+
+    first = manager.submit("a", work, {"n": 4})
+    assert manager.submit("a", work, {"n": 4}) is first
+    while first.status != RUNNING:
+        time.sleep(0.01)
+    second = manager.submit("b", work, {"n": 2})
+    with pytest.raises(QueueFull):
+        manager.submit("c", work, {"n": 1})
+    gate.set()
+    _wait(first)
+    _wait(second)
+    assert first.as_dict()["result"] == {"n": 4}
+    assert first.progress == 1.0 and first.timings["total"] > 0
+    # finished jobs no longer dedupe
+    again = manager.submit("a", work, {"n": 1})
+    assert again is not first
+    _wait(again)
+
+    failing = manager.submit("d", lambda job: 1 / 0, {})
+    _wait(failing)
+    assert failing.status == FAILED and "ZeroDivisionError" in failing.error
+
+def test_run_inference_reports_window_progress(demo_scene, demo_model, tmp_path):
+    calls = []
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path),
+                  window_size=128, seed_zooms=[], progress=lambda d, t: calls.append((d, t)))
+    assert calls == [(1, 4), (2, 4), (3, 4), (4, 4)]
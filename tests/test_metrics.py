@@ -0,0 +1,51 @@
+import json
+import pstats
+from fastapi.testclient import TestClient
+from backend.app import api, serving
+from backend.app.infer import run_inference
+from backend.app.metrics import RunMetrics, activate, stage
+
+def test_stage_records_only_inside_a_run():
+    @stage("work")
+    def work():
+        return 1
+
+    work()  # no active run: nothing to record, no error
+    with activate(RunMetrics()) as m:
+        work()
+        with stage("work"):
+            work()
+    assert m.stages["work"]["calls"] == 3
+    assert m.stages["work"]["rss_mb_max"] > 0
+
+def test_run_writes_metrics_and_profile(demo_scene, demo_model, tmp_path):
+    out = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "run"),
+                        window_size=128, seed_zooms=[12], profile=True)
+    with open(tmp_path / "run" / "metrics.json") as f:
+        saved = json.load(f)
+    assert saved == json.loads(json.dumps(out["metrics"]))
+    stages = saved["stages"]
+    for name in ("model_load", "read", "mask", "features", "predict", "write", "zonal", "cog",
+                 "imagery", "summary", "tiles"):
+        assert stages[name]["seconds"] >= 0, name
+    assert stages["predict"]["calls"] == stages["write"]["calls"] == 4
+    assert saved["megapixels"] == 256 * 256 / 1e6 and saved["peak_rss_mb"] > 0
+    assert pstats.Stats(str(tmp_path / "run" / "profile.pstats")).total_calls > 0
+
+def test_pool_worker_stages_are_merged(demo_scene, demo_model, tmp_path):
+    out = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path),
+                        window_size=128, workers=2, seed_zooms=[], paddocks=None)
+    assert out["metrics"]["stages"]["predict"]["calls"] == 4
+    assert out["metrics"]["stages"]["read"]["calls"] == 4
+
+def test_metrics_endpoint(demo_scene, demo_model, tmp_path, monkeypatch):
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "run"), seed_zooms=[])
+    monkeypatch.setattr(serving, "STORAGE_DIR", tmp_path)
+    client = TestClient(api.app)
+    for _ in range(2):
+        assert client.get("/tile/12/3610/2207.png", params={"run": "run"}).status_code == 200
+    body = client.get("/metrics").text
+    assert 'pipeline_stage_seconds_count{stage="predict"}' in body
+    assert 'tile_request_seconds_count{layer="classification",source="memory"}' in body
+    assert 'tile_request_seconds_bucket{layer="classification",source="memory",le="+Inf"}' in body
+    assert "tile_cache_hit_ratio " in body and "pipeline_runs_total " in body
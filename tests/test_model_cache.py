@@ -0,0 +1,22 @@
+import os
+from backend.app.ml.model import load_model, save_model, model_cache_stats, clear_model_cache
+
+def test_load_model_memoized_and_invalidated(demo_model, tmp_path):
+    path = tmp_path / "model.joblib"
+    path.write_bytes(demo_model.read_bytes())
+    clear_model_cache()
+    before = model_cache_stats()
+    a = load_model(str(path))
+    b = load_model(str(path))
+    assert a is b
+    stats = model_cache_stats()
+    assert stats["loads"] == before["loads"] + 1
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["last_load_seconds"] > 0
+    # a retrained model on disk is picked up
+    save_model(a, str(path))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    c = load_model(str(path))
+    assert c is not a
+    assert model_cache_stats()["cached"] == 1
@@ -0,0 +1,23 @@
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from backend.app.ml.raster_io import BlockBuffers, read_bands
+from benchmarks.validate_precision import compare
+
+def test_band_reads_reuse_typed_buffers(demo_scene):
+    buffers = BlockBuffers()
+    with rasterio.open(demo_scene) as src:
+        a = read_bands(src, Window(0, 0, 64, 64), buffers)
+        b = read_bands(src, Window(64, 0, 64, 64), buffers)
+        edge = read_bands(src, Window(192, 0, 64, 10), buffers)
+        np.testing.assert_array_equal(b, src.read(indexes=list(range(1, 7)), window=Window(64, 0, 64, 64)))
+    assert a is b and a.dtype == np.uint16
+    assert edge.shape == (6, 10, 64)
+    assert buffers.features(100) is not None and buffers.features(50).base is buffers.features(100).base
+
+def test_float32_path_matches_float64_reference(demo_scene, demo_model):
+    report = compare(str(demo_scene), str(demo_model), window_size=100)
+    assert report["label_disagreements"] == 0
+    assert report["max_proba_diff_255"] == 0
+    assert max(report["feature_max_abs_diff"].values()) < 1e-6
+    assert report["bytes_per_pixel"]["float32"] * 2 == report["bytes_per_pixel"]["float64"]
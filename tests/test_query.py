@@ -0,0 +1,37 @@
+import numpy as np
+import rasterio
+from fastapi.testclient import TestClient
+from backend.app.infer import run_inference
+from backend.app.query import query_point, dataset_pool
+
+def test_point_matches_rasters(demo_scene, demo_model, tmp_path):
+    folder = tmp_path / "run"
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(folder), seed_zooms=[])
+    with rasterio.open(folder / "classification.tif") as src:
+        lon, lat = src.xy(40, 100)
+        expected = int(src.read(1)[40, 100])
+    res = query_point(folder, lon, lat)
+    assert (res["row"], res["col"]) == (40, 100)
+    assert res["class"] == expected
+    probs = res["probabilities"]
+    assert max(probs, key=probs.get) == str(expected)
+    assert abs(sum(probs.values()) - 1) < 0.02
+    b = res["bands"]
+    assert np.isclose(res["ndvi"], (b["B08"] - b["B04"]) / (b["B08"] + b["B04"]))
+    assert query_point(folder, 0.0, 0.0) is None
+    dataset_pool.clear()
+
+def test_point_endpoints(demo_scene, demo_model, tmp_path, monkeypatch):
+    import backend.app.serving as serving
+    monkeypatch.setattr(serving, "STORAGE_DIR", tmp_path)
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "run"), seed_zooms=[])
+    client = TestClient(serving.app)
+    r = client.get("/point", params={"lon": 137.35, "lat": -14.25, "run": "run"})
+    assert r.status_code == 200
+    assert r.json()["run"] == "run" and "class" in r.json()
+    assert client.get("/point", params={"lon": 0, "lat": 0, "run": "run"}).status_code == 404
+    r = client.post("/points", json={"run": "run", "points": [[137.35, -14.25], [0, 0]]})
+    pts = r.json()["points"]
+    assert pts[0]["class"] == client.get("/point", params={"lon": 137.35, "lat": -14.25, "run": "run"}).json()["class"]
+    assert pts[1] is None
+    dataset_pool.clear()
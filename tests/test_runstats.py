@@ -0,0 +1,89 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from backend.app import runstats, serving, storage
+from backend.app.runstats import SCENE_PADDOCK, run_rows
+
+def _summary(date, ndvi, good_area):
+    return {
+        "type": "FeatureCollection", "date": date,
+        "classes": [{"class": 1, "pixels": 30, "approx_area_m2": 3000.0},
+                    {"class": 2, "pixels": 70, "approx_area_m2": 7000.0}],
+        "features": [{"type": "Feature", "geometry": None, "properties": {
+            "name": "north", "paddock_id": 0, "pixels": 10, "area_m2": 1000.0,
+            "class_pixels": {"1": 4, "2": 6}, "class_area_m2": {"1": 400.0, "2": good_area},
+            "mean_ndvi": ndvi, "mean_ndwi": 0.1, "mean_bsi": -0.2, "cloud_fraction": 0.0}}],
+    }
+
+def test_run_rows_flatten_scene_and_paddocks():
+    rows = run_rows("r1", _summary("2026-03-02T00:00:00", 0.5, 600.0), model_version="abc")
+    scene = [r for r in rows if r["paddock_id"] == SCENE_PADDOCK]
+    assert [(r["class"], r["area_m2"], r["mean_ndvi"]) for r in scene] == [(1, 3000.0, None), (2, 7000.0, None)]
+    paddock = [r for r in rows if r["paddock_id"] == 0]
+    assert {r["class"]: r["pixels"] for r in paddock} == {1: 4, 2: 6}
+    assert all(r["paddock"] == "north" and r["mean_ndvi"] == 0.5 and r["date"].startswith("2026-03")
+               for r in paddock)
+
+def test_trends_endpoint_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(serving, "stats_available", lambda: False)
+    assert TestClient(serving.app).get("/trends").status_code == 501
+
+def test_export_and_trends(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    # export, backfill and /trends all take the stats root from the storage catalogue
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    runs = [("2026-03-01T00-00-00Z_alpha", "alpha", "2026-03-01T00:00:00", 0.4, 600.0),
+            ("2026-03-20T00-00-00Z_alpha", "alpha", "2026-03-20T00:00:00", 0.6, 800.0),
+            ("2026-04-02T00-00-00Z_alpha", "alpha", "2026-04-02T00:00:00", 0.2, 100.0),
+            ("2026-03-05T00-00-00Z_123", "123", "2026-03-05T00:00:00", 0.3, 300.0),
+            ("2026-03-06T00-00-00Z", None, "2026-03-06T00:00:00", 0.3, 300.0)]
+    for run, prop, date, ndvi, area in runs:
+        folder = tmp_path / run
+        folder.mkdir()
+        storage.update_run(run, date=date, property=prop)
+        storage.save_summary_geojson(folder, _summary(date, ndvi, area))
+    assert runstats.backfill() == len(runs)
+    assert (tmp_path / "stats" / "property=alpha" / "month=2026-03").is_dir()
+    assert runstats.backfill() == 0  # already exported
+
+    alpha = runstats.trends("alpha", paddock_id=0)
+    assert [(t["month"], t["runs"]) for t in alpha] == [("2026-03", 2), ("2026-04", 1)]
+    march = alpha[0]
+    assert march["paddock"] == "north" and march["class_area_m2"] == {"1": 400.0, "2": 700.0}
+    assert march["mean_ndvi"] == pytest.approx(0.5)
+    assert [t["month"] for t in runstats.trends("alpha", since="2026-04-01", paddock_id=0)] == ["2026-04"]
+    # property ids stay strings; runs without a property are in the null partition
+    assert {t["property"] for t in runstats.trends(until="2026-03", paddock_id=SCENE_PADDOCK)} == {"alpha", "123", None}
+    assert runstats.trends("123")[0]["property"] == "123"
+
+    res = TestClient(serving.app).get("/trends", params={"property": "alpha", "paddock": -1})
+    assert res.status_code == 200
+    body = res.json()["trends"]
+    assert [t["month"] for t in body] == ["2026-03", "2026-04"]
+    assert body[0]["class_area_m2"] == {"1": 3000.0, "2": 7000.0} and body[0]["mean_ndvi"] is None
+
+def test_pipeline_exports_catalogued_runs(demo_scene, demo_model, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from backend.app.infer import run_inference
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    folder = storage.new_run_folder(property_id="alpha")
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(folder),
+                  seed_zooms=[], timeseries=False)
+    scene = runstats.trends("alpha", paddock_id=SCENE_PADDOCK)
+    assert (tmp_path / "stats").is_dir()
+    assert len(scene) == 1 and scene[0]["runs"] == 1
+    summary = json.loads((folder / "summary.geojson").read_text())
+    assert sum(scene[0]["class_area_m2"].values()) == pytest.approx(
+        sum(c["approx_area_m2"] for c in summary["classes"]))
+
+def test_failed_stats_export_does_not_fail_run(demo_scene, demo_model, tmp_path, monkeypatch):
+    from backend.app.infer import run_inference
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+
+    def broken(*a, **k):
+        raise OSError("disk full")
+    monkeypatch.setattr(runstats, "export_run_stats", broken)
+    folder = storage.new_run_folder(property_id="alpha")
+    res = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(folder),
+                        seed_zooms=[], timeseries=False)
+    assert (folder / "summary.geojson").exists() and "stats" in res["metrics"]["stages"]
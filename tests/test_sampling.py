@@ -0,0 +1,52 @@
+import numpy as np
+from backend.app.ml.model import load_model
+from backend.app.ml.sampling import ClassReservoir, load_samples, sample_scenes
+from backend.app.ml.train_demo import load_sample_features, train_and_save
+
+def test_reservoir_is_bounded_and_uniform():
+    rng = np.random.default_rng(1)
+    res = ClassReservoir(500, seed=0)
+    X_all, y_all = [], []
+    for _ in range(20):
+        X = rng.random((1000, 9), dtype=np.float32)
+        y = (X[:, 0] * 3).astype(np.uint8)  # three classes ~ 1/3 each
+        res.add(X, y)
+        X_all.append(X)
+        y_all.append(y)
+    X, y = res.result()
+    assert X.dtype == np.float32
+    assert np.bincount(y).tolist() == [500, 500, 500]
+    # kept rows are a sample of the offered rows, spread over all windows
+    X_all, y_all = np.concatenate(X_all), np.concatenate(y_all)
+    for c in range(3):
+        assert abs(X[y == c, 1].mean() - X_all[y_all == c, 1].mean()) < 0.05
+
+def test_small_classes_are_kept_whole(demo_scene):
+    X_full, y_full = load_sample_features(str(demo_scene))
+    X, y, seen = sample_scenes([demo_scene], per_class=10 ** 6, window_size=64)
+    assert seen == {int(c): int(n) for c, n in enumerate(np.bincount(y_full)) if n}
+    order = np.lexsort(X.T)
+    full = np.lexsort(X_full.T)
+    np.testing.assert_array_equal(X[order], X_full[full])
+    np.testing.assert_array_equal(y[order], y_full[full])
+
+def test_samples_cached_and_reused(demo_scene, tmp_path):
+    X, y, hit = load_samples([demo_scene], per_class=300, window_size=64, cache_dir=tmp_path)
+    assert not hit
+    assert np.bincount(y).max() == 300
+    X2, y2, hit = load_samples([demo_scene], per_class=300, window_size=64, cache_dir=tmp_path)
+    assert hit
+    np.testing.assert_array_equal(X, X2)
+    np.testing.assert_array_equal(y, y2)
+    _, _, hit = load_samples([demo_scene], per_class=200, window_size=64, cache_dir=tmp_path)
+    assert not hit
+
+def test_train_and_save_reports(demo_scene, tmp_path):
+    out = tmp_path / "model.joblib"
+    report = train_and_save([demo_scene], per_class=500, model_out=out, cache_dir=tmp_path / "cache",
+                            evaluate=False)
+    assert report["samples"] <= 4 * 500 and not report["cache_hit"]
+    assert report["sampling_s"] >= 0 and report["train_s"] > 0 and report["peak_rss_mb"] > 0
+    assert list(load_model(str(out)).classes_) == [0, 1, 2, 3]
+    assert train_and_save([demo_scene], per_class=500, model_out=out, cache_dir=tmp_path / "cache",
+                          evaluate=False)["cache_hit"]
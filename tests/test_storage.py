@@ -0,0 +1,47 @@
+import json
+from datetime import datetime
+import pytest
+import backend.app.storage as storage
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    return tmp_path
+
+def test_catalogue_filters_and_pages(store):
+    for month in (1, 2, 3):
+        for prop in ("lorella", "other"):
+            folder = storage.new_run_folder(datetime(2024, month, 1), property_id=prop)
+            storage.save_summary_geojson(folder, {"date": "x", "classes": [{"class": 2, "pixels": month}]},
+                                         model_version="abc")
+    assert storage.latest_run("lorella") == "2024-03-01T00-00-00Z_lorella"
+    entries, total = storage.query_runs(property_id="other", since="2024-02-01", limit=1)
+    assert total == 2
+    assert [e["run"] for e in entries] == ["2024-03-01T00-00-00Z_other"]
+    assert entries[0]["summary"] == [{"class": 2, "pixels": 3}]
+    assert entries[0]["model_version"] == "abc"
+    assert len(storage.list_runs(limit=4, offset=4)) == 2
+
+def test_catalogue_rebuilt_from_existing_folders(store):
+    legacy = store / "2023-12-01T00-00-00Z"
+    legacy.mkdir()
+    (legacy / "summary.geojson").write_text(json.dumps({"date": "2023-12-01T00:00:00", "classes": []}))
+    (store / "not-a-run").mkdir()
+    assert storage.list_runs() == ["2023-12-01T00-00-00Z"]
+    assert (store / storage.INDEX_NAME).exists()
+
+def test_summary_outside_storage_not_catalogued(store, tmp_path_factory):
+    elsewhere = tmp_path_factory.mktemp("elsewhere")
+    storage.save_summary_geojson(elsewhere, {"classes": []})
+    assert storage.list_runs() == []
+
+def test_runs_in_progress_are_not_latest(store):
+    done = storage.new_run_folder(datetime(2024, 1, 1))
+    storage.save_summary_geojson(done, {"date": "x", "classes": []})
+    assert storage.latest_run() == done.name
+    running = storage.new_run_folder(datetime(2024, 2, 1))
+    assert storage.get_run(running.name)["status"] == storage.RUNNING
+    assert storage.latest_run() == done.name and storage.list_runs() == [done.name]
+    storage.save_summary_geojson(running, {"date": "y", "classes": []})
+    assert storage.latest_run() == running.name and storage.latest_run("other") is None
+    assert storage.query_runs()[1] == 2
@@ -0,0 +1,56 @@
+import io
+import mercantile
+import numpy as np
+from PIL import Image
+from fastapi.testclient import TestClient
+from backend.app.infer import run_inference
+from backend.app.tiles import fetch_tile, get_tile, tile_cache, NODATA
+
+def _decode(png):
+    img = Image.open(io.BytesIO(png))
+    assert img.mode == "P"
+    return np.array(img)
+
+def test_seeded_pyramid_and_cache(demo_scene, demo_model, tmp_path):
+    folder = tmp_path / "run"
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(folder), seed_zooms=[12])
+    t = mercantile.tile(137.4, -14.3, 12)
+    assert (folder / "tiles" / "12" / str(t.x) / ("%d.png" % t.y)).exists()
+    tile_cache.clear()
+    inside = _decode(get_tile(folder, 12, t.x, t.y))
+    assert inside.shape == (256, 256)
+    assert set(np.unique(inside)) - {NODATA} <= {0, 1, 2, 3}
+    assert (inside != NODATA).any()
+    get_tile(folder, 12, t.x, t.y)
+    assert tile_cache.hits == 1
+    # a tile that doesn't touch the scene is rendered on demand and fully transparent
+    far = mercantile.tile(0.0, 0.0, 12)
+    assert (_decode(get_tile(folder, 12, far.x, far.y)) == NODATA).all()
+
+def test_only_pyramid_tiles_persisted(demo_scene, demo_model, tmp_path):
+    folder = tmp_path / "run"
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(folder), seed_zooms=[])
+    tile_cache.clear()
+    inside = mercantile.tile(137.4, -14.3, 12)
+    assert fetch_tile(folder, 12, inside.x, inside.y, persist_zooms=[10, 13])[1] == "render"
+    assert (folder / "tiles" / "12" / str(inside.x) / ("%d.png" % inside.y)).exists()
+    far = mercantile.tile(0.0, 0.0, 12)
+    deep = mercantile.tile(137.4, -14.3, 18)
+    fetch_tile(folder, 12, far.x, far.y, persist_zooms=[10, 13])
+    fetch_tile(folder, 18, deep.x, deep.y, persist_zooms=[10, 13])
+    assert sorted(p.name for p in (folder / "tiles").iterdir()) == ["12"]
+    assert len(list((folder / "tiles").rglob("*.png"))) == 1
+    # not on disk, but still cached in memory
+    assert fetch_tile(folder, 18, deep.x, deep.y, persist_zooms=[10, 13])[1] == "memory"
+
+def test_tile_endpoint(demo_scene, demo_model, tmp_path, monkeypatch):
+    import backend.app.serving as serving
+    monkeypatch.setattr(serving, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(serving, "latest_run", lambda: "run")
+    run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "run"), seed_zooms=[])
+    t = mercantile.tile(137.4, -14.3, 13)
+    client = TestClient(serving.app)
+    r = client.get("/tile/13/%d/%d.png" % (t.x, t.y))
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/png"
+    assert client.get("/tile/13/0/0.png?run=missing").status_code == 404
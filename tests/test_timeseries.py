@@ -0,0 +1,81 @@
+import json
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from backend.app import timeseries
+from backend.app.timeseries import append_run, cube_dir, pixel_series, paddock_series, read_steps, CHANGE_NODATA
+
+TRANSFORM = from_origin(137.3, -14.2, 0.01, 0.01)
+
+def _run(root, name, cls, red, nir):
+    folder = root / name
+    folder.mkdir()
+    meta = {"driver": "GTiff", "height": 4, "width": 5, "crs": "EPSG:4326", "transform": TRANSFORM}
+    with rasterio.open(folder / "classification.tif", "w", count=1, dtype="uint8", **meta) as dst:
+        dst.write(np.full((4, 5), cls, dtype="uint8"), 1)
+    bands = np.zeros((6, 4, 5), dtype="uint16")
+    bands[2], bands[3] = red, nir
+    with rasterio.open(folder / "imagery.tif", "w", count=6, dtype="uint16", **meta) as dst:
+        dst.write(bands)
+    return folder
+
+def test_append_change_and_stats(tmp_path):
+    root = tmp_path / "cube"
+    # NDVI 0.6, 0.2 (decline of 0.4), then cloud, then 0.5
+    months = [(2, 2000, 8000), (1, 4000, 6000), (3, 4000, 6000), (2, 2500, 7500)]
+    folders = [_run(tmp_path, "run%d" % i, *m) for i, m in enumerate(months)]
+    for i, folder in enumerate(folders):
+        assert append_run(folder, "2024-0%d-01" % (i + 1), root=root, rolling=2, window_size=3, cog=False) == i
+    assert append_run(folders[0], "2024-05-01", root=root, cog=False) is None
+    with rasterio.open(folders[0] / "change.tif") as src:
+        assert (src.read(1) == CHANGE_NODATA).all()
+    with rasterio.open(folders[1] / "change.tif") as src:
+        assert (src.read(1) == 0).all()  # strong decline
+    with rasterio.open(folders[2] / "change.tif") as src:
+        assert (src.read(1) == CHANGE_NODATA).all()  # cloud
+    res = pixel_series(cube_dir(folders[0], root), 1, 2)
+    assert [s["class"] for s in res["series"]] == [2, 1, 3, 2]
+    assert [s["ndvi"] for s in res["series"]] == [0.6, 0.2, None, 0.5]
+    clear = np.array([0.6, 0.2, 0.5])
+    assert res["stats"]["count"] == 3
+    assert np.isclose(res["stats"]["mean_ndvi"], clear.mean())
+    assert np.isclose(res["stats"]["std_ndvi"], clear.std(), atol=1e-4)
+    # rolling window of 2 steps: cloud + 0.5
+    assert np.isclose(res["stats"]["rolling_mean_ndvi"], 0.5)
+
+def test_paddock_series(tmp_path):
+    root = tmp_path / "cube"
+    folder = _run(tmp_path, "run0", 2, 2000, 8000)
+    append_run(folder, "2024-01-01", root=root, cog=False)
+    paddocks = tmp_path / "paddocks.geojson"
+    ring = [[137.3, -14.2], [137.32, -14.2], [137.32, -14.22], [137.3, -14.22], [137.3, -14.2]]
+    paddocks.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Polygon", "coordinates": [ring]}}]}))
+    with rasterio.open(folder / "classification.tif") as src:
+        series = paddock_series(cube_dir(folder, root), paddocks, 0, src.crs, src.transform, src.shape)
+    assert series[0]["pixels"] == 4
+    assert series[0]["class_fraction"] == {"2": 1.0}
+    assert np.isclose(series[0]["mean_ndvi"], 0.6)
+    with pytest.raises(IndexError):
+        paddock_series(cube_dir(folder, root), paddocks, -1, src.crs, src.transform, src.shape)
+
+def test_failed_append_leaves_cube_unchanged(tmp_path, monkeypatch):
+    root = tmp_path / "cube"
+    first, second = _run(tmp_path, "run0", 2, 2000, 8000), _run(tmp_path, "run1", 2, 4000, 6000)
+    append_run(first, "2024-01-01", root=root, cog=False)
+
+    def broken(*a, **k):
+        raise OSError("COG translate failed")
+    monkeypatch.setattr(timeseries, "write_cog", broken)
+    with pytest.raises(OSError):
+        append_run(second, "2024-02-01", root=root, window_size=2)
+    cube = cube_dir(first, root)
+    assert [s["run"] for s in read_steps(cube)] == ["run0"]
+    assert pixel_series(cube, 1, 2)["stats"]["count"] == 1
+    monkeypatch.undo()
+    # the retry counts the run once
+    assert append_run(second, "2024-02-01", root=root, window_size=2) == 1
+    stats = pixel_series(cube, 1, 2)["stats"]
+    assert stats["count"] == 2 and np.isclose(stats["mean_ndvi"], 0.4)
+    assert [p.name for p in sorted((cube / "stats").iterdir())] == ["00001", "00002"]
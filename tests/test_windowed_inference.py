@@ -0,0 +1,62 @@
+import numpy as np
+import rasterio
+from backend.app.infer import run_inference
+from backend.app.ml.raster_io import iter_windows
+
+def test_iter_windows_cover_grid():
+    windows = list(iter_windows(10, 25, 8))
+    assert len(windows) == 2 * 4
+    covered = np.zeros((10, 25), dtype=int)
+    for w in windows:
+        covered[w.row_off:w.row_off + w.height, w.col_off:w.col_off + w.width] += 1
+    assert (covered == 1).all()
+    assert [tuple(w.flatten()) for w in iter_windows(10, 25, 0)] == [(0, 0, 25, 10)]
+
+def test_windowed_matches_whole_scene(demo_scene, demo_model, tmp_path):
+    whole = run_inference(str(demo_scene), model_path=str(demo_model),
+                          out_folder=str(tmp_path / "whole"), window_size=0)
+    windowed = run_inference(str(demo_scene), model_path=str(demo_model),
+                             out_folder=str(tmp_path / "windowed"), window_size=100)
+    with rasterio.open(whole["classification_tif"]) as a, rasterio.open(windowed["classification_tif"]) as b:
+        assert np.array_equal(a.read(1), b.read(1))
+        assert a.profile == b.profile
+    for a, b in zip(whole["summary"]["classes"], windowed["summary"]["classes"]):
+        assert a["pixels"] == b["pixels"]
+        assert np.isclose(a["approx_area_m2"], b["approx_area_m2"])  # float summation order differs
+
+def test_process_pool_matches_serial(demo_scene, demo_model, tmp_path):
+    serial = run_inference(str(demo_scene), model_path=str(demo_model),
+                           out_folder=str(tmp_path / "serial"), window_size=64, workers=1)
+    pooled = run_inference(str(demo_scene), model_path=str(demo_model),
+                           out_folder=str(tmp_path / "pooled"), window_size=64, workers=2)
+    with rasterio.open(serial["classification_tif"]) as a, rasterio.open(pooled["classification_tif"]) as b:
+        assert np.array_equal(a.read(1), b.read(1))
+    assert pooled["throughput_mpx_s"] > 0
+
+def test_single_pass_labels_and_probabilities(demo_scene, demo_model, tmp_path):
+    from backend.app.infer import read_imagery, extract_features_from_array
+    from backend.app.ml.model import load_model
+    out = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path))
+    model = load_model(str(demo_model))
+    arr, _ = read_imagery(str(demo_scene))
+    X, (h, w) = extract_features_from_array(arr)
+    with rasterio.open(out["classification_tif"]) as src:
+        assert np.array_equal(src.read(1), model.predict(X).reshape(h, w))
+    with rasterio.open(out["probabilities_tif"]) as src:
+        assert src.count == len(model.classes_)
+        assert src.dtypes[0] == "uint8"
+        proba = src.read().reshape(src.count, -1).T / 255.0
+    assert np.abs(proba - model.predict_proba(X)).max() <= 0.5 / 255 + 1e-9
+
+def test_windowed_matches_whole_array_baseline(demo_scene, demo_model, tmp_path):
+    # the pre-windowing path: whole scene in memory, one feature matrix, model.predict
+    from backend.app.infer import read_imagery, extract_features_from_array
+    from backend.app.ml.model import load_model
+    arr, _ = read_imagery(str(demo_scene))
+    X, (h, w) = extract_features_from_array(arr)
+    baseline = load_model(str(demo_model)).predict(X).reshape(h, w)
+    for window_size in (0, 64, 100):
+        out = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / str(window_size)),
+                            window_size=window_size, mask_clouds=False, seed_zooms=[])
+        with rasterio.open(out["classification_tif"]) as src:
+            assert np.array_equal(src.read(1), baseline)
@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+from backend.app.infer import run_inference, read_imagery, extract_features_from_array
+from backend.app.ml.features import CLOUD_CLASS
+from backend.app.zonal import row_areas, paddock_labels
+
+def test_row_areas_geodesic():
+    # one-degree cell straddling the equator: ~12309 km^2 on WGS84
+    area = row_areas(CRS.from_epsg(4326), Affine(1, 0, 0, 0, -1, 0.5), 1)
+    assert abs(area[0] / 1e6 - 12308.8) < 1
+    # rows run north to south from 60N, so cells grow towards the equator
+    rows = row_areas(CRS.from_epsg(4326), Affine(1, 0, 0, 0, -1, 60), 30)
+    assert (np.diff(rows) > 0).all()
+    assert row_areas(CRS.from_epsg(32753), Affine(10, 0, 0, 0, -10, 0), 3).tolist() == [100.0] * 3
+
+def test_paddock_summary(demo_scene, demo_model, tmp_path):
+    paddocks = tmp_path / "paddocks.geojson"
+    west = [[137.30, -14.20], [137.35, -14.20], [137.35, -14.3], [137.30, -14.3], [137.30, -14.20]]
+    east = [[137.40, -14.20], [137.5, -14.20], [137.5, -14.3], [137.40, -14.3], [137.40, -14.20]]
+    paddocks.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name}, "geometry": {"type": "Polygon", "coordinates": [ring]}}
+        for name, ring in (("west", west), ("east", east))]}))
+    out = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "run"),
+                        seed_zooms=[], paddocks=str(paddocks))
+    summary = json.loads((tmp_path / "run" / "summary.geojson").read_text())
+    assert summary["type"] == "FeatureCollection"
+    west_props, east_props = (f["properties"] for f in summary["features"])
+    assert west_props["name"] == "west"
+    with rasterio.open(out["classification_tif"]) as src:
+        cls = src.read(1)
+        labels = paddock_labels(paddocks, src.crs, src.transform, cls.shape)
+    assert west_props["pixels"] == int((labels == 1).sum())
+    assert west_props["class_pixels"] == {str(c): int(n) for c, n in
+                                          zip(*np.unique(cls[labels == 1], return_counts=True))}
+    assert abs(west_props["area_m2"] - 0.05 * 0.1 * 111.3e3 * 110.6e3) / west_props["area_m2"] < 0.05
+    X, _ = extract_features_from_array(read_imagery(str(demo_scene))[0])
+    ndvi = X[:, 6].reshape(cls.shape)
+    # index means skip cloud pixels; cloud_fraction is the share of the cloud class on the map
+    for zone, props in ((1, west_props), (2, east_props)):
+        inside = labels == zone
+        clear = inside & (cls != CLOUD_CLASS)
+        assert np.isclose(props["mean_ndvi"], ndvi[clear].mean(dtype=float))
+        assert np.isclose(props["cloud_fraction"], (cls[inside] == CLOUD_CLASS).mean())
+    # rasterised zones are cached inside an uncatalogued run folder
+    assert len(list((tmp_path / "run" / "zones").glob("*.npy"))) == 1
+    assert sum(c["pixels"] for c in summary["classes"]) == cls.size
+    # pool workers send the indices back with each window: same paddock means
+    pooled = run_inference(str(demo_scene), model_path=str(demo_model), out_folder=str(tmp_path / "pooled"),
+                           seed_zooms=[], paddocks=str(paddocks), workers=2, window_size=100)
+    for a, b in zip(summary["features"], pooled["summary"]["features"]):
+        assert a["properties"]["class_pixels"] == b["properties"]["class_pixels"]
+        assert np.isclose(a["properties"]["mean_ndvi"], b["properties"]["mean_ndvi"])